@@ -0,0 +1,234 @@
+import argparse
+import json
+import os
+import platform
+import tempfile
+import time
+import numpy as np
+import cv2
+import torch
+from detect import read_image, draw_contours, predict_resized, DEVICE
+from model import UNet, infer
+from polygons import extract_polygons
+from dataset_cache import DatasetCache
+from train import Trainer, dataset
+from test import run_evaluation
+
+try:
+    import resource
+except ImportError:
+    resource = None
+
+STAGES = ("decode", "forward", "contours", "dataset", "train_epoch", "evaluation")
+RESOLUTIONS = ((640, 480), (1920, 1080), (4000, 3000))
+BATCH_SIZES = (1, 2, 4, 8, 16)
+
+
+def reset_peak_rss():
+    # В Linux запись "5" в clear_refs сбрасывает пиковый RSS (VmHWM), иначе пик считается с начала процесса
+    try:
+        with open("/proc/self/clear_refs", "w") as f:
+            f.write("5")
+    except OSError:
+        pass
+
+
+def peak_rss_mb():
+    try:
+        with open("/proc/self/status") as f:
+            for line in f:
+                if line.startswith("VmHWM:"):
+                    return int(line.split()[1]) / 1024
+    except OSError:
+        pass
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+
+def measure(fn, repeats=10, warmup=2, items=1):
+    for _ in range(warmup):
+        fn()
+    reset_peak_rss()
+    times = []
+    for _ in range(repeats):
+        start = time.perf_counter()
+        fn()
+        times.append(time.perf_counter() - start)
+    times = np.array(times)
+    return {
+        "p50_ms": float(np.percentile(times, 50)) * 1000,
+        "p95_ms": float(np.percentile(times, 95)) * 1000,
+        "mean_ms": float(times.mean()) * 1000,
+        "throughput": items / float(times.mean()),
+        "peak_rss_mb": peak_rss_mb(),
+        "repeats": repeats,
+    }
+
+
+def synthetic_image(width, height, rng):
+    # Светлое море с темными пятнами: после порога в маске получаются компактные области
+    img = np.full((height, width, 3), 180, dtype=np.uint8)
+    img += rng.integers(0, 40, size=(height, width, 1), dtype=np.uint8)
+    for _ in range(8):
+        center = (int(rng.integers(0, width)), int(rng.integers(0, height)))
+        axes = (int(rng.integers(width // 40 + 1, width // 8 + 2)), int(rng.integers(height // 40 + 1, height // 8 + 2)))
+        cv2.ellipse(img, center, axes, float(rng.integers(0, 180)), 0, 360, (30, 30, 30), -1)
+    return img
+
+
+def write_images(folder, resolution, count, rng):
+    os.makedirs(folder, exist_ok=True)
+    paths = []
+    for i in range(count):
+        path = os.path.join(folder, f"{i}.jpg")
+        cv2.imwrite(path, synthetic_image(*resolution, rng))
+        paths.append(path)
+    return paths
+
+
+def resolution_name(resolution):
+    return f"{resolution[0]}x{resolution[1]}"
+
+
+def run_benchmarks(work_dir, stages=STAGES, resolutions=RESOLUTIONS, batch_sizes=BATCH_SIZES, repeats=10,
+                   warmup=2, train_images=8, log=print):
+    torch.manual_seed(0)
+    rng = np.random.default_rng(0)
+    weights = os.path.join(work_dir, "model.pth")
+    torch.save(UNet().state_dict(), weights)
+    model = UNet().to(DEVICE).eval()
+    images = {r: write_images(os.path.join(work_dir, resolution_name(r)), r, 2, rng) for r in resolutions}
+    results = {}
+
+    def record(name, stats):
+        results[name] = stats
+        log(f"{name}: p50 {stats['p50_ms']:.1f} мс, p95 {stats['p95_ms']:.1f} мс, "
+            f"{stats['throughput']:.2f} /с, пиковый RSS {stats['peak_rss_mb']:.0f} МБ")
+
+    if "decode" in stages:
+        for r in resolutions:
+            record(f"decode/{resolution_name(r)}", measure(lambda: read_image(images[r][0]), repeats, warmup))
+
+    if "forward" in stages:
+        for batch_size in batch_sizes:
+            batch = torch.rand(batch_size, 1, 320, 624, device=DEVICE)
+            # Большие батчи на CPU медленные, поэтому число повторов уменьшается пропорционально
+            record(f"forward/bs{batch_size}", measure(
+                lambda: infer(model, batch), max(2, repeats // batch_size), min(warmup, 1), items=batch_size
+            ))
+
+    if "contours" in stages:
+        original_img, img_gray = read_image(images[resolutions[0]][0])
+        pred = predict_resized(model, img_gray)
+        for r in resolutions:
+            original_img, _ = read_image(images[r][0])
+            record(f"contours/overlay/{resolution_name(r)}",
+                   measure(lambda: draw_contours(original_img, pred, 0.3), repeats, warmup))
+            record(f"contours/polygons/{resolution_name(r)}",
+                   measure(lambda: extract_polygons(pred, 0.3, r), repeats, warmup))
+
+    train_dir = os.path.join(work_dir, "train")
+    if "dataset" in stages or "train_epoch" in stages:
+        write_images(train_dir, resolutions[0], train_images, rng)
+
+    if "dataset" in stages:
+        plain = dataset(train_dir, threshold=0.3)
+        record("dataset/getitem", measure(lambda: [plain[i] for i in range(len(plain))], repeats, warmup,
+                                          items=len(plain)))
+        cache = DatasetCache(os.path.join(work_dir, "cache"), train_dir, threshold=0.3)
+        cache.update()
+        cached = dataset(train_dir, threshold=0.3, cache=cache)
+        record("dataset/getitem_cached", measure(lambda: [cached[i] for i in range(len(cached))], repeats, warmup,
+                                                 items=len(cached)))
+
+    if "train_epoch" in stages:
+        trainer = Trainer(train_dir, os.path.join(work_dir, "trained.pth"), batch_size=2, epochs=1, num_workers=0)
+        # Количество изображений обучающей выборки: 80% от папки
+        count = int(0.8 * train_images)
+        record("train_epoch", measure(trainer.run, 1, 0, items=count))
+
+    if "evaluation" in stages:
+        for r in resolutions:
+            record(f"evaluation/{resolution_name(r)}",
+                   measure(lambda: run_evaluation(images[r][0], weights), repeats, warmup))
+
+    return results
+
+
+def environment():
+    return {
+        "python": platform.python_version(),
+        "torch": torch.__version__,
+        "platform": platform.platform(),
+        "cpu_count": os.cpu_count(),
+        "torch_threads": torch.get_num_threads(),
+        "device": str(DEVICE),
+    }
+
+
+def compare(results, baseline, tolerance=0.2):
+    # Регрессией считается рост медианной задержки больше чем на tolerance относительно базовой линии
+    regressions = []
+    for name, stats in results.items():
+        reference = baseline.get(name)
+        if reference is None:
+            continue
+        ratio = stats["p50_ms"] / reference["p50_ms"] if reference["p50_ms"] > 0 else 1.0
+        stats["baseline_p50_ms"] = reference["p50_ms"]
+        stats["change"] = ratio - 1
+        if ratio > 1 + tolerance:
+            regressions.append((name, reference["p50_ms"], stats["p50_ms"], ratio - 1))
+    return regressions
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замеры производительности detect, train и test на синтетических данных")
+    parser.add_argument('--output', default="benchmark_results.json", help="Путь для сохранения результатов в JSON")
+    parser.add_argument('--baseline', default=None, help="JSON с базовыми результатами для поиска регрессий")
+    parser.add_argument('--save-baseline', default=None, help="Сохранить результаты как новую базовую линию")
+    parser.add_argument('--tolerance', type=float, default=0.2,
+                        help="Допустимый рост медианной задержки относительно базовой линии (по умолчанию: 0.2)")
+    parser.add_argument('--stages', nargs='+', choices=STAGES, default=list(STAGES), help="Набор замеряемых этапов")
+    parser.add_argument('--resolutions', nargs='+', default=[resolution_name(r) for r in RESOLUTIONS],
+                        help="Разрешения синтетических изображений, например 640x480 1920x1080")
+    parser.add_argument('--batch-sizes', type=int, nargs='+', default=list(BATCH_SIZES),
+                        help="Размеры батча для замера UNet.forward (по умолчанию: 1 2 4 8 16)")
+    parser.add_argument('--repeats', type=int, default=10, help="Количество повторов каждого замера (по умолчанию: 10)")
+    parser.add_argument('--warmup', type=int, default=2, help="Количество прогревочных запусков (по умолчанию: 2)")
+    parser.add_argument('--train-images', type=int, default=8,
+                        help="Количество изображений для замера эпохи обучения (по умолчанию: 8)")
+    args = parser.parse_args()
+
+    try:
+        resolutions = [tuple(int(v) for v in r.lower().split("x")) for r in args.resolutions]
+    except ValueError:
+        parser.error("Разрешение задается в виде ШИРИНАxВЫСОТА, например 640x480")
+
+    with tempfile.TemporaryDirectory() as work_dir:
+        results = run_benchmarks(
+            work_dir, args.stages, resolutions, args.batch_sizes, args.repeats, args.warmup, args.train_images
+        )
+
+    regressions = []
+    if args.baseline:
+        with open(args.baseline, encoding="utf-8") as f:
+            regressions = compare(results, json.load(f)["results"], args.tolerance)
+
+    report = {"environment": environment(), "results": results}
+    with open(args.output, "w", encoding="utf-8") as f:
+        json.dump(report, f, ensure_ascii=False, indent=2)
+    print(f"Результаты сохранены в: {args.output}")
+    if args.save_baseline:
+        with open(args.save_baseline, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"Базовая линия сохранена в: {args.save_baseline}")
+
+    for name, before, after, change in regressions:
+        print(f"Регрессия {name}: {before:.1f} мс -> {after:.1f} мс ({change:+.0%})")
+    if regressions:
+        raise SystemExit(1)
+
+
+if __name__ == "__main__":
+    main()
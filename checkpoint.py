@@ -0,0 +1,75 @@
+import os
+import random
+import numpy as np
+import torch
+from concurrent.futures import ThreadPoolExecutor
+
+SNAPSHOT_NAME = "last.pt"
+BEST_NAME = "best.pth"
+
+
+def copy_to_cpu(obj):
+    # Копия на CPU снимается синхронно, чтобы обучение могло сразу продолжить менять веса
+    if torch.is_tensor(obj):
+        return obj.detach().to("cpu", copy=True)
+    if isinstance(obj, dict):
+        return {k: copy_to_cpu(v) for k, v in obj.items()}
+    if isinstance(obj, (list, tuple)):
+        return type(obj)(copy_to_cpu(v) for v in obj)
+    return obj
+
+
+def save_atomic(state, path):
+    tmp_path = path + ".tmp"
+    torch.save(state, tmp_path)
+    os.replace(tmp_path, path)
+
+
+def rng_state():
+    state = {
+        "torch": torch.get_rng_state(),
+        "numpy": np.random.get_state(),
+        "python": random.getstate(),
+    }
+    if torch.cuda.is_available():
+        state["cuda"] = torch.cuda.get_rng_state_all()
+    return state
+
+
+def restore_rng_state(state):
+    torch.set_rng_state(state["torch"])
+    np.random.set_state(state["numpy"])
+    random.setstate(state["python"])
+    if "cuda" in state and torch.cuda.is_available():
+        torch.cuda.set_rng_state_all(state["cuda"])
+
+
+def load_snapshot(path, map_location="cpu"):
+    return torch.load(path, map_location=map_location, weights_only=False)
+
+
+class AsyncCheckpointWriter:
+    # Запись на диск идет в фоновом потоке; следующий снимок ждет завершения предыдущего
+    def __init__(self):
+        self._pool = ThreadPoolExecutor(max_workers=1)
+        self._pending = []
+
+    def save(self, state, path, saver=save_atomic):
+        state = copy_to_cpu(state)
+        # Ошибки уже завершенных записей пробрасываются при следующем сохранении
+        done = [f for f in self._pending if f.done()]
+        self._pending = [f for f in self._pending if not f.done()]
+        for future in done:
+            future.result()
+        self._pending.append(self._pool.submit(saver, state, path))
+
+    def wait(self):
+        pending, self._pending = self._pending, []
+        for future in pending:
+            future.result()
+
+    def close(self):
+        try:
+            self.wait()
+        finally:
+            self._pool.shutdown()
@@ -0,0 +1,140 @@
+import os
+import json
+import uuid
+import numpy as np
+from concurrent.futures import ThreadPoolExecutor
+from PIL import Image
+
+IMAGE_SIZE = (624, 320)
+INDEX_NAME = "index.json"
+
+
+def list_images(image_dir):
+    return sorted(
+        img for img in os.listdir(image_dir)
+        if img.lower().endswith(('.jpg', '.jpeg'))
+    )
+
+
+def preprocess_image(path, threshold, size=IMAGE_SIZE):
+    # Та же предобработка, что и в train.dataset: оттенки серого, 624x320, маска по порогу
+    img = np.array(Image.open(path).convert("L").resize(size))
+    mask = (img.astype(np.float32) / 255.0 < threshold).astype(np.uint8)
+    return img, mask
+
+
+class DatasetCache:
+    def __init__(self, cache_dir, image_dir, threshold=0.5, size=IMAGE_SIZE):
+        self.cache_dir = cache_dir
+        self.image_dir = image_dir
+        self.threshold = threshold
+        self.size = tuple(size)
+        self.index = None
+        self._images = None
+        self._masks = None
+
+    def _index_path(self):
+        return os.path.join(self.cache_dir, INDEX_NAME)
+
+    def _read_index(self):
+        try:
+            with open(self._index_path(), "r", encoding="utf-8") as f:
+                index = json.load(f)
+        except (OSError, ValueError):
+            return None
+        if tuple(index.get("size", ())) != self.size or index.get("threshold") != self.threshold:
+            return None
+        return index
+
+    def update(self, workers=None):
+        # Пересобирает только новые и измененные изображения, возвращает их количество
+        os.makedirs(self.cache_dir, exist_ok=True)
+        old_index = self._read_index()
+        old_entries = old_index["entries"] if old_index else {}
+
+        names = list_images(self.image_dir)
+        mtimes = {name: os.stat(os.path.join(self.image_dir, name)).st_mtime_ns for name in names}
+        stale = [name for name in names
+                 if name not in old_entries or old_entries[name]["mtime_ns"] != mtimes[name]]
+        if old_index and not stale and len(old_entries) == len(names):
+            self.index = old_index
+            return 0
+
+        width, height = self.size
+        token = uuid.uuid4().hex[:8]
+        images_file, masks_file = f"images-{token}.npy", f"masks-{token}.npy"
+        shape = (len(names), height, width)
+        images = np.lib.format.open_memmap(os.path.join(self.cache_dir, images_file), mode="w+", dtype=np.uint8, shape=shape)
+        masks = np.lib.format.open_memmap(os.path.join(self.cache_dir, masks_file), mode="w+", dtype=np.uint8, shape=shape)
+
+        if old_index:
+            old_images = np.load(os.path.join(self.cache_dir, old_index["images"]), mmap_mode="r")
+            old_masks = np.load(os.path.join(self.cache_dir, old_index["masks"]), mmap_mode="r")
+            for row, name in enumerate(names):
+                if name not in stale:
+                    old_row = old_entries[name]["row"]
+                    images[row] = old_images[old_row]
+                    masks[row] = old_masks[old_row]
+            del old_images, old_masks
+
+        rows = {name: row for row, name in enumerate(names)}
+
+        def process(name):
+            try:
+                return name, preprocess_image(os.path.join(self.image_dir, name), self.threshold, self.size)
+            except Exception:
+                raise ValueError(f"Папка содержит поврежденные изображения: {name}")
+
+        with ThreadPoolExecutor(workers or os.cpu_count() or 1) as pool:
+            for name, (img, mask) in pool.map(process, stale):
+                images[rows[name]] = img
+                masks[rows[name]] = mask
+        images.flush()
+        masks.flush()
+        del images, masks
+
+        index = {
+            "size": list(self.size),
+            "threshold": self.threshold,
+            "images": images_file,
+            "masks": masks_file,
+            "entries": {name: {"mtime_ns": mtimes[name], "row": rows[name]} for name in names},
+        }
+        tmp_path = self._index_path() + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f)
+        os.replace(tmp_path, self._index_path())
+
+        # Старые массивы удаляются только после атомарной замены индекса
+        if old_index:
+            for old_file in (old_index["images"], old_index["masks"]):
+                try:
+                    os.remove(os.path.join(self.cache_dir, old_file))
+                except OSError:
+                    pass
+        self.index = index
+        self._images = self._masks = None
+        return len(stale)
+
+    def _open(self):
+        if self.index is None:
+            self.index = self._read_index()
+            if self.index is None:
+                raise ValueError(f"Кэш датасета не найден: {self.cache_dir}")
+        self._images = np.load(os.path.join(self.cache_dir, self.index["images"]), mmap_mode="r")
+        self._masks = np.load(os.path.join(self.cache_dir, self.index["masks"]), mmap_mode="r")
+
+    def __contains__(self, name):
+        return self.index is not None and name in self.index["entries"]
+
+    def get(self, name):
+        if self._images is None:
+            self._open()
+        row = self.index["entries"][name]["row"]
+        return self._images[row], self._masks[row]
+
+    def __getstate__(self):
+        # Отображения файлов не передаются в процессы DataLoader, каждый процесс открывает их сам
+        state = self.__dict__.copy()
+        state["_images"] = state["_masks"] = None
+        return state
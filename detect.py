@@ -1,43 +1,549 @@
 import torch
 import numpy as np
 import cv2
-from model import UNet
+import os
+import time
+import argparse
+from collections import deque
+from concurrent.futures import ThreadPoolExecutor
+from model import PRECISIONS, INPUT_SIZE, prepare_model, infer, build_model, read_model_state, fuse_batch_norm
+from model_cache import model_cache
+from profiling import profiler, format_stages
+from tiling import predict_tiled, iter_tiled_probabilities, TILE_SIZE, OVERLAP, BLEND_MODES
+from raster import open_raster, create_raster, raster_shape, render_overlay, TIFF_EXTENSIONS
+from polygons import (find_contours, extract_polygons, georeference, read_world_file, draw_polygons,
+                      save_polygons, OUTPUT_FORMATS)
+from weights import is_weights_file, load_weights
+from image_files import IMAGE_EXTENSIONS, collect_images
+from prob_cache import ProbabilityCache, file_hash, checkpoint_hash, result_key, quantize, dequantize
 from PIL import Image
 import io
 
+try:
+    import onnxruntime as ort
+except ImportError:
+    ort = None
+
 DEVICE = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
+BACKENDS = ("eager", "torchscript", "onnx")
+# В режиме окон сцена, карта вероятностей float32 и наложение целиком лежат в памяти (около 9 байт на пиксель),
+# поэтому сцены крупнее лимита обрабатываются потоково, как с --raster
+MAX_TILED_PIXELS = 100_000_000
+
+class OnnxModel:
+    # Обертка над сессией ONNX Runtime с тем же интерфейсом, что и у модели PyTorch
+    def __init__(self, model_path):
+        if ort is None:
+            raise ImportError("Для бэкенда ONNX требуется пакет onnxruntime")
+        options = ort.SessionOptions()
+        options.graph_optimization_level = ort.GraphOptimizationLevel.ORT_ENABLE_ALL
+        options.intra_op_num_threads = os.cpu_count() or 1
+        self.session = ort.InferenceSession(model_path, options, providers=["CPUExecutionProvider"])
+        self.input_name = self.session.get_inputs()[0].name
+
+    def __call__(self, batch):
+        output = self.session.run(None, {self.input_name: batch.detach().cpu().numpy()})[0]
+        return torch.from_numpy(output).to(batch.device)
 
-def load_model(model_path):
-    model = UNet()
-    model.load_state_dict(torch.load(model_path, map_location=DEVICE))
+def backend_for_path(model_path):
+    ext = os.path.splitext(model_path)[1].lower()
+    if ext == ".onnx":
+        return "onnx"
+    if ext in (".pt", ".ts"):
+        return "torchscript"
+    return "eager"
+
+def load_backend_model(model_path, backend="eager", precision="fp32"):
+    if backend not in BACKENDS:
+        raise ValueError(f"Неизвестный бэкенд: {backend}")
+    if backend != "eager" and precision != "fp32":
+        raise ValueError("Пониженная точность поддерживается только для бэкенда eager")
+    if backend == "onnx":
+        return OnnxModel(model_path)
+    if backend == "torchscript":
+        model = torch.jit.load(model_path, map_location=DEVICE)
+        model.eval()
+        return model
+
+    # Архитектура сети восстанавливается по конфигурации, сохраненной в чекпоинте
+    if is_weights_file(model_path):
+        state_dict, metadata = load_weights(model_path)
+        config = metadata.get("architecture")
+    else:
+        state_dict, config = read_model_state(torch.load(model_path, map_location=DEVICE))
+    model = build_model(config)
+    # Параметры модели становятся загруженными тензорами (для плоского формата - представлениями файла), без копирования
+    model.load_state_dict(state_dict, assign=True)
     model.to(DEVICE)
     model.eval()
-    return model
+    return prepare_model(fuse_batch_norm(model), precision)
+
+def load_model(model_path, precision="fp32", backend=None):
+    # Модель берется из общего кэша процесса, повторные вызовы не читают файл заново
+    backend = backend or backend_for_path(model_path)
+    return model_cache.get(model_path, load_backend_model, backend, precision)
 
-def analyze_return(image_path, model_path, threshold=0.3):
-    model = load_model(model_path)
-    
-    with open(image_path, "rb") as f:
+def read_image(image_path):
+    with profiler.span("decode"), open(image_path, "rb") as f:
         pil_img = Image.open(io.BytesIO(f.read()))
         pil_img = pil_img.convert("RGB")
-        original_img = np.array(pil_img)[:, :, ::-1]
+        original_img = cv2.cvtColor(np.array(pil_img), cv2.COLOR_RGB2BGR)
         img_gray = np.array(pil_img.convert("L"))
+    return original_img, img_gray
 
-    orig_h, original_w = img_gray.shape
-    img_norm = img_gray.astype(np.float32) / 255.0
-    img_resized = cv2.resize(img_norm, (624, 320))
+def preprocess(img_gray):
+    with profiler.span("preprocess"):
+        img_norm = img_gray.astype(np.float32) / 255.0
+        return cv2.resize(img_norm, INPUT_SIZE)
+
+def draw_contours(original_img, pred, threshold, copy=True):
+    with profiler.span("contours"):
+        orig_h, original_w = original_img.shape[:2]
+        contours = find_contours(pred, threshold, (original_w, orig_h))
+        result = original_img.copy() if copy else original_img
+        cv2.drawContours(result, contours, -1, (0, 0, 255), 2)
+        return result
+
+def predict_full_resolution(model, img_gray, tile_size=TILE_SIZE, overlap=OVERLAP, blend="cosine", batch_size=4,
+                            precision="fp32"):
+    with profiler.span("forward_tiled"):
+        return predict_tiled(
+            model, img_gray, tile_size=tile_size, overlap=overlap, blend=blend,
+            batch_size=batch_size, device=DEVICE, precision=precision,
+        )
+
+def predict_resized(model, img_gray, precision="fp32"):
+    img_resized = preprocess(img_gray)
     img_tensor = torch.tensor(np.expand_dims(img_resized, axis=(0, 1)), dtype=torch.float32).to(DEVICE)
 
-    with torch.no_grad():
-        pred = model(img_tensor)
-        if not torch.is_floating_point(pred):
-            raise ValueError("Model output is not a floating-point tensor")
+    with profiler.span("forward"):
+        pred = infer(model, img_tensor, precision)
+    if not torch.is_floating_point(pred):
+        raise ValueError("Model output is not a floating-point tensor")
+    return pred.squeeze().cpu().numpy()
+
+def cache_key(image_path, model_path, tiled=False, tile_size=TILE_SIZE, overlap=OVERLAP, blend="cosine",
+              precision="fp32", backend=None):
+    # Карта вероятностей зависит от содержимого снимка и чекпоинта, а также от режима и точности вывода
+    backend = backend or backend_for_path(model_path)
+    mode = f"tiled:{tuple(tile_size)}:{tuple(overlap)}:{blend}" if tiled else f"resized:{INPUT_SIZE}"
+    return result_key(file_hash(image_path), checkpoint_hash(model_path), f"{mode}:{precision}:{backend}")
+
+def predict_probability(image_path, model_path, img_gray, tiled=False, tile_size=TILE_SIZE, overlap=OVERLAP,
+                        blend="cosine", precision="fp32", backend=None, cache=None):
+    def compute():
+        # Модель загружается только при промахе кэша
+        model = load_model(model_path, precision, backend)
+        if tiled:
+            # Скользящее окно по сцене в исходном разрешении вместо сжатия до 624x320
+            return predict_full_resolution(model, img_gray, tile_size, overlap, blend, precision=precision)
+        return predict_resized(model, img_gray, precision)
+
+    if cache is None:
+        return compute()
+    key = cache_key(image_path, model_path, tiled, tile_size, overlap, blend, precision, backend)
+    return cache.get_or_compute(key, compute)
+
+def check_tiled_size(image_path, max_pixels=MAX_TILED_PIXELS):
+    height, width = raster_shape(image_path)
+    if height * width > max_pixels:
+        raise ValueError(
+            f"Сцена {width}x{height} больше лимита режима окон ({max_pixels / 1e6:.0f} Мпикс): "
+            f"используйте потоковую обработку (analyze_raster, --raster)"
+        )
+
+def _exceeds_tiled_size(image_path, max_pixels):
+    try:
+        check_tiled_size(image_path, max_pixels)
+    except ValueError:
+        return True
+    except Exception:
+        # Нечитаемый заголовок: ошибка будет сообщена при декодировании
+        return False
+    return False
+
+def analyze_return(image_path, model_path, threshold=0.3, tiled=False, tile_size=TILE_SIZE,
+                   overlap=OVERLAP, blend="cosine", precision="fp32", backend=None, cache=None):
+    if tiled:
+        check_tiled_size(image_path)
+    original_img, img_gray = read_image(image_path)
+    prob = predict_probability(
+        image_path, model_path, img_gray, tiled, tile_size, overlap, blend, precision, backend, cache,
+    )
+    return draw_contours(original_img, prob, threshold, copy=False)
+
+def structured_result(image_path, original_img, prob, threshold=0.3, epsilon=1.0, min_area=0.0,
+                      georeferenced=True, overlay=False):
+    height, width = original_img.shape[:2]
+    with profiler.span("polygons"):
+        polygons = extract_polygons(prob, threshold, (width, height), epsilon, min_area)
+    result = {
+        "image": os.path.basename(image_path),
+        "width": width,
+        "height": height,
+        "crs": "pixel",
+        "polygons": polygons,
+        "overlay": None,
+    }
+    if overlay:
+        # Наложение рисуется по упрощенным полигонам и только по запросу
+        result["overlay"] = draw_polygons(original_img, polygons)
+    transform = read_world_file(image_path) if georeferenced else None
+    if transform is not None:
+        result["crs"] = "world"
+        result["transform"] = list(transform)
+        result["polygons"] = georeference(polygons, transform)
+    return result
+
+def result_properties(result):
+    return {k: v for k, v in result.items() if k not in ("polygons", "overlay")}
+
+def analyze_polygons(image_path, model_path, threshold=0.3, epsilon=1.0, min_area=0.0, georeferenced=True,
+                     overlay=False, tiled=False, tile_size=TILE_SIZE, overlap=OVERLAP, blend="cosine",
+                     precision="fp32", backend=None, cache=None):
+    # Структурированный результат: полигоны разливов с площадью, средней уверенностью и рамкой
+    if tiled:
+        check_tiled_size(image_path)
+    original_img, img_gray = read_image(image_path)
+    prob = predict_probability(
+        image_path, model_path, img_gray, tiled, tile_size, overlap, blend, precision, backend, cache,
+    )
+    return structured_result(image_path, original_img, prob, threshold, epsilon, min_area, georeferenced, overlay)
+
+def analyze_raster(image_path, model_path, mask_path, overlay_path=None, threshold=0.3,
+                   tile_size=TILE_SIZE, overlap=OVERLAP, blend="cosine", batch_size=4, precision="fp32",
+                   backend=None):
+    # Сцена читается и записывается окнами через отображение файлов в память,
+    # поэтому в оперативной памяти находится только текущая полоса
+    model = load_model(model_path, precision, backend)
+    source = open_raster(image_path)
+
+    mask = create_raster(mask_path, source.shape, np.uint8)
+    bands = iter_tiled_probabilities(
+        model, source, tile_size=tile_size, overlap=overlap, blend=blend,
+        batch_size=batch_size, device=DEVICE, precision=precision,
+    )
+    for y0, y1, band in bands:
+        mask[y0:y1] = (band > float(threshold)).astype(np.uint8) * 255
+        mask.flush()
+
+    if overlay_path:
+        overlay = create_raster(overlay_path, source.shape + (3,), np.uint8)
+        render_overlay(source, mask, overlay)
+        overlay.flush()
+        del overlay
+    del mask
+
+def _raster_outputs(image_path, output_dir):
+    root, ext = os.path.splitext(os.path.basename(image_path))
+    out_ext = ".tif" if ext.lower() in TIFF_EXTENSIONS else ".npy"
+    return (
+        os.path.join(output_dir, f"{root}_mask{out_ext}"),
+        os.path.join(output_dir, f"{root}_overlay{out_ext}"),
+    )
+
+def analyze_rasters(image_paths, model_path, output_dir, resume=True, progress=None, **kwargs):
+    os.makedirs(output_dir, exist_ok=True)
+    processed, skipped = 0, 0
+    failed = []
+    start = time.perf_counter()
+    for path in image_paths:
+        mask_path, overlay_path = _raster_outputs(path, output_dir)
+        if resume and os.path.exists(overlay_path):
+            skipped += 1
+            continue
+        parts = [f"{os.path.splitext(p)[0]}.part{os.path.splitext(p)[1]}" for p in (mask_path, overlay_path)]
+        try:
+            analyze_raster(path, model_path, parts[0], parts[1], **kwargs)
+            os.replace(parts[0], mask_path)
+            os.replace(parts[1], overlay_path)
+            processed += 1
+        except Exception as e:
+            failed.append((path, str(e)))
+            for part in parts:
+                if os.path.exists(part):
+                    os.remove(part)
+            continue
+        if progress is not None:
+            elapsed = time.perf_counter() - start
+            progress(processed, len(image_paths) - skipped, processed / elapsed if elapsed > 0 else 0.0)
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": elapsed,
+        "images_per_sec": processed / elapsed if elapsed > 0 else 0.0,
+    }
+
+def _decode(image_path, tiled=False):
+    original_img, img_gray = read_image(image_path)
+    if tiled:
+        return original_img, img_gray
+    return original_img, preprocess(img_gray)
+
+def _part_path(out_path):
+    root, ext = os.path.splitext(out_path)
+    return root + ".part" + ext
+
+def _save_image(image, out_path):
+    # Пишем во временный файл и переименовываем, чтобы при обрыве не осталось неполного результата
+    tmp_path = _part_path(out_path)
+    with profiler.span("write"):
+        ok = cv2.imwrite(tmp_path, image)
+    if not ok:
+        raise IOError(f"Не удалось сохранить результат: {out_path}")
+    os.replace(tmp_path, out_path)
+
+def _write_overlay(original_img, pred, threshold, out_path):
+    _save_image(draw_contours(original_img, pred, threshold, copy=False), out_path)
+
+def _write_polygons(image_path, original_img, pred, threshold, out_path, output_format, overlay_path=None,
+                    epsilon=1.0, min_area=0.0):
+    result = structured_result(image_path, original_img, pred, threshold, epsilon, min_area,
+                               overlay=overlay_path is not None)
+    if overlay_path is not None:
+        _save_image(result["overlay"], overlay_path)
+    tmp_path = _part_path(out_path)
+    save_polygons(result["polygons"], tmp_path, output_format, result_properties(result))
+    os.replace(tmp_path, out_path)
+
+def result_path(image_path, output_dir, output_format="overlay"):
+    name = os.path.basename(image_path)
+    if output_format == "overlay":
+        return os.path.join(output_dir, name)
+    return os.path.join(output_dir, os.path.splitext(name)[0] + "." + output_format)
+
+def prefetch(pool, fn, items, depth):
+    futures = deque()
+    for item in items:
+        futures.append((item, pool.submit(fn, item)))
+        if len(futures) >= depth:
+            yield futures.popleft()
+    while futures:
+        yield futures.popleft()
+
+def default_workers():
+    return max(1, (os.cpu_count() or 2) // 2)
+
+def analyze_batch(image_paths, model_path, output_dir, threshold=0.3, batch_size=8,
+                  workers=None, resume=True, progress=None, tiled=False, tile_size=TILE_SIZE,
+                  overlap=OVERLAP, blend="cosine", precision="fp32", backend=None, output_format="overlay",
+                  overlay=False, epsilon=1.0, min_area=0.0, cache=None, max_pixels=MAX_TILED_PIXELS):
+    if output_format != "overlay" and output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Неизвестный формат вывода: {output_format}")
+    os.makedirs(output_dir, exist_ok=True)
+    jobs = {path: result_path(path, output_dir, output_format) for path in image_paths}
+    skipped = 0
+    if resume:
+        # Уже обработанные изображения пропускаются, так что прерванный запуск продолжается с места остановки
+        done = [path for path, out_path in jobs.items() if os.path.exists(out_path)]
+        for path in done:
+            del jobs[path]
+        skipped = len(done)
+
+    workers = workers or default_workers()
+    model = None
+    processed = 0
+    failed = []
+    start = time.perf_counter()
+    if tiled:
+        # Крупные сцены не декодируются целиком: маска и наложение пишутся по полосам, как с --raster
+        large = [path for path in jobs if _exceeds_tiled_size(path, max_pixels)]
+        for path in large:
+            del jobs[path]
+        if large and output_format != "overlay":
+            for path in large:
+                failed.append((path, f"Сцена больше лимита режима окон ({max_pixels / 1e6:.0f} Мпикс), "
+                                     f"полигоны для нее не строятся: используйте --raster"))
+        elif large:
+            streamed = analyze_rasters(
+                large, model_path, output_dir, resume=resume, progress=progress, threshold=threshold,
+                tile_size=tile_size, overlap=overlap, blend=blend, batch_size=batch_size,
+                precision=precision, backend=backend,
+            )
+            processed = streamed["processed"]
+            skipped += streamed["skipped"]
+            failed.extend(streamed["failed"])
+    total = len(jobs) + processed
+
+    def finish(item, future):
+        nonlocal processed
+        try:
+            future.result()
+            processed += 1
+        except Exception as e:
+            failed.append((item, str(e)))
+            return
+        if progress is not None:
+            elapsed = time.perf_counter() - start
+            progress(processed, total, processed / elapsed if elapsed > 0 else 0.0)
+
+    def decode(path):
+        original_img, img = _decode(path, tiled)
+        key = cached = None
+        if cache is not None:
+            # Хэш содержимого и чтение кэша выполняются в потоках декодирования
+            key = cache_key(path, model_path, tiled, tile_size, overlap, blend, precision, backend)
+            cached = cache.get(key)
+        return original_img, img, key, cached
+
+    with ThreadPoolExecutor(workers) as decode_pool, ThreadPoolExecutor(workers) as write_pool:
+        decoded = prefetch(
+            decode_pool, decode, list(jobs),
+            depth=2 * (1 if tiled else batch_size),
+        )
+        writes = deque()
+        batch = []
+        while True:
+            item = next(decoded, None)
+            if item is not None:
+                path, future = item
+                try:
+                    batch.append((path, future.result()))
+                except Exception as e:
+                    failed.append((path, str(e)))
+                if len(batch) < (1 if tiled else batch_size):
+                    continue
+            if not batch:
+                break
+
+            # Для изображений, чьи карты уже есть в кэше, модель не вызывается
+            preds = [cached for _, (_, _, _, cached) in batch]
+            missing = [i for i, pred in enumerate(preds) if pred is None]
+            if missing:
+                if model is None:
+                    model = load_model(model_path, precision, backend)
+                if tiled:
+                    # В режиме окон батчи собираются из окон одной сцены
+                    computed = [
+                        predict_full_resolution(model, batch[i][1][1], tile_size, overlap, blend, batch_size, precision)
+                        for i in missing
+                    ]
+                else:
+                    imgs = np.stack([batch[i][1][1] for i in missing])
+                    img_tensor = torch.from_numpy(imgs).unsqueeze(1).to(DEVICE)
+                    with profiler.span("forward"):
+                        computed = infer(model, img_tensor, precision).squeeze(1).cpu().numpy()
+                for i, pred in zip(missing, computed):
+                    if cache is not None:
+                        cache.put(batch[i][1][2], pred)
+                        # Порог применяется к тому же квантованному значению, что будет прочитано из кэша
+                        pred = dequantize(quantize(pred))
+                    preds[i] = pred
+
+            for (path, (original_img, _, _, _)), pred in zip(batch, preds):
+                if output_format == "overlay":
+                    future = write_pool.submit(_write_overlay, original_img, pred, threshold, jobs[path])
+                else:
+                    overlay_path = os.path.join(output_dir, os.path.basename(path)) if overlay else None
+                    future = write_pool.submit(
+                        _write_polygons, path, original_img, pred, threshold, jobs[path], output_format,
+                        overlay_path, epsilon, min_area,
+                    )
+                writes.append((path, future))
+            batch = []
+
+            # Ограничиваем очередь записи, чтобы не держать в памяти слишком много исходных изображений
+            while len(writes) > 2 * workers:
+                finish(*writes.popleft())
+            if item is None:
+                break
+
+        while writes:
+            finish(*writes.popleft())
+
+    elapsed = time.perf_counter() - start
+    return {
+        "processed": processed,
+        "skipped": skipped,
+        "failed": failed,
+        "seconds": elapsed,
+        "images_per_sec": processed / elapsed if elapsed > 0 else 0.0,
+    }
+
+def main():
+    parser = argparse.ArgumentParser(description="Пакетный анализ изображений на наличие разливов нефти")
+    parser.add_argument('--input', required=True, help="Папка с изображениями или шаблон пути (например, 'tiles/*.jpg')")
+    parser.add_argument('--model', required=True, help="Путь к модели (.pth, .safetensors, TorchScript .pt или .onnx)")
+    parser.add_argument('--output', required=True, help="Папка для сохранения результатов")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Порог бинаризации маски (по умолчанию: 0.3)")
+    parser.add_argument('--batch-size', type=int, default=8, help="Размер батча (по умолчанию: 8)")
+    parser.add_argument('--workers', type=int, default=None, help="Количество потоков декодирования и записи")
+    parser.add_argument('--no-resume', action='store_true', help="Обработать заново уже готовые изображения")
+    parser.add_argument('--tiled', action='store_true', help="Анализ скользящим окном в исходном разрешении")
+    parser.add_argument('--tile', type=int, nargs=2, default=TILE_SIZE, metavar=('H', 'W'),
+                        help="Размер окна (по умолчанию: 320 624)")
+    parser.add_argument('--overlap', type=int, nargs=2, default=OVERLAP, metavar=('H', 'W'),
+                        help="Перекрытие окон (по умолчанию: 64 128)")
+    parser.add_argument('--blend', choices=BLEND_MODES, default="cosine", help="Весовая функция смешивания окон")
+    parser.add_argument('--precision', choices=PRECISIONS, default="fp32",
+                        help="Точность вычислений: fp32, bf16 или fp16 (по умолчанию: fp32)")
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help="Бэкенд вывода (по умолчанию определяется по расширению файла модели)")
+    parser.add_argument('--format', choices=("overlay",) + OUTPUT_FORMATS, default="overlay",
+                        help="Формат результата: изображение с контурами, полигоны GeoJSON или компактный npz")
+    parser.add_argument('--with-overlay', action='store_true',
+                        help="Для форматов geojson и npz дополнительно сохранять изображение с контурами")
+    parser.add_argument('--epsilon', type=float, default=1.0,
+                        help="Допуск упрощения полигонов в пикселях маски модели (по умолчанию: 1.0)")
+    parser.add_argument('--min-area', type=float, default=0.0,
+                        help="Минимальная площадь полигона в пикселях исходного изображения")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Папка кэша карт вероятностей: повторный запуск с другим порогом не вызывает модель")
+    parser.add_argument('--cache-size-mb', type=float, default=1024,
+                        help="Максимальный размер кэша в МБ (по умолчанию: 1024)")
+    parser.add_argument('--profile', action='store_true', help="Вывести суммарное время по этапам обработки")
+    parser.add_argument('--trace', default=None, help="Сохранить трассировку этапов в формате Chrome (JSON)")
+    parser.add_argument('--raster', action='store_true',
+                        help="Потоковая обработка больших растров (.tif, .npy) с записью маски и наложения по окнам")
+    parser.add_argument('--max-tiled-mpix', type=float, default=MAX_TILED_PIXELS / 1e6,
+                        help="Сцены крупнее (в Мпикс) в режиме --tiled обрабатываются потоково, как с --raster: "
+                             "сохраняются <имя>_mask и <имя>_overlay (по умолчанию: "
+                             f"{MAX_TILED_PIXELS / 1e6:.0f})")
+    args = parser.parse_args()
+
+    image_paths = collect_images(args.input)
+    if not image_paths:
+        parser.error(f"Не найдено изображений: {args.input}")
+
+    profiler.enabled = args.profile or bool(args.trace)
+    cache = ProbabilityCache(args.cache_dir, int(args.cache_size_mb * 1024 ** 2)) if args.cache_dir else None
 
-    mask = (pred.squeeze().cpu().numpy() > float(threshold)).astype(np.uint8)
-    mask = cv2.resize(mask, (original_w, orig_h))
+    def progress(done, total, speed):
+        print(f"\rОбработано {done}/{total} ({speed:.1f} изобр./с)", end="", flush=True)
 
-    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
-    result = original_img.copy()
-    cv2.drawContours(result, contours, -1, (0, 0, 255), 2)
+    if args.raster:
+        stats = analyze_rasters(
+            image_paths, args.model, args.output, resume=not args.no_resume, progress=progress,
+            threshold=args.threshold, tile_size=tuple(args.tile), overlap=tuple(args.overlap),
+            blend=args.blend, batch_size=args.batch_size, precision=args.precision,
+            backend=args.backend,
+        )
+    else:
+        stats = analyze_batch(
+            image_paths, args.model, args.output, threshold=args.threshold,
+            batch_size=args.batch_size, workers=args.workers, resume=not args.no_resume,
+            progress=progress, tiled=args.tiled, tile_size=tuple(args.tile),
+            overlap=tuple(args.overlap), blend=args.blend, precision=args.precision,
+            backend=args.backend, output_format=args.format, overlay=args.with_overlay,
+            epsilon=args.epsilon, min_area=args.min_area, cache=cache,
+            max_pixels=int(args.max_tiled_mpix * 1e6),
+        )
+    print()
+    print(f"Готово: {stats['processed']} изображений за {stats['seconds']:.1f} с "
+          f"({stats['images_per_sec']:.1f} изобр./с), пропущено: {stats['skipped']}")
+    for path, error in stats["failed"]:
+        print(f"Ошибка при обработке {path}: {error}")
+    if cache is not None:
+        print(f"Кэш вероятностей: попаданий {cache.hits}, промахов {cache.misses}")
+    if profiler.enabled:
+        # Этапы в разных потоках перекрываются, поэтому сумма может превышать общее время
+        print(f"Этапы: {format_stages(profiler.summary())}")
+    if args.trace:
+        profiler.export_chrome_trace(args.trace)
+        print(f"Трассировка сохранена в: {args.trace}")
 
-    return result
\ No newline at end of file
+if __name__ == "__main__":
+    main()
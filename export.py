@@ -0,0 +1,65 @@
+import argparse
+import torch
+from detect import load_backend_model
+from model import INPUT_SIZE
+
+
+def example_input(batch_size=1):
+    width, height = INPUT_SIZE
+    return torch.rand(batch_size, 1, height, width)
+
+
+def export_torchscript(model, path):
+    with torch.no_grad():
+        traced = torch.jit.trace(model, example_input())
+    # Замороженный модуль хранит веса как константы, что позволяет JIT сворачивать операции
+    traced = torch.jit.freeze(traced)
+    traced.save(path)
+
+
+def export_onnx(model, path, opset=None):
+    kwargs = {} if opset is None else {"opset_version": opset}
+    torch.onnx.export(
+        model, (example_input(),), path,
+        input_names=["image"], output_names=["mask"],
+        dynamic_axes={"image": {0: "batch"}, "mask": {0: "batch"}},
+        **kwargs,
+    )
+
+
+def load_export_model(model_path):
+    # Собственная копия модели: общий экземпляр из кэша процесса не переносится на CPU
+    # и не получает подготовку под пониженную точность
+    return load_backend_model(model_path, "eager").cpu()
+
+
+def max_difference(reference, model, batch_size=2):
+    batch = example_input(batch_size)
+    with torch.no_grad():
+        return (reference(batch) - model(batch)).abs().max().item()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Экспорт обученной модели UNet в TorchScript и ONNX")
+    parser.add_argument('--model', required=True, help="Путь к параметрам модели (model.pth)")
+    parser.add_argument('--torchscript', default=None, help="Путь для сохранения модели TorchScript (.pt)")
+    parser.add_argument('--onnx', default=None, help="Путь для сохранения модели ONNX (.onnx)")
+    parser.add_argument('--opset', type=int, default=None, help="Версия набора операций ONNX")
+    args = parser.parse_args()
+
+    if not args.torchscript and not args.onnx:
+        parser.error("Укажите --torchscript и/или --onnx")
+
+    model = load_export_model(args.model)
+    if args.torchscript:
+        export_torchscript(model, args.torchscript)
+        diff = max_difference(model, load_backend_model(args.torchscript, "torchscript").cpu())
+        print(f"TorchScript сохранен в: {args.torchscript} (макс. отклонение: {diff:.2e})")
+    if args.onnx:
+        export_onnx(model, args.onnx, args.opset)
+        diff = max_difference(model, load_backend_model(args.onnx, "onnx"))
+        print(f"ONNX сохранен в: {args.onnx} (макс. отклонение: {diff:.2e})")
+
+
+if __name__ == "__main__":
+    main()
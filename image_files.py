@@ -0,0 +1,17 @@
+import glob
+import os
+
+# Модуль без torch и cv2: общий список входных файлов для detect, test и генератора нагрузки
+ENCODED_EXTENSIONS = ('.jpg', '.jpeg', '.png', '.bmp', '.tif', '.tiff')
+IMAGE_EXTENSIONS = ENCODED_EXTENSIONS + ('.npy',)
+
+
+def collect_images(source, extensions=IMAGE_EXTENSIONS):
+    if os.path.isdir(source):
+        paths = [
+            os.path.join(source, name) for name in os.listdir(source)
+            if name.lower().endswith(extensions)
+        ]
+    else:
+        paths = glob.glob(source)
+    return sorted(paths)
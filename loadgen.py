@@ -0,0 +1,110 @@
+import argparse
+import asyncio
+import json
+import time
+import numpy as np
+# Клиент не импортирует detect, чтобы не загружать torch и cv2 в процесс генератора нагрузки
+from image_files import collect_images, ENCODED_EXTENSIONS
+
+
+async def request(reader, writer, method, path, body=b"", content_type="application/octet-stream"):
+    writer.write(
+        f"{method} {path} HTTP/1.1\r\nHost: localhost\r\nContent-Type: {content_type}\r\n"
+        f"Content-Length: {len(body)}\r\n\r\n".encode("latin-1") + body
+    )
+    await writer.drain()
+    status = int((await reader.readline()).split()[1])
+    headers = {}
+    while True:
+        line = await reader.readline()
+        if not line.strip():
+            break
+        name, _, value = line.decode("latin-1").partition(":")
+        headers[name.strip().lower()] = value.strip()
+    payload = await reader.readexactly(int(headers.get("content-length", 0)))
+    return status, payload
+
+
+async def client(host, port, images, requests, output, latencies, errors):
+    # Каждый клиент держит одно keep-alive соединение и отправляет запросы последовательно
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        for i in range(requests):
+            body = images[i % len(images)]
+            start = time.perf_counter()
+            status, _ = await request(reader, writer, "POST", f"/predict?output={output}", body, "image/jpeg")
+            if status == 200:
+                latencies.append(time.perf_counter() - start)
+            else:
+                errors.append(status)
+    finally:
+        writer.close()
+
+
+async def fetch_metrics(host, port):
+    reader, writer = await asyncio.open_connection(host, port)
+    try:
+        _, payload = await request(reader, writer, "GET", "/metrics")
+    finally:
+        writer.close()
+    return json.loads(payload)
+
+
+async def run_load(host, port, images, concurrency, requests, output):
+    latencies = []
+    errors = []
+    before = await fetch_metrics(host, port)
+    start = time.perf_counter()
+    await asyncio.gather(*[
+        client(host, port, images, requests, output, latencies, errors) for _ in range(concurrency)
+    ])
+    elapsed = time.perf_counter() - start
+    after = await fetch_metrics(host, port)
+    batches = after["batches"] - before["batches"]
+    return {
+        "concurrency": concurrency,
+        "requests": len(latencies),
+        "errors": len(errors),
+        "seconds": elapsed,
+        "throughput": len(latencies) / elapsed if elapsed > 0 else 0.0,
+        "latency_ms": {f"p{q}": float(np.percentile(latencies, q)) * 1000 if latencies else 0.0 for q in (50, 95, 99)},
+        "mean_batch_size": (after["requests"] - before["requests"]) / batches if batches else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Генератор нагрузки для локального сервера анализа (server.py)")
+    parser.add_argument('--input', required=True, help="Папка с изображениями или шаблон пути")
+    parser.add_argument('--host', default="127.0.0.1", help="Адрес сервера (по умолчанию: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Порт сервера (по умолчанию: 8080)")
+    parser.add_argument('--concurrency', type=int, nargs='+', default=[1, 4, 16],
+                        help="Количество одновременных клиентов; несколько значений — несколько прогонов")
+    parser.add_argument('--requests', type=int, default=8, help="Запросов на одного клиента (по умолчанию: 8)")
+    parser.add_argument('--output', choices=['mask', 'polygons', 'overlay'], default='polygons',
+                        help="Запрашиваемый формат результата (по умолчанию: polygons)")
+    parser.add_argument('--json', default=None, help="Путь для сохранения результатов в JSON")
+    args = parser.parse_args()
+
+    # Сервер декодирует только закодированные изображения, массивы .npy не отправляются
+    paths = collect_images(args.input, ENCODED_EXTENSIONS)
+    if not paths:
+        parser.error(f"Не найдено изображений: {args.input}")
+    images = []
+    for path in paths:
+        with open(path, "rb") as f:
+            images.append(f.read())
+
+    results = []
+    for concurrency in args.concurrency:
+        stats = asyncio.run(run_load(args.host, args.port, images, concurrency, args.requests, args.output))
+        results.append(stats)
+        print(f"Клиентов {concurrency}: {stats['throughput']:.2f} запр./с, "
+              f"задержка p50 {stats['latency_ms']['p50']:.0f} мс, p95 {stats['latency_ms']['p95']:.0f} мс, "
+              f"средний батч {stats['mean_batch_size']:.1f}, ошибок {stats['errors']}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
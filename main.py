@@ -1,14 +1,31 @@
 import sys
+import importlib
 from PyQt5.QtWidgets import (
-    QApplication, QMainWindow, QAction, QStackedWidget
+    QApplication, QMainWindow, QAction, QStackedWidget, QLabel
 )
-from widgets.analyze_ui import ImageAnalysisWidget
-from widgets.train_ui import TrainingWidget
-from widgets.test_ui import TestingWidget
+from PyQt5.QtCore import Qt, QThread, QTimer
+
+# Вкладки создаются при первом открытии: модули виджетов тянут за собой torch и cv2
+MODES = (
+    ("Анализ изображения", "widgets.analyze_ui", "ImageAnalysisWidget"),
+    ("Обучение", "widgets.train_ui", "TrainingWidget"),
+    ("Тестирование", "widgets.test_ui", "TestingWidget"),
+)
+WARMUP_MODULES = ("torch", "cv2", "detect", "test", "train", "widgets.analyze_ui", "widgets.test_ui", "widgets.train_ui")
+
+
+class WarmupThread(QThread):
+    # Фоновый импорт тяжелых модулей после показа окна, чтобы первое открытие вкладки было быстрым
+    def run(self):
+        for name in WARMUP_MODULES:
+            try:
+                importlib.import_module(name)
+            except Exception:
+                pass
 
 
 class MainWindow(QMainWindow):
-    def __init__(self):
+    def __init__(self, lazy=True, warmup=True):
         super().__init__()
         self.setWindowTitle("Обнаружение разливов нефти")
         self.setMinimumSize(600, 500)
@@ -16,30 +33,47 @@ class MainWindow(QMainWindow):
         menubar = self.menuBar()
         mode_menu = menubar.addMenu("Режим")
 
-        analysis_action = QAction("Анализ изображения", self)
-        training_action = QAction("Обучение", self)
-        testing_action = QAction("Тестирование", self)
-
-        mode_menu.addAction(analysis_action)
-        mode_menu.addAction(training_action)
-        mode_menu.addAction(testing_action)
-
-        analysis_action.triggered.connect(lambda: self.switch_mode(0))
-        training_action.triggered.connect(lambda: self.switch_mode(1))
-        testing_action.triggered.connect(lambda: self.switch_mode(2))
-
         self.stack = QStackedWidget()
-        self.analysis_widget = ImageAnalysisWidget()
-        self.training_widget = TrainingWidget()
-        self.testing_widget = TestingWidget()
-
-        self.stack.addWidget(self.analysis_widget)
-        self.stack.addWidget(self.training_widget)
-        self.stack.addWidget(self.testing_widget)
+        self.widgets = [None] * len(MODES)
+        for index, (title, _, _) in enumerate(MODES):
+            action = QAction(title, self)
+            action.triggered.connect(lambda checked=False, index=index: self.switch_mode(index))
+            mode_menu.addAction(action)
+            placeholder = QLabel("Загрузка...")
+            placeholder.setAlignment(Qt.AlignCenter)
+            self.stack.addWidget(placeholder)
         self.setCentralWidget(self.stack)
+
+        # Вкладка анализа не импортирует torch при создании, остальные строятся при первом переключении
+        for index in range(len(MODES) if not lazy else 1):
+            self.build_mode(index)
+        self.warmup_thread = None
+        if lazy and warmup:
+            QTimer.singleShot(0, self.start_warmup)
         self.switch_mode(0)
 
+    def build_mode(self, index):
+        if self.widgets[index] is None:
+            _, module_name, class_name = MODES[index]
+            widget = getattr(importlib.import_module(module_name), class_name)()
+            placeholder = self.stack.widget(index)
+            current = self.stack.currentIndex()
+            self.stack.insertWidget(index, widget)
+            self.stack.removeWidget(placeholder)
+            placeholder.deleteLater()
+            self.stack.setCurrentIndex(current)
+            self.widgets[index] = widget
+        return self.widgets[index]
+
+    def start_warmup(self):
+        self.warmup_thread = WarmupThread()
+        self.warmup_thread.start()
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.warmup_thread.wait)
+
     def switch_mode(self, index):
+        self.build_mode(index)
         self.stack.setCurrentIndex(index)
 
 if __name__ == "__main__":
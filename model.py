@@ -1,39 +1,153 @@
+import contextlib
 import torch
 import torch.nn as nn
+from torch.utils.checkpoint import checkpoint
+from torch.nn.utils.fusion import fuse_conv_bn_eval
+
+PRECISIONS = ("fp32", "bf16", "fp16")
+INPUT_SIZE = (624, 320)
+
+def autocast(device, precision="fp32"):
+    if precision not in PRECISIONS:
+        raise ValueError(f"Неизвестная точность вычислений: {precision}")
+    if precision == "fp32":
+        return contextlib.nullcontext()
+    dtype = torch.bfloat16 if precision == "bf16" else torch.float16
+    return torch.autocast(device_type=torch.device(device).type, dtype=dtype)
+
+def prepare_model(model, precision="fp32"):
+    # В режимах пониженной точности используем channels_last: так сверточные ядра работают быстрее
+    if precision != "fp32":
+        model = model.to(memory_format=torch.channels_last)
+    return model
+
+def infer(model, batch, precision="fp32"):
+    if precision != "fp32":
+        batch = batch.contiguous(memory_format=torch.channels_last)
+    with torch.no_grad(), autocast(batch.device, precision):
+        pred = model(batch)
+    return pred.float() if precision != "fp32" else pred
+
+# Стандартная конфигурация совпадает с исходной сетью: глубина 2, каналы 64/128/256
+DEFAULT_CONFIG = {"in_channels": 1, "out_channels": 1, "width": 1.0, "depth": 2, "separable": False, "batch_norm": False}
+BASE_CHANNELS = 64
+# Варианты для сравнения задержки и качества
+VARIANTS = {
+    "base": {},
+    "base-bn": {"batch_norm": True},
+    "slim": {"width": 0.5, "batch_norm": True},
+    "slim-separable": {"width": 0.5, "separable": True, "batch_norm": True},
+    "tiny": {"width": 0.25, "batch_norm": True},
+    "tiny-deep": {"width": 0.25, "depth": 3, "separable": True, "batch_norm": True},
+}
+
+def conv_layers(in_c, out_c, separable=False, batch_norm=False):
+    # Перед BatchNorm смещение свертки не нужно; слои идут подряд, чтобы BatchNorm можно было свернуть в свертку
+    if separable:
+        layers = [nn.Conv2d(in_c, in_c, 3, padding=1, groups=in_c, bias=False),
+                  nn.Conv2d(in_c, out_c, 1, bias=not batch_norm)]
+    else:
+        layers = [nn.Conv2d(in_c, out_c, 3, padding=1, bias=not batch_norm)]
+    if batch_norm:
+        layers.append(nn.BatchNorm2d(out_c))
+    return layers + [nn.ReLU(inplace=True)]
+
+def fuse_batch_norm(model):
+    # Для вывода параметры BatchNorm переносятся в веса предшествующей свертки
+    for module in model.modules():
+        if isinstance(module, nn.Sequential):
+            for i in range(len(module) - 1):
+                if isinstance(module[i], nn.Conv2d) and isinstance(module[i + 1], nn.BatchNorm2d):
+                    module[i] = fuse_conv_bn_eval(module[i], module[i + 1])
+                    module[i + 1] = nn.Identity()
+    return model
+
+def check_input_size(depth, size=INPUT_SIZE):
+    # Каждый уровень сети делит разрешение пополам, поэтому стороны входа должны делиться на 2**depth
+    multiple = 2 ** depth
+    if any(side % multiple for side in size):
+        raise ValueError(f"Стороны входа {tuple(size)} должны быть кратны {multiple} при глубине сети {depth}")
+
+@contextlib.contextmanager
+def preserved_batch_norm_stats(module):
+    # При пересчете активаций BatchNorm снова работает в режиме обучения; статистики восстанавливаются,
+    # чтобы за шаг они обновлялись один раз, как без пересчета
+    buffers = [(b, b.clone()) for m in module.modules() if isinstance(m, nn.BatchNorm2d) for b in m.buffers()]
+    try:
+        yield
+    finally:
+        with torch.no_grad():
+            for buffer, saved in buffers:
+                buffer.copy_(saved)
+
+def build_model(config=None, input_size=None, **kwargs):
+    # Лишние ключи (например, name из метаданных чекпоинта) игнорируются
+    config = {k: v for k, v in (config or {}).items() if k in DEFAULT_CONFIG}
+    if input_size is not None:
+        check_input_size(config.get("depth", DEFAULT_CONFIG["depth"]), input_size)
+    return UNet(**config, **kwargs)
+
+def model_state(model):
+    # Стандартная сеть сохраняется как обычный state_dict; для остальных вариантов рядом хранится конфигурация
+    if model.config == DEFAULT_CONFIG:
+        return model.state_dict()
+    return {"config": model.config, "state_dict": model.state_dict()}
+
+def read_model_state(state):
+    if "state_dict" in state and "config" in state:
+        return state["state_dict"], state["config"]
+    return state, dict(DEFAULT_CONFIG)
 
 class UNet(nn.Module):
-    def __init__(self, in_channels=1, out_channels=1):
+    def __init__(self, in_channels=1, out_channels=1, gradient_checkpointing=False, width=1.0, depth=2,
+                 separable=False, batch_norm=False):
         super(UNet, self).__init__()
+        if depth < 1:
+            raise ValueError("Глубина сети должна быть не меньше 1")
+        self.gradient_checkpointing = gradient_checkpointing
+        self.depth = depth
+        # Кратность сторон входа; проверяется при обучении и при выборе размера окна
+        self.input_multiple = 2 ** depth
+        self.config = {"in_channels": in_channels, "out_channels": out_channels, "width": width, "depth": depth,
+                       "separable": separable, "batch_norm": batch_norm}
 
-        def conv_block(in_c, out_c):
+        def conv_block(in_c, out_c, first=False):
+            # Первая свертка сети остается обычной: поканальная свертка по входному изображению бесполезна
             return nn.Sequential(
-                nn.Conv2d(in_c, out_c, 3, padding=1),
-                nn.ReLU(inplace=True),
-                nn.Conv2d(out_c, out_c, 3, padding=1),
-                nn.ReLU(inplace=True)
+                *conv_layers(in_c, out_c, separable and not first, batch_norm),
+                *conv_layers(out_c, out_c, separable, batch_norm)
             )
 
-        self.enc1 = conv_block(in_channels, 64)
-        self.enc2 = conv_block(64, 128)
+        channels = [max(1, int(round(BASE_CHANNELS * width))) * 2 ** i for i in range(depth + 1)]
+        # Имена слоев enc1, enc2, ..., upconv1, ... сохраняют ключи state_dict исходной сети
+        for i in range(1, depth + 1):
+            setattr(self, f"enc{i}", conv_block(in_channels if i == 1 else channels[i - 2], channels[i - 1], i == 1))
         self.pool = nn.MaxPool2d(2, 2)
 
-        self.bottleneck = conv_block(128, 256)
+        self.bottleneck = conv_block(channels[depth - 1], channels[depth])
+
+        for i in range(depth, 0, -1):
+            setattr(self, f"upconv{i}", nn.ConvTranspose2d(channels[i], channels[i - 1], 2, 2))
+            setattr(self, f"dec{i}", conv_block(channels[i], channels[i - 1]))
 
-        self.upconv2 = nn.ConvTranspose2d(256, 128, 2, 2)
-        self.dec2    = conv_block(256, 128)
-        self.upconv1 = nn.ConvTranspose2d(128, 64, 2, 2)
-        self.dec1    = conv_block(128, 64)
+        self.final_conv = nn.Conv2d(channels[0], out_channels, 1)
 
-        self.final_conv = nn.Conv2d(64, out_channels, 1)
+    def block(self, conv_block, x):
+        # Активации внутри блока не сохраняются, а пересчитываются при обратном проходе
+        if self.gradient_checkpointing and self.training and torch.is_grad_enabled():
+            return checkpoint(
+                conv_block, x, use_reentrant=False,
+                context_fn=lambda: (contextlib.nullcontext(), preserved_batch_norm_stats(conv_block)),
+            )
+        return conv_block(x)
 
     def forward(self, x):
-        e1 = self.enc1(x)
-        e2 = self.enc2(self.pool(e1))
-        b  = self.bottleneck(self.pool(e2))
-        d2 = self.upconv2(b)
-        d2 = torch.cat([d2, e2], dim=1)
-        d2 = self.dec2(d2)
-        d1 = self.upconv1(d2)
-        d1 = torch.cat([d1, e1], dim=1)
-        d1 = self.dec1(d1)
-        return torch.sigmoid(self.final_conv(d1))
\ No newline at end of file
+        skips = []
+        for i in range(1, self.depth + 1):
+            x = self.block(getattr(self, f"enc{i}"), x if i == 1 else self.pool(x))
+            skips.append(x)
+        x = self.block(self.bottleneck, self.pool(x))
+        for i in range(self.depth, 0, -1):
+            x = torch.cat([getattr(self, f"upconv{i}")(x), skips[i - 1]], dim=1)
+            x = self.block(getattr(self, f"dec{i}"), x)
+        return torch.sigmoid(self.final_conv(x))
@@ -0,0 +1,64 @@
+import os
+import threading
+from collections import OrderedDict
+
+
+def checkpoint_key(path):
+    # Ключ учитывает время изменения и размер файла, поэтому перезаписанный чекпоинт загружается заново
+    real_path = os.path.realpath(path)
+    stat = os.stat(real_path)
+    return (real_path, stat.st_mtime_ns, stat.st_size)
+
+
+def model_nbytes(model):
+    try:
+        tensors = list(model.parameters()) + list(model.buffers())
+        return sum(t.numel() * t.element_size() for t in tensors)
+    except AttributeError:
+        return 0
+
+
+class ModelCache:
+    def __init__(self, max_models=4, max_bytes=1024 ** 3):
+        self.max_models = max_models
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self._models = OrderedDict()
+
+    def get(self, path, loader, *options):
+        key = checkpoint_key(path) + tuple(options)
+        with self._lock:
+            entry = self._models.get(key)
+            if entry is not None:
+                self._models.move_to_end(key)
+                return entry[0]
+
+            # Удаляем модели, загруженные из предыдущих версий этого же файла
+            stale = [k for k in self._models if k[0] == key[0] and k[1:3] != key[1:3]]
+            for k in stale:
+                del self._models[k]
+
+            model = loader(path, *options)
+            # Для моделей без доступных тензоров (ONNX, замороженный TorchScript) учитываем размер файла
+            self._models[key] = (model, model_nbytes(model) or key[2])
+            self._evict()
+            return model
+
+    def _evict(self):
+        while len(self._models) > 1 and (
+            len(self._models) > self.max_models or self.nbytes() > self.max_bytes
+        ):
+            self._models.popitem(last=False)
+
+    def nbytes(self):
+        return sum(size for _, size in self._models.values())
+
+    def clear(self):
+        with self._lock:
+            self._models.clear()
+
+    def __len__(self):
+        return len(self._models)
+
+
+model_cache = ModelCache()
@@ -0,0 +1,178 @@
+import json
+import os
+import numpy as np
+import cv2
+
+OUTPUT_FORMATS = ("geojson", "npz")
+
+
+def _scale(size, shape):
+    width, height = size
+    return width / shape[1], height / shape[0]
+
+
+def scale_points(points, sx, sy):
+    # Центры пикселей маски переводятся в координаты исходного изображения так же, как это делает cv2.resize
+    points = points.astype(np.float32)
+    points[..., 0] = (points[..., 0] + 0.5) * sx - 0.5
+    points[..., 1] = (points[..., 1] + 0.5) * sy - 0.5
+    return points
+
+
+def find_contours(prob, threshold, size=None):
+    # Контуры ищутся в разрешении модели и затем масштабируются, маска исходного размера не строится
+    mask = (prob > float(threshold)).astype(np.uint8)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if size is None or tuple(size) == (mask.shape[1], mask.shape[0]):
+        return contours
+    sx, sy = _scale(size, mask.shape)
+    return [np.round(scale_points(c, sx, sy)).astype(np.int32) for c in contours]
+
+
+def extract_polygons(prob, threshold, size=None, epsilon=1.0, min_area=0.0):
+    mask = (prob > float(threshold)).astype(np.uint8)
+    size = size or (mask.shape[1], mask.shape[0])
+    sx, sy = _scale(size, mask.shape)
+    contours, _ = cv2.findContours(mask, cv2.RETR_EXTERNAL, cv2.CHAIN_APPROX_SIMPLE)
+    if not contours:
+        return []
+
+    # Внешний контур соответствует одной 8-связной компоненте: по ней считаются площадь и средняя уверенность
+    count, labels, stats, _ = cv2.connectedComponentsWithStats(mask, connectivity=8)
+    confidence = np.bincount(labels.ravel(), weights=prob.ravel(), minlength=count) / np.maximum(
+        stats[:, cv2.CC_STAT_AREA], 1)
+
+    polygons = []
+    for contour in contours:
+        x, y = contour[0, 0]
+        label = labels[y, x]
+        left, top, width, height, area = stats[label]
+        area = float(area * sx * sy)
+        if area < min_area:
+            continue
+        simplified = cv2.approxPolyDP(contour, epsilon, True) if epsilon > 0 else contour
+        polygons.append({
+            "polygon": scale_points(simplified[:, 0], sx, sy),
+            "area": area,
+            "confidence": float(confidence[label]),
+            "bbox": [float(left * sx), float(top * sy), float((left + width) * sx), float((top + height) * sy)],
+        })
+    polygons.sort(key=lambda p: p["area"], reverse=True)
+    return polygons
+
+
+def world_file_path(image_path):
+    root, ext = os.path.splitext(image_path)
+    ext = ext.lstrip(".")
+    candidates = [ext[:1] + ext[-1:] + "w", ext + "w", "wld"] if ext else ["wld"]
+    for candidate in candidates:
+        for suffix in (candidate, candidate.upper()):
+            path = f"{root}.{suffix}"
+            if os.path.exists(path):
+                return path
+    return None
+
+
+def read_world_file(image_path):
+    # Файл привязки (.jgw, .tfw, .wld): A, D, B, E, C, F; C и F — координаты центра левого верхнего пикселя
+    path = world_file_path(image_path)
+    if path is None:
+        return None
+    with open(path) as f:
+        values = [float(line) for line in f.read().split()]
+    if len(values) != 6:
+        raise ValueError(f"Некорректный файл привязки: {path}")
+    return tuple(values)
+
+
+def georeference(polygons, transform):
+    a, d, b, e, c, f = transform
+    pixel_area = abs(a * e - b * d)
+
+    def apply(points):
+        x, y = points[..., 0], points[..., 1]
+        return np.stack([a * x + b * y + c, d * x + e * y + f], axis=-1)
+
+    result = []
+    for item in polygons:
+        # Границы рамки задаются по краям пикселей, поэтому смещаются на полпикселя к центрам
+        x0, y0, x1, y1 = item["bbox"]
+        corners = apply(np.array([[x0 - 0.5, y0 - 0.5], [x1 - 0.5, y0 - 0.5],
+                                  [x1 - 0.5, y1 - 0.5], [x0 - 0.5, y1 - 0.5]], dtype=np.float64))
+        result.append({
+            "polygon": apply(item["polygon"].astype(np.float64)),
+            "area": item["area"] * pixel_area,
+            "confidence": item["confidence"],
+            "bbox": [float(corners[:, 0].min()), float(corners[:, 1].min()),
+                     float(corners[:, 0].max()), float(corners[:, 1].max())],
+        })
+    return result
+
+
+def draw_polygons(image, polygons, color=(0, 0, 255), thickness=2):
+    rings = [np.round(p["polygon"]).astype(np.int32).reshape(-1, 1, 2) for p in polygons]
+    cv2.polylines(image, rings, True, color, thickness)
+    return image
+
+
+def to_geojson(polygons, properties=None):
+    features = []
+    for i, item in enumerate(polygons):
+        ring = [[float(x), float(y)] for x, y in item["polygon"]]
+        # Кольцо GeoJSON должно быть замкнутым
+        ring.append(ring[0])
+        features.append({
+            "type": "Feature",
+            "id": i,
+            "geometry": {"type": "Polygon", "coordinates": [ring]},
+            "bbox": item["bbox"],
+            "properties": {"area": item["area"], "confidence": item["confidence"]},
+        })
+    collection = {"type": "FeatureCollection", "features": features}
+    if properties:
+        collection["properties"] = properties
+    return collection
+
+
+def save_geojson(polygons, path, properties=None):
+    with open(path, "w", encoding="utf-8") as f:
+        json.dump(to_geojson(polygons, properties), f, ensure_ascii=False)
+
+
+def save_npz(polygons, path, properties=None):
+    # Компактный двоичный формат: все вершины в одном массиве, границы полигонов задаются смещениями
+    counts = [len(p["polygon"]) for p in polygons]
+    arrays = {
+        "vertices": np.concatenate([p["polygon"] for p in polygons]).astype(np.float64)
+        if polygons else np.zeros((0, 2), dtype=np.float64),
+        "offsets": np.concatenate([[0], np.cumsum(counts)]).astype(np.int64),
+        "area": np.array([p["area"] for p in polygons], dtype=np.float64),
+        "confidence": np.array([p["confidence"] for p in polygons], dtype=np.float32),
+        "bbox": np.array([p["bbox"] for p in polygons], dtype=np.float64).reshape(-1, 4),
+    }
+    if properties:
+        arrays["properties"] = np.array(json.dumps(properties, ensure_ascii=False))
+    np.savez_compressed(path, **arrays)
+
+
+def load_npz(path):
+    with np.load(path) as data:
+        offsets = data["offsets"]
+        return [
+            {
+                "polygon": data["vertices"][offsets[i]:offsets[i + 1]],
+                "area": float(data["area"][i]),
+                "confidence": float(data["confidence"][i]),
+                "bbox": data["bbox"][i].tolist(),
+            }
+            for i in range(len(offsets) - 1)
+        ]
+
+
+def save_polygons(polygons, path, output_format="geojson", properties=None):
+    if output_format not in OUTPUT_FORMATS:
+        raise ValueError(f"Неизвестный формат вывода: {output_format}")
+    if output_format == "geojson":
+        save_geojson(polygons, path, properties)
+    else:
+        save_npz(polygons, path, properties)
@@ -0,0 +1,128 @@
+import hashlib
+import os
+import threading
+import uuid
+import numpy as np
+from model_cache import checkpoint_key
+
+DEFAULT_MAX_BYTES = 1024 ** 3
+_checkpoint_hashes = {}
+_checkpoint_lock = threading.Lock()
+
+
+def content_hash(data):
+    return hashlib.blake2b(data, digest_size=20).hexdigest()
+
+
+def file_hash(path):
+    digest = hashlib.blake2b(digest_size=20)
+    with open(path, "rb") as f:
+        for chunk in iter(lambda: f.read(1 << 20), b""):
+            digest.update(chunk)
+    return digest.hexdigest()
+
+
+def checkpoint_hash(path):
+    # Хэш содержимого чекпоинта считается один раз для каждой версии файла
+    key = checkpoint_key(path)
+    with _checkpoint_lock:
+        if key not in _checkpoint_hashes:
+            _checkpoint_hashes[key] = file_hash(path)
+        return _checkpoint_hashes[key]
+
+
+def result_key(image_hash, checkpoint, variant=""):
+    # variant описывает способ получения карты (предобработка, окна, точность), влияющий на вероятности
+    return content_hash(f"{image_hash}:{checkpoint}:{variant}".encode())
+
+
+def quantize(prob):
+    return np.round(np.clip(prob, 0.0, 1.0) * 255).astype(np.uint8)
+
+
+def dequantize(prob_u8):
+    return prob_u8.astype(np.float32) / 255.0
+
+
+class ProbabilityCache:
+    # Карты вероятностей на диске, адресуемые по содержимому; при превышении размера удаляются
+    # давно не использованные записи (время доступа хранится во времени изменения файла)
+    def __init__(self, cache_dir, max_bytes=DEFAULT_MAX_BYTES):
+        self.cache_dir = cache_dir
+        self.max_bytes = max_bytes
+        self._lock = threading.Lock()
+        self.hits = 0
+        self.misses = 0
+        os.makedirs(cache_dir, exist_ok=True)
+        self._sizes = {}
+        for root, _, files in os.walk(cache_dir):
+            for name in files:
+                if name.endswith(".npz"):
+                    path = os.path.join(root, name)
+                    self._sizes[path] = os.path.getsize(path)
+
+    def _path(self, key):
+        return os.path.join(self.cache_dir, key[:2], key + ".npz")
+
+    def get(self, key):
+        path = self._path(key)
+        try:
+            with np.load(path) as data:
+                prob = dequantize(data["prob"])
+        except (OSError, ValueError, KeyError):
+            with self._lock:
+                self.misses += 1
+            return None
+        try:
+            os.utime(path)
+        except OSError:
+            pass
+        with self._lock:
+            self.hits += 1
+        return prob
+
+    def put(self, key, prob):
+        path = self._path(key)
+        os.makedirs(os.path.dirname(path), exist_ok=True)
+        # Уникальное временное имя: одну и ту же запись могут одновременно писать несколько потоков
+        tmp_path = f"{path[:-4]}.{uuid.uuid4().hex[:8]}.tmp.npz"
+        np.savez_compressed(tmp_path, prob=quantize(prob))
+        os.replace(tmp_path, path)
+        with self._lock:
+            self._sizes[path] = os.path.getsize(path)
+            self._evict()
+
+    def _evict(self):
+        total = sum(self._sizes.values())
+        if total <= self.max_bytes:
+            return
+        entries = []
+        for path in self._sizes:
+            try:
+                entries.append((os.path.getmtime(path), path))
+            except OSError:
+                entries.append((0.0, path))
+        for _, path in sorted(entries):
+            if total <= self.max_bytes or len(self._sizes) <= 1:
+                break
+            total -= self._sizes.pop(path)
+            try:
+                os.remove(path)
+            except OSError:
+                pass
+
+    def nbytes(self):
+        with self._lock:
+            return sum(self._sizes.values())
+
+    def __len__(self):
+        return len(self._sizes)
+
+    def get_or_compute(self, key, compute):
+        prob = self.get(key)
+        if prob is None:
+            prob = compute()
+            self.put(key, prob)
+            # Возвращаем то же квантованное значение, что будет прочитано из кэша в следующий раз
+            prob = dequantize(quantize(prob))
+        return prob
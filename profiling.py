@@ -0,0 +1,119 @@
+import contextlib
+import json
+import os
+import threading
+import time
+from collections import defaultdict
+import torch
+
+NULL_SPAN = contextlib.nullcontext()
+
+
+class _Span:
+    __slots__ = ("profiler", "name", "start")
+
+    def __init__(self, profiler, name):
+        self.profiler = profiler
+        self.name = name
+
+    def __enter__(self):
+        self.profiler.synchronize()
+        self.start = time.perf_counter()
+        return self
+
+    def __exit__(self, *exc):
+        self.profiler.synchronize()
+        self.profiler.record(self.name, self.start, time.perf_counter())
+        return False
+
+
+class Profiler:
+    # В выключенном состоянии span() возвращает общий пустой контекст, поэтому накладные расходы минимальны
+    def __init__(self, enabled=False, sync_cuda=True, max_events=100000):
+        self.enabled = enabled
+        self.sync_cuda = sync_cuda and torch.cuda.is_available()
+        self.max_events = max_events
+        self.origin = time.perf_counter()
+        self._lock = threading.Lock()
+        self._torch_profile = None
+        self.reset()
+
+    def reset(self):
+        with self._lock:
+            self.totals = defaultdict(float)
+            self.counts = defaultdict(int)
+            self.events = []
+
+    def span(self, name):
+        if not self.enabled:
+            return NULL_SPAN
+        return _Span(self, name)
+
+    def synchronize(self):
+        # Без синхронизации время асинхронных операций GPU попадет в следующий этап
+        if self.sync_cuda:
+            torch.cuda.synchronize()
+
+    def record(self, name, start, end):
+        with self._lock:
+            self.totals[name] += end - start
+            self.counts[name] += 1
+            if len(self.events) < self.max_events:
+                self.events.append((name, start, end, threading.get_ident()))
+
+    def summary(self):
+        with self._lock:
+            return dict(self.totals)
+
+    def take(self):
+        # Возвращает накопленное время по этапам и обнуляет счетчики (события трассировки сохраняются)
+        with self._lock:
+            totals = dict(self.totals)
+            self.totals = defaultdict(float)
+            self.counts = defaultdict(int)
+        return totals
+
+    def chrome_trace(self):
+        pid = os.getpid()
+        with self._lock:
+            events = list(self.events)
+        return {"traceEvents": [
+            {
+                "name": name, "ph": "X", "pid": pid, "tid": tid,
+                "ts": (start - self.origin) * 1e6, "dur": (end - start) * 1e6,
+            }
+            for name, start, end, tid in events
+        ]}
+
+    def export_chrome_trace(self, path):
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump(self.chrome_trace(), f)
+
+    def start_torch_profiler(self, path, steps, wait=1):
+        # Окно torch.profiler: пропускаем wait шагов, затем записываем steps шагов в формате Chrome trace
+        activities = [torch.profiler.ProfilerActivity.CPU]
+        if torch.cuda.is_available():
+            activities.append(torch.profiler.ProfilerActivity.CUDA)
+        self._torch_profile = torch.profiler.profile(
+            activities=activities,
+            schedule=torch.profiler.schedule(wait=wait, warmup=1, active=steps, repeat=1),
+            on_trace_ready=lambda prof: prof.export_chrome_trace(path),
+            record_shapes=True,
+        )
+        self._torch_profile.start()
+
+    def step(self):
+        if self._torch_profile is not None:
+            self._torch_profile.step()
+
+    def stop_torch_profiler(self):
+        if self._torch_profile is not None:
+            self._torch_profile.stop()
+            self._torch_profile = None
+
+
+def format_stages(totals):
+    return ", ".join(f"{name} {seconds:.2f} с" for name, seconds in sorted(totals.items(), key=lambda kv: -kv[1]))
+
+
+profiler = Profiler()
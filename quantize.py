@@ -0,0 +1,94 @@
+import argparse
+import time
+import warnings
+import numpy as np
+import torch
+from torch.utils.data import DataLoader, Subset
+from torch.ao.quantization import get_default_qconfig_mapping
+from torch.ao.quantization.quantize_fx import prepare_fx, convert_fx
+from detect import load_backend_model
+from export import example_input
+from train import dataset, split_images
+from test import SegmentationMetrics
+
+
+def quantize_model(model, calibration_loader, engine="x86"):
+    # Статическое квантование в режиме FX: Conv2d+ReLU в conv_block сливаются автоматически,
+    # ConvTranspose2d заменяется квантованным аналогом
+    torch.backends.quantized.engine = engine
+    model = model.cpu().eval()
+    prepared = prepare_fx(model, get_default_qconfig_mapping(engine), (example_input(),))
+    with torch.no_grad():
+        for imgs, _ in calibration_loader:
+            prepared(imgs)
+    return convert_fx(prepared)
+
+
+def save_quantized(model, path):
+    # Квантованная модель сохраняется как TorchScript, detect.load_model загружает ее бэкендом torchscript
+    with torch.no_grad(), warnings.catch_warnings():
+        warnings.simplefilter("ignore")
+        traced = torch.jit.freeze(torch.jit.trace(model, example_input()))
+    traced.save(path)
+
+
+def evaluate(model, loader, threshold=0.3):
+    metrics = SegmentationMetrics()
+    with torch.no_grad():
+        for imgs, masks in loader:
+            metrics.update((model(imgs) > threshold).float(), masks)
+    return metrics.compute()["macro"]
+
+
+def measure_latency(model, runs=10, warmup=2):
+    batch = example_input()
+    with torch.no_grad():
+        for _ in range(warmup):
+            model(batch)
+        start = time.perf_counter()
+        for _ in range(runs):
+            model(batch)
+    return (time.perf_counter() - start) / runs
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Статическое int8-квантование модели UNet для вывода на CPU")
+    parser.add_argument('--model', required=True, help="Путь к параметрам модели fp32 (model.pth)")
+    parser.add_argument('--data', required=True, help="Папка с изображениями обучающего датасета")
+    parser.add_argument('--output', required=True, help="Путь для сохранения квантованной модели (.pt)")
+    parser.add_argument('--calibration', type=int, default=32,
+                        help="Количество изображений обучающей выборки для калибровки (по умолчанию: 32)")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Порог бинаризации маски (по умолчанию: 0.3)")
+    parser.add_argument('--engine', choices=['x86', 'fbgemm', 'qnnpack'], default='x86',
+                        help="Квантованный бэкенд PyTorch (по умолчанию: x86)")
+    args = parser.parse_args()
+
+    train_images, test_images = split_images(args.data)
+    rng = np.random.default_rng(0)
+    sample = rng.choice(len(train_images), size=min(args.calibration, len(train_images)), replace=False)
+    calibration_set = Subset(dataset(args.data, threshold=args.threshold, images=train_images), sample.tolist())
+    calibration_loader = DataLoader(calibration_set, batch_size=4)
+
+    fp32_model = load_backend_model(args.model, "eager").cpu()
+    int8_model = quantize_model(load_backend_model(args.model, "eager"), calibration_loader, args.engine)
+    save_quantized(int8_model, args.output)
+    print(f"Квантованная модель сохранена в: {args.output}")
+
+    fp32_latency = measure_latency(fp32_model)
+    int8_latency = measure_latency(int8_model)
+    print(f"Задержка fp32: {fp32_latency * 1000:.1f} мс, int8: {int8_latency * 1000:.1f} мс "
+          f"(ускорение x{fp32_latency / int8_latency:.2f})")
+
+    if test_images:
+        test_loader = DataLoader(dataset(args.data, threshold=args.threshold, images=test_images), batch_size=4)
+        fp32_scores = evaluate(fp32_model, test_loader, args.threshold)
+        int8_scores = evaluate(int8_model, test_loader, args.threshold)
+        print(f"Тестовая выборка ({len(test_images)} изобр.): "
+              f"Dice fp32 {fp32_scores['dice']:.4f} -> int8 {int8_scores['dice']:.4f} "
+              f"({int8_scores['dice'] - fp32_scores['dice']:+.4f}), "
+              f"IoU fp32 {fp32_scores['iou']:.4f} -> int8 {int8_scores['iou']:.4f} "
+              f"({int8_scores['iou'] - fp32_scores['iou']:+.4f})")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,151 @@
+import os
+import numpy as np
+import cv2
+from PIL import Image
+
+try:
+    import tifffile
+except ImportError:
+    tifffile = None
+
+TIFF_EXTENSIONS = ('.tif', '.tiff')
+
+
+class TiledTiffArray:
+    # Окна несжатого тайлового TIFF читаются напрямую из отображенного в память файла
+    def __init__(self, path, page):
+        self.shape = page.shape
+        self.ndim = len(page.shape)
+        self.dtype = page.dtype
+        self.tile_h = page.tilelength
+        self.tile_w = page.tilewidth
+        self.samples = page.samplesperpixel
+        self.offsets = page.dataoffsets
+        self.tiles_across = -(-self.shape[1] // self.tile_w)
+        self._buffer = np.memmap(path, dtype=np.uint8, mode="r")
+
+    def _tile(self, ty, tx):
+        offset = self.offsets[ty * self.tiles_across + tx]
+        count = self.tile_h * self.tile_w * self.samples
+        tile = np.frombuffer(self._buffer, dtype=self.dtype, count=count, offset=offset)
+        return tile.reshape(self.tile_h, self.tile_w, self.samples)
+
+    def __getitem__(self, key):
+        rows, cols = key[0], key[1]
+        y0, y1, _ = rows.indices(self.shape[0])
+        x0, x1, _ = cols.indices(self.shape[1])
+        out = np.empty((y1 - y0, x1 - x0, self.samples), dtype=self.dtype)
+        for ty in range(y0 // self.tile_h, (y1 - 1) // self.tile_h + 1):
+            for tx in range(x0 // self.tile_w, (x1 - 1) // self.tile_w + 1):
+                ty0, tx0 = ty * self.tile_h, tx * self.tile_w
+                sy0, sy1 = max(y0, ty0), min(y1, ty0 + self.tile_h)
+                sx0, sx1 = max(x0, tx0), min(x1, tx0 + self.tile_w)
+                out[sy0 - y0:sy1 - y0, sx0 - x0:sx1 - x0] = \
+                    self._tile(ty, tx)[sy0 - ty0:sy1 - ty0, sx0 - tx0:sx1 - tx0]
+        if self.ndim == 2:
+            return out[:, :, 0]
+        return out
+
+
+def _open_tiff(path):
+    with tifffile.TiffFile(path) as tif:
+        page = tif.pages[0]
+        native = tif.byteorder == ('<' if np.little_endian else '>')
+        mappable = page.compression == 1 and page.planarconfig == 1 and native
+        if mappable and page.is_tiled:
+            return TiledTiffArray(path, page)
+    try:
+        return tifffile.memmap(path, mode="r")
+    except ValueError:
+        # Сжатый TIFF не отображается в память, читаем его целиком
+        return tifffile.imread(path)
+
+
+def open_raster(path):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        data = np.load(path, mmap_mode="r")
+    elif ext in TIFF_EXTENSIONS and tifffile is not None:
+        data = _open_tiff(path)
+    else:
+        data = np.array(Image.open(path).convert("RGB"))
+    return RasterSource(data)
+
+
+def raster_shape(path):
+    # Размер сцены по заголовку файла, без декодирования пикселей
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return tuple(np.load(path, mmap_mode="r").shape[:2])
+    if ext in TIFF_EXTENSIONS and tifffile is not None:
+        with tifffile.TiffFile(path) as tif:
+            page = tif.pages[0]
+            return (page.imagelength, page.imagewidth)
+    with Image.open(path) as img:
+        width, height = img.size
+    return (height, width)
+
+
+def create_raster(path, shape, dtype=np.uint8):
+    ext = os.path.splitext(path)[1].lower()
+    if ext == ".npy":
+        return np.lib.format.open_memmap(path, mode="w+", dtype=dtype, shape=shape)
+    if ext in TIFF_EXTENSIONS and tifffile is not None:
+        photometric = "rgb" if len(shape) == 3 else "minisblack"
+        return tifffile.memmap(path, shape=shape, dtype=dtype, photometric=photometric)
+    raise ValueError("Для потоковой записи поддерживаются только форматы .npy и .tif")
+
+
+class RasterSource:
+    def __init__(self, data):
+        if data.ndim not in (2, 3):
+            raise ValueError(f"Неподдерживаемая размерность растра: {data.shape}")
+        self.data = data
+        self.shape = tuple(data.shape[:2])
+
+    def read(self, y0, y1, x0, x1):
+        # Окно в формате RGB uint8, как у PIL.Image.convert("RGB")
+        window = _to_uint8(np.asarray(self.data[y0:y1, x0:x1]))
+        if window.ndim == 2:
+            return np.repeat(window[:, :, None], 3, axis=2)
+        if window.shape[2] == 1:
+            return np.repeat(window, 3, axis=2)
+        return window[:, :, :3].copy()
+
+    def __getitem__(self, key):
+        # Оконное чтение в оттенках серого для скользящего окна
+        window = np.asarray(self.data[key[0], key[1]])
+        if window.ndim == 3 and window.shape[2] == 1:
+            window = window[:, :, 0]
+        if window.ndim == 2:
+            return window if window.dtype == np.uint8 else _to_float(window)
+        rgb = np.ascontiguousarray(window[:, :, :3])
+        if rgb.dtype == np.uint8:
+            return cv2.cvtColor(rgb, cv2.COLOR_RGB2GRAY)
+        return _to_float(rgb) @ np.array([0.299, 0.587, 0.114], dtype=np.float32)
+
+
+def _to_float(window):
+    if np.issubdtype(window.dtype, np.integer):
+        return window.astype(np.float32) / np.iinfo(window.dtype).max
+    return window.astype(np.float32)
+
+
+def _to_uint8(window):
+    if window.dtype == np.uint8:
+        return window
+    return (np.clip(_to_float(window), 0.0, 1.0) * 255).astype(np.uint8)
+
+
+def render_overlay(source, mask, out, color=(255, 0, 0), band_rows=1024):
+    height, width = source.shape
+    kernel = np.ones((3, 3), np.uint8)
+    for y0 in range(0, height, band_rows):
+        y1 = min(y0 + band_rows, height)
+        # Берем строки с запасом, чтобы граница маски на стыке полос не терялась
+        m0, m1 = max(0, y0 - 1), min(height, y1 + 1)
+        edges = cv2.morphologyEx(np.asarray(mask[m0:m1]), cv2.MORPH_GRADIENT, kernel)
+        edges = edges[y0 - m0:y0 - m0 + (y1 - y0)] > 0
+        window = source.read(y0, y1, 0, width)
+        window[edges] = color
+        out[y0:y1] = window
@@ -0,0 +1,322 @@
+import argparse
+import asyncio
+import json
+import os
+import time
+from collections import deque, Counter
+from concurrent.futures import ThreadPoolExecutor
+from urllib.parse import urlsplit, parse_qs
+import numpy as np
+import cv2
+import torch
+from detect import (load_model, read_image, preprocess, draw_contours, structured_result, result_properties,
+                    DEVICE, BACKENDS, default_workers)
+from model import infer, PRECISIONS
+from polygons import to_geojson
+
+OUTPUTS = ("mask", "polygons", "overlay")
+MAX_BODY = 64 * 2 ** 20
+STATUS_TEXT = {200: "OK", 400: "Bad Request", 403: "Forbidden", 404: "Not Found", 405: "Method Not Allowed",
+               413: "Payload Too Large", 500: "Internal Server Error"}
+
+
+class HttpError(Exception):
+    def __init__(self, status, message):
+        super().__init__(message)
+        self.status = status
+
+
+def percentile(values, q):
+    return float(np.percentile(values, q)) if values else 0.0
+
+
+class Metrics:
+    def __init__(self, window=1000):
+        self.start = time.perf_counter()
+        self.requests = 0
+        self.errors = 0
+        self.batches = 0
+        self.batch_sizes = Counter()
+        self.latency = deque(maxlen=window)
+        self.queue_wait = deque(maxlen=window)
+        self.inference = deque(maxlen=window)
+
+    def snapshot(self):
+        uptime = time.perf_counter() - self.start
+        batched = sum(size * count for size, count in self.batch_sizes.items())
+        return {
+            "uptime": uptime,
+            "requests": self.requests,
+            "errors": self.errors,
+            "throughput": self.requests / uptime if uptime > 0 else 0.0,
+            "batches": self.batches,
+            "mean_batch_size": batched / self.batches if self.batches else 0.0,
+            "batch_sizes": {str(size): count for size, count in sorted(self.batch_sizes.items())},
+            "latency_ms": {f"p{q}": percentile(self.latency, q) * 1000 for q in (50, 95, 99)},
+            "queue_ms": {f"p{q}": percentile(self.queue_wait, q) * 1000 for q in (50, 95)},
+            "inference_ms": {f"p{q}": percentile(self.inference, q) * 1000 for q in (50, 95)},
+        }
+
+
+class DynamicBatcher:
+    # Запросы, пришедшие в пределах окна max_latency, объединяются в один батч для модели
+    def __init__(self, model, max_batch_size=8, max_latency=0.01, precision="fp32", metrics=None):
+        self.model = model
+        self.max_batch_size = max_batch_size
+        self.max_latency = max_latency
+        self.precision = precision
+        self.metrics = metrics or Metrics()
+        self.queue = None
+        # Модель вызывается из одного потока, чтобы не блокировать цикл событий
+        self.executor = ThreadPoolExecutor(max_workers=1)
+        self.task = None
+
+    def start(self):
+        # Очередь создается внутри работающего цикла событий
+        self.queue = asyncio.Queue()
+        self.task = asyncio.get_running_loop().create_task(self.run())
+
+    async def stop(self):
+        if self.task is not None:
+            self.task.cancel()
+            try:
+                await self.task
+            except asyncio.CancelledError:
+                pass
+        self.executor.shutdown()
+
+    async def predict(self, img_resized):
+        future = asyncio.get_running_loop().create_future()
+        await self.queue.put((img_resized, time.perf_counter(), future))
+        return await future
+
+    def infer(self, imgs):
+        batch = torch.from_numpy(np.stack(imgs)).unsqueeze(1).to(DEVICE)
+        return infer(self.model, batch, self.precision).squeeze(1).cpu().numpy()
+
+    async def run(self):
+        loop = asyncio.get_running_loop()
+        while True:
+            items = [await self.queue.get()]
+            deadline = loop.time() + self.max_latency
+            while len(items) < self.max_batch_size:
+                timeout = deadline - loop.time()
+                if timeout <= 0:
+                    break
+                try:
+                    items.append(await asyncio.wait_for(self.queue.get(), timeout))
+                except asyncio.TimeoutError:
+                    break
+
+            started = time.perf_counter()
+            for _, queued, _ in items:
+                self.metrics.queue_wait.append(started - queued)
+            try:
+                preds = await loop.run_in_executor(self.executor, self.infer, [img for img, _, _ in items])
+            except Exception as e:
+                for _, _, future in items:
+                    if not future.done():
+                        future.set_exception(e)
+                continue
+            self.metrics.inference.append(time.perf_counter() - started)
+            self.metrics.batches += 1
+            self.metrics.batch_sizes[len(items)] += 1
+            for (_, _, future), pred in zip(items, preds):
+                if not future.done():
+                    future.set_result(pred)
+
+
+def decode_upload(data):
+    buffer = np.frombuffer(data, dtype=np.uint8)
+    original_img = cv2.imdecode(buffer, cv2.IMREAD_COLOR)
+    if original_img is None:
+        raise HttpError(400, "Не удалось декодировать изображение")
+    return original_img, cv2.cvtColor(original_img, cv2.COLOR_BGR2GRAY)
+
+
+def render(output, image_path, original_img, pred, threshold, epsilon, min_area):
+    if output == "mask":
+        height, width = original_img.shape[:2]
+        mask = (cv2.resize(pred, (width, height)) > threshold).astype(np.uint8) * 255
+        return "image/png", cv2.imencode(".png", mask)[1].tobytes()
+    if output == "overlay":
+        return "image/jpeg", cv2.imencode(".jpg", draw_contours(original_img, pred, threshold, copy=False))[1].tobytes()
+    # Для загруженных изображений файла привязки нет, координаты остаются в пикселях
+    result = structured_result(image_path or "upload", original_img, pred, threshold, epsilon, min_area,
+                               georeferenced=image_path is not None)
+    collection = to_geojson(result["polygons"], result_properties(result))
+    return "application/geo+json", json.dumps(collection, ensure_ascii=False).encode("utf-8")
+
+
+class InferenceServer:
+    def __init__(self, model_path, max_batch_size=8, max_latency=0.01, threshold=0.3, precision="fp32",
+                 backend=None, workers=None, data_root=None):
+        self.model = load_model(model_path, precision, backend)
+        self.threshold = threshold
+        # Чтение файлов по пути разрешено только внутри data_root
+        self.data_root = os.path.realpath(data_root) if data_root else None
+        self.metrics = Metrics()
+        self.batcher = DynamicBatcher(self.model, max_batch_size, max_latency, precision, self.metrics)
+        self.pool = ThreadPoolExecutor(workers or default_workers())
+
+    def resolve_path(self, path):
+        if self.data_root is None:
+            raise HttpError(403, "Чтение файлов по пути отключено (запустите сервер с --data-root)")
+        real_path = os.path.realpath(os.path.join(self.data_root, path))
+        if os.path.commonpath([real_path, self.data_root]) != self.data_root:
+            raise HttpError(403, "Путь вне разрешенной папки")
+        if not os.path.isfile(real_path):
+            raise HttpError(404, f"Файл не найден: {path}")
+        return real_path
+
+    async def predict(self, query, headers, body):
+        loop = asyncio.get_running_loop()
+        output = query.get("output", "mask")
+        if output not in OUTPUTS:
+            raise HttpError(400, f"Неизвестный формат результата: {output}")
+        try:
+            threshold = float(query.get("threshold", self.threshold))
+            epsilon = float(query.get("epsilon", 1.0))
+            min_area = float(query.get("min_area", 0.0))
+        except ValueError:
+            raise HttpError(400, "Некорректный числовой параметр")
+
+        image_path = None
+        if headers.get("content-type", "").startswith("application/json"):
+            try:
+                image_path = self.resolve_path(json.loads(body)["path"])
+            except (ValueError, KeyError, TypeError):
+                raise HttpError(400, "Ожидается JSON вида {\"path\": \"...\"}")
+            original_img, img_gray = await loop.run_in_executor(self.pool, read_image, image_path)
+        else:
+            if not body:
+                raise HttpError(400, "Пустое тело запроса")
+            original_img, img_gray = await loop.run_in_executor(self.pool, decode_upload, body)
+
+        img_resized = await loop.run_in_executor(self.pool, preprocess, img_gray)
+        pred = await self.batcher.predict(img_resized)
+        return await loop.run_in_executor(
+            self.pool, render, output, image_path, original_img, pred, threshold, epsilon, min_area
+        )
+
+    async def dispatch(self, method, target, headers, body):
+        url = urlsplit(target)
+        query = {k: v[-1] for k, v in parse_qs(url.query).items()}
+        if url.path == "/metrics":
+            return "application/json", json.dumps(self.metrics.snapshot()).encode("utf-8")
+        if url.path == "/health":
+            return "application/json", b'{"status": "ok"}'
+        if url.path == "/predict":
+            if method != "POST":
+                raise HttpError(405, "Ожидается метод POST")
+            start = time.perf_counter()
+            try:
+                response = await self.predict(query, headers, body)
+            except Exception:
+                self.metrics.errors += 1
+                raise
+            self.metrics.requests += 1
+            self.metrics.latency.append(time.perf_counter() - start)
+            return response
+        raise HttpError(404, f"Неизвестный путь: {url.path}")
+
+    async def handle(self, reader, writer):
+        # Минимальный HTTP/1.1 с поддержкой keep-alive, чтобы не тянуть внешние зависимости
+        try:
+            while True:
+                request_line = await reader.readline()
+                if not request_line.strip():
+                    break
+                try:
+                    method, target, version = request_line.decode("latin-1").split()
+                except ValueError:
+                    break
+                headers = {}
+                while True:
+                    line = await reader.readline()
+                    if not line.strip():
+                        break
+                    name, _, value = line.decode("latin-1").partition(":")
+                    headers[name.strip().lower()] = value.strip()
+
+                keep_alive = headers.get("connection", "").lower() != "close" and version == "HTTP/1.1"
+                try:
+                    raw_length = headers.get("content-length", "").strip() or "0"
+                    if not (raw_length.isascii() and raw_length.isdigit()):
+                        # Без корректной длины граница следующего запроса неизвестна, соединение закрывается
+                        keep_alive = False
+                        raise HttpError(400, "Некорректный заголовок Content-Length")
+                    length = int(raw_length)
+                    if length > MAX_BODY:
+                        keep_alive = False
+                        raise HttpError(413, "Слишком большой запрос")
+                    body = await reader.readexactly(length) if length else b""
+                    content_type, payload = await self.dispatch(method, target, headers, body)
+                    status = 200
+                except HttpError as e:
+                    status, content_type = e.status, "application/json"
+                    payload = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+                except Exception as e:
+                    status, content_type = 500, "application/json"
+                    payload = json.dumps({"error": str(e)}, ensure_ascii=False).encode("utf-8")
+
+                writer.write(
+                    f"HTTP/1.1 {status} {STATUS_TEXT.get(status, '')}\r\n"
+                    f"Content-Type: {content_type}\r\nContent-Length: {len(payload)}\r\n"
+                    f"Connection: {'keep-alive' if keep_alive else 'close'}\r\n\r\n".encode("latin-1") + payload
+                )
+                await writer.drain()
+                if not keep_alive:
+                    break
+        except (asyncio.IncompleteReadError, ConnectionError):
+            pass
+        finally:
+            writer.close()
+
+    async def serve(self, host="127.0.0.1", port=8080, ready=None):
+        self.batcher.start()
+        server = await asyncio.start_server(self.handle, host, port)
+        if ready is not None:
+            ready(server.sockets[0].getsockname()[1])
+        try:
+            async with server:
+                await server.serve_forever()
+        finally:
+            await self.batcher.stop()
+            self.pool.shutdown()
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Локальный HTTP-сервер анализа изображений с динамическим батчингом")
+    parser.add_argument('--model', required=True, help="Путь к модели (.pth, .safetensors, TorchScript .pt или .onnx)")
+    parser.add_argument('--host', default="127.0.0.1", help="Адрес сервера (по умолчанию: 127.0.0.1)")
+    parser.add_argument('--port', type=int, default=8080, help="Порт сервера (по умолчанию: 8080)")
+    parser.add_argument('--max-batch-size', type=int, default=8, help="Максимальный размер батча (по умолчанию: 8)")
+    parser.add_argument('--max-latency-ms', type=float, default=10.0,
+                        help="Окно ожидания для сборки батча в миллисекундах (по умолчанию: 10)")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Порог бинаризации маски (по умолчанию: 0.3)")
+    parser.add_argument('--precision', choices=PRECISIONS, default="fp32",
+                        help="Точность вычислений: fp32, bf16 или fp16 (по умолчанию: fp32)")
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help="Бэкенд вывода (по умолчанию определяется по расширению файла модели)")
+    parser.add_argument('--workers', type=int, default=None, help="Потоков декодирования и постобработки")
+    parser.add_argument('--data-root', default=None,
+                        help="Папка, из которой разрешено читать изображения по пути ({\"path\": ...})")
+    args = parser.parse_args()
+
+    server = InferenceServer(
+        args.model, max_batch_size=args.max_batch_size, max_latency=args.max_latency_ms / 1000,
+        threshold=args.threshold, precision=args.precision, backend=args.backend, workers=args.workers,
+        data_root=args.data_root,
+    )
+    print(f"Модель загружена: {args.model}")
+    try:
+        asyncio.run(server.serve(
+            args.host, args.port, ready=lambda port: print(f"Сервер запущен: http://{args.host}:{port}")
+        ))
+    except KeyboardInterrupt:
+        pass
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,72 @@
+import argparse
+import json
+import os
+import subprocess
+import sys
+import time
+import numpy as np
+
+HEAVY_MODULES = ("torch", "cv2", "PIL", "detect", "train", "test")
+
+# Дочерний процесс: создает окно, ждет первой отрисовки и сообщает, какие тяжелые модули уже загружены
+PROBE = """
+import sys, json
+from PyQt5.QtWidgets import QApplication
+from PyQt5.QtCore import QTimer
+app = QApplication(sys.argv)
+from main import MainWindow
+window = MainWindow(lazy={lazy}, warmup=False)
+window.show()
+def done():
+    app.processEvents()
+    print(json.dumps({{"loaded": [m for m in {modules!r} if m in sys.modules]}}), flush=True)
+    app.quit()
+QTimer.singleShot(0, done)
+app.exec_()
+"""
+
+
+def measure_startup(lazy, repeats=5):
+    env = dict(os.environ)
+    env.setdefault("QT_QPA_PLATFORM", "offscreen")
+    code = PROBE.format(lazy=lazy, modules=HEAVY_MODULES)
+    root = os.path.dirname(os.path.abspath(__file__))
+    times = []
+    loaded = []
+    for _ in range(repeats):
+        # Время считается от запуска интерпретатора до первой итерации цикла событий после показа окна
+        start = time.perf_counter()
+        output = subprocess.run(
+            [sys.executable, "-c", code], cwd=root, env=env, capture_output=True, text=True, check=True
+        ).stdout
+        times.append(time.perf_counter() - start)
+        loaded = json.loads(output.strip().splitlines()[-1])["loaded"]
+    return {
+        "median_s": float(np.median(times)),
+        "min_s": float(np.min(times)),
+        "max_s": float(np.max(times)),
+        "loaded_modules": loaded,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Замер времени запуска main.py до показа окна")
+    parser.add_argument('--repeats', type=int, default=5, help="Количество запусков каждого режима (по умолчанию: 5)")
+    parser.add_argument('--json', default=None, help="Путь для сохранения результатов в JSON")
+    args = parser.parse_args()
+
+    results = {
+        "eager": measure_startup(False, args.repeats),
+        "lazy": measure_startup(True, args.repeats),
+    }
+    for mode, stats in results.items():
+        print(f"{mode}: медиана {stats['median_s']:.2f} с (мин. {stats['min_s']:.2f}, макс. {stats['max_s']:.2f}), "
+              f"загружено до показа окна: {', '.join(stats['loaded_modules']) or 'нет'}")
+    print(f"Ускорение запуска: x{results['eager']['median_s'] / results['lazy']['median_s']:.2f}")
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -2,7 +2,14 @@ import torch
 import numpy as np
 from PIL import Image
 import os
-from model import UNet
+import csv
+import json
+import argparse
+from concurrent.futures import ThreadPoolExecutor
+from detect import load_model, backend_for_path, DEVICE, BACKENDS, collect_images, prefetch, default_workers
+from prob_cache import ProbabilityCache, file_hash, checkpoint_hash, result_key, quantize, dequantize
+from model import infer, PRECISIONS, INPUT_SIZE
+from raster import open_raster, TIFF_EXTENSIONS
 
 def dice_coefficient(pred, target, smooth=1e-6):
     pred = pred.view(-1)
@@ -17,47 +24,404 @@ def iou_score(pred, target, smooth=1e-6):
     union = pred.sum() + target.sum() - intersection
     return (intersection + smooth) / (union + smooth)
 
-def load_image(path, size=(624, 320)):
-    img = Image.open(path).convert("L")
+METRIC_NAMES = ("dice", "iou", "precision", "recall")
+SWEEP_LEVELS = 256
+
+class SegmentationMetrics:
+    # Накапливает по каждому изображению пересечение и суммы масок на устройстве,
+    # синхронизация с CPU происходит один раз при вызове compute()
+    def __init__(self, smooth=1e-6):
+        self.smooth = smooth
+        self.reset()
+
+    def reset(self):
+        self._stats = []
+
+    def update(self, pred_mask, target):
+        pred_mask = pred_mask.reshape(pred_mask.shape[0], -1).float()
+        target = target.reshape(target.shape[0], -1).float()
+        intersection = (pred_mask * target).sum(dim=1)
+        self._stats.append(torch.stack([intersection, pred_mask.sum(dim=1), target.sum(dim=1)], dim=1))
+
+    def __len__(self):
+        return sum(len(stats) for stats in self._stats)
+
+    def synchronize(self):
+        # Собирает статистику со всех процессов распределенного обучения (размеры выборок могут различаться)
+        import torch.distributed as dist
+        if not (dist.is_available() and dist.is_initialized()) or dist.get_world_size() == 1:
+            return
+        stats = torch.cat(self._stats).double().cpu() if self._stats else torch.zeros((0, 3), dtype=torch.float64)
+        sizes = [torch.zeros(1, dtype=torch.int64) for _ in range(dist.get_world_size())]
+        dist.all_gather(sizes, torch.tensor([len(stats)]))
+        max_size = max(int(size) for size in sizes)
+        padded = torch.zeros((max_size, 3), dtype=torch.float64)
+        padded[:len(stats)] = stats
+        gathered = [torch.zeros_like(padded) for _ in sizes]
+        dist.all_gather(gathered, padded)
+        self._stats = [torch.cat([part[:int(size)] for part, size in zip(gathered, sizes)])]
+
+    def _scores(self, intersection, pred_sum, target_sum):
+        s = self.smooth
+        return {
+            "dice": (2 * intersection + s) / (pred_sum + target_sum + s),
+            "iou": (intersection + s) / (pred_sum + target_sum - intersection + s),
+            "precision": (intersection + s) / (pred_sum + s),
+            "recall": (intersection + s) / (target_sum + s),
+        }
+
+    def compute(self):
+        if not self._stats:
+            zeros = {name: 0.0 for name in METRIC_NAMES}
+            return {"count": 0, "per_image": {name: np.zeros(0) for name in METRIC_NAMES},
+                    "micro": zeros, "macro": dict(zeros)}
+        stats = torch.cat(self._stats).double().cpu().numpy()
+        intersection, pred_sum, target_sum = stats[:, 0], stats[:, 1], stats[:, 2]
+        per_image = self._scores(intersection, pred_sum, target_sum)
+        micro = self._scores(intersection.sum(), pred_sum.sum(), target_sum.sum())
+        return {
+            "count": len(stats),
+            "per_image": per_image,
+            "micro": {name: float(value) for name, value in micro.items()},
+            "macro": {name: float(values.mean()) for name, values in per_image.items()},
+        }
+
+class ThresholdSweep:
+    # Метрики сразу для всей сетки порогов за один проход модели: вероятности раскладываются
+    # по 256 уровням (как в кэше uint8), а число пикселей выше порога дает накопленная сумма гистограммы
+    def __init__(self, smooth=1e-6):
+        self.smooth = smooth
+        self.reset()
+
+    def reset(self):
+        self._hist_all = []
+        self._hist_pos = []
+
+    def update(self, probs, targets):
+        probs = np.asarray(probs)
+        count = len(probs)
+        levels = quantize(probs).reshape(count, -1).astype(np.int64)
+        targets = np.asarray(targets).reshape(count, -1) > 0.5
+        # Отдельная гистограмма для каждого изображения: смещаем уровни на номер изображения
+        levels += np.arange(count)[:, None] * SWEEP_LEVELS
+        size = count * SWEEP_LEVELS
+        self._hist_all.append(np.bincount(levels.ravel(), minlength=size).reshape(count, SWEEP_LEVELS))
+        self._hist_pos.append(np.bincount(levels[targets], minlength=size).reshape(count, SWEEP_LEVELS))
+
+    def __len__(self):
+        return sum(len(hist) for hist in self._hist_all)
+
+    def compute(self, thresholds=None):
+        if thresholds is None:
+            thresholds = np.arange(SWEEP_LEVELS) / (SWEEP_LEVELS - 1)
+        thresholds = np.asarray(thresholds, dtype=np.float64)
+        if not self._hist_all:
+            zeros = {name: [0.0] * len(thresholds) for name in METRIC_NAMES}
+            return {"count": 0, "thresholds": thresholds.tolist(), "micro": zeros, "macro": dict(zeros), "best": None}
+        # Предсказание prob > t совпадает с условием уровень > floor(t * 255)
+        levels = np.clip(np.floor(thresholds * (SWEEP_LEVELS - 1) + 1e-6).astype(np.int64), 0, SWEEP_LEVELS - 1)
+
+        def above(hist):
+            tail = np.cumsum(hist[:, ::-1], axis=1)[:, ::-1]
+            return np.concatenate([tail[:, 1:], np.zeros((len(hist), 1))], axis=1)[:, levels]
+
+        hist_all = np.concatenate(self._hist_all).astype(np.float64)
+        hist_pos = np.concatenate(self._hist_pos).astype(np.float64)
+        intersection, pred_sum = above(hist_pos), above(hist_all)
+        target_sum = hist_pos.sum(axis=1, keepdims=True)
+        scores = SegmentationMetrics(self.smooth)._scores
+        per_image = scores(intersection, pred_sum, target_sum)
+        micro = scores(intersection.sum(axis=0), pred_sum.sum(axis=0), target_sum.sum())
+        macro = {name: values.mean(axis=0) for name, values in per_image.items()}
+        best = int(np.argmax(macro["dice"]))
+        return {
+            "count": len(hist_all),
+            "thresholds": thresholds.tolist(),
+            "micro": {name: values.tolist() for name, values in micro.items()},
+            "macro": {name: values.tolist() for name, values in macro.items()},
+            "best": dict({"threshold": float(thresholds[best])},
+                         **{name: float(macro[name][best]) for name in METRIC_NAMES}),
+        }
+
+def sweep_metrics(sweep, threshold, kind="macro"):
+    # Метрики для ближайшего порога из сетки
+    index = int(np.argmin(np.abs(np.asarray(sweep["thresholds"]) - threshold)))
+    return {name: sweep[kind][name][index] for name in METRIC_NAMES}
+
+def threshold_mask(prob, threshold):
+    return ((prob > threshold) * 255).astype(np.uint8)
+
+def format_metrics(metrics):
+    lines = []
+    for kind, title in (("macro", "по изображениям"), ("micro", "по всем пикселям")):
+        values = metrics[kind]
+        lines.append(
+            f"Метрики {title}: Dice {values['dice']:.4f}, IoU {values['iou']:.4f}, "
+            f"точность {values['precision']:.4f}, полнота {values['recall']:.4f}"
+        )
+    return "\n".join(lines)
+
+# Массивы .npy и TIFF (в том числе тайловые и 16-битные) читаются через raster, как в detect --raster
+RASTER_EXTENSIONS = TIFF_EXTENSIONS + ('.npy',)
+
+def is_raster(path):
+    return path.lower().endswith(RASTER_EXTENSIONS)
+
+def load_original(path):
+    if is_raster(path):
+        source = open_raster(path)
+        height, width = source.shape
+        return source.read(0, height, 0, width)
+    return np.array(Image.open(path)).astype(np.uint8)
+
+def load_image(path, size=INPUT_SIZE):
+    if is_raster(path):
+        gray = open_raster(path)[:, :]
+        if gray.dtype != np.uint8:
+            # Приводим к 8 битам, чтобы предобработка совпадала с изображениями, открытыми через PIL
+            gray = (np.clip(gray, 0.0, 1.0) * 255).astype(np.uint8)
+        img = Image.fromarray(gray)
+    else:
+        img = Image.open(path).convert("L")
     img = img.resize(size)
     img_np = np.array(img).astype(np.float32) / 255.0
     return img_np
 
-def run_evaluation(image_path, weights, threshold=0.3):
+def cache_key(image_path, weights, precision="fp32", backend=None, size=INPUT_SIZE):
+    # Предобработка здесь своя (сжатие через PIL), поэтому карты не смешиваются с картами detect
+    backend = backend or backend_for_path(weights)
+    return result_key(file_hash(image_path), checkpoint_hash(weights), f"test:{size}:{precision}:{backend}")
+
+def predict_batch(model, imgs, precision="fp32"):
+    img_tensor = torch.from_numpy(np.stack(imgs)).unsqueeze(1).to(DEVICE)
+    return infer(model, img_tensor, precision).squeeze(1).float().cpu().numpy()
+
+def run_evaluation(image_path, weights, threshold=0.3, precision="fp32", backend=None, cache=None):
     if not os.path.isfile(image_path):
         raise FileNotFoundError(f"Изображение '{image_path}' не найдено")
 
     if not os.path.isfile(weights):
         raise FileNotFoundError(f"Параметры модели '{weights}' не найдены")
 
-    original_img = Image.open(image_path)
-    original_img_np = np.array(original_img).astype(np.uint8)
+    original_img_np = load_original(image_path)
 
-    device = torch.device("cuda" if torch.cuda.is_available() else "cpu")
-    model = UNet().to(device)
-    model.load_state_dict(torch.load(weights, map_location=device))
-    model.eval()
+    device = DEVICE
 
     img_np = load_image(image_path)
-    img_tensor = torch.tensor(img_np).unsqueeze(0).unsqueeze(0).to(device)  
 
 
     gt_mask_np = (img_np < threshold).astype(np.float32)
     gt_mask_t = torch.tensor(gt_mask_np).unsqueeze(0).unsqueeze(0).to(device)
 
 
-    with torch.no_grad():
-        pred = model(img_tensor)
-    pred_mask_t = (pred > threshold).float()
+    compute = lambda: predict_batch(load_model(weights, precision, backend), [img_np], precision)[0]
+    if cache is None:
+        prob = compute()
+    else:
+        # При повторной оценке с другим порогом модель не вызывается
+        prob = cache.get_or_compute(cache_key(image_path, weights, precision, backend), compute)
+    pred_mask_t = (torch.from_numpy(prob) > threshold).float().unsqueeze(0).unsqueeze(0).to(device)
 
 
-    dice = dice_coefficient(pred_mask_t, gt_mask_t).item()
-    iou = iou_score(pred_mask_t, gt_mask_t).item()
+    metrics = SegmentationMetrics()
+    metrics.update(pred_mask_t, gt_mask_t)
+    scores = metrics.compute()["macro"]
+    # Разметка остается фиксированной, а порог предсказания можно менять по сохраненной карте вероятностей
+    sweep = ThresholdSweep()
+    sweep.update(prob[None], gt_mask_np[None])
 
     return {
-        "dice": dice,
-        "iou": iou,
+        "dice": scores["dice"],
+        "iou": scores["iou"],
+        "precision": scores["precision"],
+        "recall": scores["recall"],
         "input_image": original_img_np,  
         "gt_mask": (gt_mask_np * 255).astype(np.uint8),
-        "pred_mask": (pred_mask_t.squeeze().cpu().numpy() * 255).astype(np.uint8)
-    }
\ No newline at end of file
+        "pred_mask": (pred_mask_t.squeeze().cpu().numpy() * 255).astype(np.uint8),
+        "probability": prob,
+        "sweep": sweep.compute(),
+    }
+
+# Минимальные Dice и IoU масок в пониженной точности относительно масок fp32
+PRECISION_TOLERANCE = 0.99
+
+def compare_precision(image_paths, weights, precision, threshold=0.3):
+    # Сравнивает маски в пониженной точности с масками fp32 на тех же изображениях
+    reference = load_model(weights, "fp32")
+    model = load_model(weights, precision)
+    metrics = SegmentationMetrics()
+    for path in image_paths:
+        img_tensor = torch.tensor(load_image(path)).unsqueeze(0).unsqueeze(0).to(DEVICE)
+        ref_mask = (infer(reference, img_tensor) > threshold).float()
+        pred_mask = (infer(model, img_tensor, precision) > threshold).float()
+        metrics.update(pred_mask, ref_mask)
+    return metrics.compute()["macro"]
+
+def evaluate_folder(image_paths, weights, threshold=0.3, batch_size=8, workers=None,
+                    precision="fp32", backend=None, progress=None, cache=None, sweep=False):
+    # Модель загружается один раз, изображения декодируются пулом потоков и проходят батчами
+    model = None
+    metrics = SegmentationMetrics()
+    threshold_sweep = ThresholdSweep() if sweep else None
+    failed = []
+    rows = []
+
+    def decode(path):
+        img = load_image(path)
+        key = cached = None
+        if cache is not None:
+            key = cache_key(path, weights, precision, backend)
+            cached = cache.get(key)
+        return img, key, cached
+
+    def score(batch):
+        nonlocal model
+        # Модель вызывается только для изображений, которых нет в кэше
+        probs = [cached for _, (_, _, cached) in batch]
+        missing = [i for i, prob in enumerate(probs) if prob is None]
+        if missing:
+            if model is None:
+                model = load_model(weights, precision, backend)
+            computed = predict_batch(model, [batch[i][1][0] for i in missing], precision)
+            for i, prob in zip(missing, computed):
+                if cache is not None:
+                    cache.put(batch[i][1][1], prob)
+                    # Порог применяется к тому же квантованному значению, что будет прочитано из кэша
+                    prob = dequantize(quantize(prob))
+                probs[i] = prob
+        imgs = torch.from_numpy(np.stack([img for _, (img, _, _) in batch])).unsqueeze(1).to(DEVICE)
+        pred_mask = (torch.from_numpy(np.stack(probs)).unsqueeze(1).to(DEVICE) > threshold).float()
+        gt_mask = (imgs < threshold).float()
+        metrics.update(pred_mask, gt_mask)
+        if threshold_sweep is not None:
+            threshold_sweep.update(np.stack(probs), gt_mask.cpu().numpy())
+        batch_metrics = SegmentationMetrics()
+        batch_metrics.update(pred_mask, gt_mask)
+        per_image = batch_metrics.compute()["per_image"]
+        for i, (path, _) in enumerate(batch):
+            row = {"image": path}
+            row.update({name: float(per_image[name][i]) for name in METRIC_NAMES})
+            rows.append(row)
+            if progress is not None:
+                progress(len(rows), len(image_paths), row)
+
+    with ThreadPoolExecutor(workers or default_workers()) as pool:
+        batch = []
+        for path, future in prefetch(pool, decode, image_paths, depth=2 * batch_size):
+            try:
+                batch.append((path, future.result()))
+            except Exception as e:
+                failed.append((path, str(e)))
+                continue
+            if len(batch) == batch_size:
+                score(batch)
+                batch = []
+        if batch:
+            score(batch)
+
+    results = metrics.compute()
+    report = {
+        "rows": rows,
+        "failed": failed,
+        "count": results["count"],
+        "micro": results["micro"],
+        "macro": results["macro"],
+    }
+    if threshold_sweep is not None:
+        report["sweep"] = threshold_sweep.compute()
+    return report
+
+def write_report(results, csv_path=None, json_path=None):
+    if csv_path:
+        with open(csv_path, "w", newline="", encoding="utf-8") as f:
+            writer = csv.DictWriter(f, fieldnames=("image",) + METRIC_NAMES)
+            writer.writeheader()
+            writer.writerows(results["rows"])
+    if json_path:
+        with open(json_path, "w", encoding="utf-8") as f:
+            json.dump(results, f, ensure_ascii=False, indent=2)
+
+def write_sweep(sweep, csv_path):
+    # Кривая точность/полнота и остальные метрики по сетке порогов
+    with open(csv_path, "w", newline="", encoding="utf-8") as f:
+        writer = csv.writer(f)
+        writer.writerow(("threshold",) + tuple(f"{kind}_{name}" for kind in ("macro", "micro") for name in METRIC_NAMES))
+        for i, threshold in enumerate(sweep["thresholds"]):
+            writer.writerow([f"{threshold:.4f}"] + [
+                f"{sweep[kind][name][i]:.6f}" for kind in ("macro", "micro") for name in METRIC_NAMES
+            ])
+
+def main():
+    parser = argparse.ArgumentParser(description="Оценка модели UNet на папке изображений")
+    parser.add_argument('--data', required=True, help="Папка с изображениями или шаблон пути")
+    parser.add_argument('--model', required=True, help="Путь к модели (.pth, .safetensors, TorchScript .pt или .onnx)")
+    parser.add_argument('--held-out', action='store_true',
+                        help="Оценивать только тестовую выборку (20%%), отложенную при обучении")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Порог бинаризации маски (по умолчанию: 0.3)")
+    parser.add_argument('--batch-size', type=int, default=8, help="Размер батча (по умолчанию: 8)")
+    parser.add_argument('--workers', type=int, default=None, help="Количество потоков декодирования")
+    parser.add_argument('--precision', choices=PRECISIONS, default="fp32", help="Точность вычислений")
+    parser.add_argument('--backend', choices=BACKENDS, default=None, help="Бэкенд вывода")
+    parser.add_argument('--compare-precision', action='store_true',
+                        help="Сравнить маски в точности --precision с масками fp32 вместо оценки по разметке")
+    parser.add_argument('--tolerance', type=float, default=PRECISION_TOLERANCE,
+                        help=f"Минимальные Dice и IoU относительно fp32 для --compare-precision "
+                             f"(по умолчанию: {PRECISION_TOLERANCE})")
+    parser.add_argument('--cache-dir', default=None,
+                        help="Папка кэша карт вероятностей: повторная оценка с другим порогом не вызывает модель")
+    parser.add_argument('--cache-size-mb', type=float, default=1024,
+                        help="Максимальный размер кэша в МБ (по умолчанию: 1024)")
+    parser.add_argument('--sweep', action='store_true',
+                        help="Подобрать порог: метрики по сетке порогов за один проход модели")
+    parser.add_argument('--sweep-csv', default=None, help="Путь для сохранения метрик по сетке порогов (CSV)")
+    parser.add_argument('--csv', default=None, help="Путь для сохранения результатов по изображениям (CSV)")
+    parser.add_argument('--json', default=None, help="Путь для сохранения всех результатов (JSON)")
+    args = parser.parse_args()
+
+    if args.held_out:
+        from train import split_images
+        _, test_images = split_images(args.data)
+        image_paths = [os.path.join(args.data, name) for name in test_images]
+    else:
+        image_paths = collect_images(args.data)
+    if not image_paths:
+        parser.error(f"Не найдено изображений: {args.data}")
+
+    if args.compare_precision:
+        if args.precision == "fp32":
+            parser.error("Для --compare-precision укажите --precision bf16 или fp16")
+        scores = compare_precision(image_paths, args.model, args.precision, args.threshold)
+        print(f"{args.precision} относительно fp32 ({len(image_paths)} изобр.): "
+              f"Dice {scores['dice']:.4f}, IoU {scores['iou']:.4f}, допуск {args.tolerance:.4f}")
+        if scores["dice"] < args.tolerance or scores["iou"] < args.tolerance:
+            print(f"Маски в точности {args.precision} расходятся с fp32 сильнее допуска")
+            raise SystemExit(1)
+        return
+
+    cache = ProbabilityCache(args.cache_dir, int(args.cache_size_mb * 1024 ** 2)) if args.cache_dir else None
+
+    def progress(done, total, row):
+        print(f"\rОбработано {done}/{total}", end="", flush=True)
+
+    results = evaluate_folder(
+        image_paths, args.model, threshold=args.threshold, batch_size=args.batch_size,
+        workers=args.workers, precision=args.precision, backend=args.backend, progress=progress,
+        cache=cache, sweep=args.sweep or bool(args.sweep_csv),
+    )
+    print()
+    write_report(results, args.csv, args.json)
+    print(f"Оценено изображений: {results['count']}")
+    print(format_metrics(results))
+    if "sweep" in results and results["sweep"]["best"] is not None:
+        best = results["sweep"]["best"]
+        print(f"Лучший порог по Dice: {best['threshold']:.3f} (Dice {best['dice']:.4f}, IoU {best['iou']:.4f}, "
+              f"точность {best['precision']:.4f}, полнота {best['recall']:.4f})")
+        if args.sweep_csv:
+            write_sweep(results["sweep"], args.sweep_csv)
+    for path, error in results["failed"]:
+        print(f"Ошибка при обработке {path}: {error}")
+    if cache is not None:
+        print(f"Кэш вероятностей: попаданий {cache.hits}, промахов {cache.misses}")
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+import numpy as np
+import torch
+from model import infer
+
+TILE_SIZE = (320, 624)
+OVERLAP = (64, 128)
+BLEND_MODES = ("cosine", "linear")
+
+
+def tile_positions(length, tile, stride):
+    if length <= tile:
+        return [0]
+    positions = list(range(0, length - tile, stride))
+    positions.append(length - tile)
+    return positions
+
+
+def _ramp(size, overlap, mode):
+    weights = np.ones(size, dtype=np.float32)
+    overlap = min(overlap, size // 2)
+    if overlap <= 0:
+        return weights
+    t = (np.arange(overlap, dtype=np.float32) + 0.5) / overlap
+    if mode == "cosine":
+        ramp = 0.5 - 0.5 * np.cos(np.pi * t)
+    else:
+        ramp = t
+    weights[:overlap] = ramp
+    weights[size - overlap:] = ramp[::-1]
+    return weights
+
+
+def blend_weights(tile_size, overlap, mode="cosine"):
+    if mode not in BLEND_MODES:
+        raise ValueError(f"Неизвестный режим смешивания: {mode}")
+    wy = _ramp(tile_size[0], overlap[0], mode)
+    wx = _ramp(tile_size[1], overlap[1], mode)
+    return np.outer(wy, wx)
+
+
+def read_tile(source, y, x, tile_size):
+    tile = np.asarray(source[y:y + tile_size[0], x:x + tile_size[1]])
+    if tile.dtype == np.uint8:
+        tile = tile.astype(np.float32) / 255.0
+    else:
+        tile = tile.astype(np.float32, copy=False)
+    h, w = tile.shape
+    # Сцена меньше окна: дополняем отражением до размера окна
+    if h < tile_size[0] or w < tile_size[1]:
+        tile = np.pad(tile, ((0, tile_size[0] - h), (0, tile_size[1] - w)), mode="reflect")
+    return tile, h, w
+
+
+def check_tile_size(model, tile_size):
+    # Кратность берется из глубины модели; у TorchScript и ONNX ее нет, для них - стандартная глубина 2
+    multiple = getattr(model, "input_multiple", 4)
+    if tile_size[0] % multiple or tile_size[1] % multiple:
+        raise ValueError(f"Размер окна должен быть кратен {multiple}")
+
+
+def iter_tiled_probabilities(model, source, tile_size=TILE_SIZE, overlap=OVERLAP, blend="cosine",
+                             batch_size=4, device=torch.device("cpu"), precision="fp32"):
+    tile_h, tile_w = tile_size
+    check_tile_size(model, tile_size)
+    if overlap[0] >= tile_h or overlap[1] >= tile_w:
+        raise ValueError("Перекрытие должно быть меньше размера окна")
+
+    height, width = source.shape[:2]
+    ys = tile_positions(height, tile_h, tile_h - overlap[0])
+    xs = tile_positions(width, tile_w, tile_w - overlap[1])
+    weights = blend_weights(tile_size, overlap, blend)
+
+    # В памяти хранится только полоса высотой в одно окно, поэтому расход памяти не зависит от высоты сцены
+    band_h = min(tile_h, height)
+    acc = np.zeros((band_h, width), dtype=np.float32)
+    wsum = np.zeros((band_h, width), dtype=np.float32)
+
+    for row, y in enumerate(ys):
+        for start in range(0, len(xs), batch_size):
+            batch_xs = xs[start:start + batch_size]
+            tiles = [read_tile(source, y, x, tile_size) for x in batch_xs]
+            batch = torch.from_numpy(np.stack([t for t, _, _ in tiles])).unsqueeze(1).to(device)
+            preds = infer(model, batch, precision).squeeze(1).cpu().numpy()
+            for x, (_, h, w), pred in zip(batch_xs, tiles, preds):
+                acc[:h, x:x + w] += pred[:h, :w] * weights[:h, :w]
+                wsum[:h, x:x + w] += weights[:h, :w]
+
+        next_y = ys[row + 1] if row + 1 < len(ys) else height
+        done = next_y - y
+        yield y, next_y, acc[:done] / wsum[:done]
+
+        acc = np.roll(acc, -done, axis=0)
+        wsum = np.roll(wsum, -done, axis=0)
+        acc[band_h - done:] = 0
+        wsum[band_h - done:] = 0
+
+
+def predict_tiled(model, source, out=None, **kwargs):
+    if out is None:
+        out = np.empty(source.shape[:2], dtype=np.float32)
+    for y0, y1, band in iter_tiled_probabilities(model, source, **kwargs):
+        out[y0:y1] = band
+    return out
@@ -0,0 +1,320 @@
+import argparse
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+import numpy as np
+import cv2
+import torch
+from detect import load_model, backend_for_path, read_image, structured_result, DEVICE, BACKENDS
+from model import infer, PRECISIONS
+from model_cache import checkpoint_key
+from polygons import save_npz, load_npz
+from tiling import read_tile, check_tile_size, TILE_SIZE
+
+INDEX_NAME = "index.json"
+CHANGE_STATUSES = ("new", "vanished", "growth", "shrinkage", "stable")
+
+
+def tile_grid(shape, tile_size=TILE_SIZE):
+    height, width = shape
+    return [(y, x) for y in range(0, height, tile_size[0]) for x in range(0, width, tile_size[1])]
+
+
+def tile_hashes(img_gray, tile_size=TILE_SIZE):
+    # Хэш содержимого каждого окна: неизменившиеся окна повторно не прогоняются через модель
+    hashes = {}
+    for y, x in tile_grid(img_gray.shape, tile_size):
+        tile = np.ascontiguousarray(img_gray[y:y + tile_size[0], x:x + tile_size[1]])
+        digest = hashlib.blake2b(tile.tobytes(), digest_size=16)
+        digest.update(str(tile.shape).encode())
+        hashes[f"{y}_{x}"] = digest.hexdigest()
+    return hashes
+
+
+def predict_tiles(model, img_gray, positions, out, tile_size=TILE_SIZE, batch_size=4, precision="fp32"):
+    # Окна обрабатываются без перекрытия, чтобы результат окна зависел только от его содержимого
+    check_tile_size(model, tile_size)
+    for start in range(0, len(positions), batch_size):
+        batch_positions = positions[start:start + batch_size]
+        tiles = [read_tile(img_gray, y, x, tile_size) for y, x in batch_positions]
+        batch = torch.from_numpy(np.stack([t for t, _, _ in tiles])).unsqueeze(1).to(DEVICE)
+        preds = infer(model, batch, precision).squeeze(1).cpu().numpy()
+        for (y, x), (_, h, w), pred in zip(batch_positions, tiles, preds):
+            out[y:y + h, x:x + w] = np.round(pred[:h, :w] * 255).astype(np.uint8)
+    return out
+
+
+def compare_masks(previous, current, min_change=0.1, pixel_area=1.0):
+    # Пятна сопоставляются по перекрытию; слияния и разделения объединяются в одну группу
+    prev_count, prev_labels, prev_stats, _ = cv2.connectedComponentsWithStats(previous.astype(np.uint8), connectivity=8)
+    cur_count, cur_labels, cur_stats, _ = cv2.connectedComponentsWithStats(current.astype(np.uint8), connectivity=8)
+    both = (prev_labels > 0) & (cur_labels > 0)
+    pairs = np.unique(prev_labels[both].astype(np.int64) * cur_count + cur_labels[both])
+
+    parent = list(range(prev_count + cur_count))
+
+    def find(i):
+        while parent[i] != i:
+            parent[i] = parent[parent[i]]
+            i = parent[i]
+        return i
+
+    for pair in pairs:
+        a, b = find(int(pair // cur_count)), find(prev_count + int(pair % cur_count))
+        if a != b:
+            parent[b] = a
+
+    groups = {}
+    for i in range(1, prev_count):
+        groups.setdefault(find(i), ([], []))[0].append(i)
+    for j in range(1, cur_count):
+        groups.setdefault(find(prev_count + j), ([], []))[1].append(j)
+
+    def bbox(stats, ids):
+        left = stats[ids, cv2.CC_STAT_LEFT]
+        top = stats[ids, cv2.CC_STAT_TOP]
+        return [int(left.min()), int(top.min()),
+                int((left + stats[ids, cv2.CC_STAT_WIDTH]).max()), int((top + stats[ids, cv2.CC_STAT_HEIGHT]).max())]
+
+    changes = []
+    for prev_ids, cur_ids in groups.values():
+        prev_area = float(prev_stats[prev_ids, cv2.CC_STAT_AREA].sum()) * pixel_area
+        cur_area = float(cur_stats[cur_ids, cv2.CC_STAT_AREA].sum()) * pixel_area
+        if not prev_ids:
+            status = "new"
+        elif not cur_ids:
+            status = "vanished"
+        elif cur_area > prev_area * (1 + min_change):
+            status = "growth"
+        elif cur_area < prev_area * (1 - min_change):
+            status = "shrinkage"
+        else:
+            status = "stable"
+        boxes = ([bbox(prev_stats, prev_ids)] if prev_ids else []) + ([bbox(cur_stats, cur_ids)] if cur_ids else [])
+        changes.append({
+            "status": status,
+            "previous_area": prev_area,
+            "current_area": cur_area,
+            "change": cur_area - prev_area,
+            "bbox": [min(b[0] for b in boxes), min(b[1] for b in boxes),
+                     max(b[2] for b in boxes), max(b[3] for b in boxes)],
+        })
+    changes.sort(key=lambda c: abs(c["change"]), reverse=True)
+    return changes
+
+
+def summarize(changes, previous_area, current_area):
+    summary = {status: 0 for status in CHANGE_STATUSES}
+    for change in changes:
+        summary[change["status"]] += 1
+    summary["previous_area"] = previous_area
+    summary["current_area"] = current_area
+    return summary
+
+
+def _safe_name(timestamp):
+    return re.sub(r"[^0-9A-Za-z_.-]", "-", timestamp)
+
+
+class AreaStore:
+    # Хранилище результатов по районам: для каждого снимка сжатая карта вероятностей (uint8) и полигоны
+    def __init__(self, store_dir):
+        self.store_dir = store_dir
+
+    def _area_dir(self, area_id):
+        return os.path.join(self.store_dir, _safe_name(area_id))
+
+    def _read_index(self, area_id):
+        try:
+            with open(os.path.join(self._area_dir(area_id), INDEX_NAME), "r", encoding="utf-8") as f:
+                return json.load(f)
+        except (OSError, ValueError):
+            return {"area": area_id, "acquisitions": []}
+
+    def _write_index(self, area_id, index):
+        path = os.path.join(self._area_dir(area_id), INDEX_NAME)
+        tmp_path = path + ".tmp"
+        with open(tmp_path, "w", encoding="utf-8") as f:
+            json.dump(index, f, ensure_ascii=False, indent=1)
+        os.replace(tmp_path, path)
+
+    def areas(self):
+        if not os.path.isdir(self.store_dir):
+            return []
+        return sorted(
+            self._read_index(name)["area"] for name in os.listdir(self.store_dir)
+            if os.path.exists(os.path.join(self.store_dir, name, INDEX_NAME))
+        )
+
+    def acquisitions(self, area_id):
+        return self._read_index(area_id)["acquisitions"]
+
+    def _entry(self, area_id, timestamp):
+        for entry in self.acquisitions(area_id):
+            if entry["timestamp"] == timestamp:
+                return entry
+        raise KeyError(f"Снимок {timestamp} района {area_id} не найден")
+
+    def load_probability(self, area_id, timestamp, quantized=False):
+        entry = self._entry(area_id, timestamp)
+        with np.load(os.path.join(self._area_dir(area_id), entry["probability"])) as data:
+            prob = data["prob"]
+        return prob if quantized else prob.astype(np.float32) / 255.0
+
+    def load_polygons(self, area_id, timestamp):
+        entry = self._entry(area_id, timestamp)
+        return load_npz(os.path.join(self._area_dir(area_id), entry["polygons"]))
+
+    def previous(self, area_id, timestamp):
+        earlier = [e for e in self.acquisitions(area_id) if e["timestamp"] < timestamp]
+        return max(earlier, key=lambda e: e["timestamp"]) if earlier else None
+
+    def add(self, area_id, timestamp, image_path, model_path, threshold=0.3, tile_size=TILE_SIZE, batch_size=4,
+            precision="fp32", backend=None, min_change=0.1, epsilon=1.0):
+        start = time.perf_counter()
+        area_dir = self._area_dir(area_id)
+        os.makedirs(area_dir, exist_ok=True)
+        original_img, img_gray = read_image(image_path)
+        hashes = tile_hashes(img_gray, tile_size)
+        # Бэкенд входит в ключ: вероятности eager, TorchScript и ONNX не подменяют друг друга
+        backend = backend or backend_for_path(model_path)
+        model_key = [*checkpoint_key(model_path), precision, backend]
+
+        previous = self.previous(area_id, timestamp)
+        prev_prob = None
+        if previous is not None:
+            prev_prob = self.load_probability(area_id, previous["timestamp"], quantized=True)
+        # Окна можно взять из прошлого снимка только при той же сетке и той же модели
+        reusable = (
+            previous is not None and prev_prob.shape == img_gray.shape
+            and previous["model"] == model_key and previous["tile_size"] == list(tile_size)
+        )
+
+        prob = np.zeros(img_gray.shape, dtype=np.uint8)
+        stale = []
+        for key, digest in hashes.items():
+            y, x = (int(v) for v in key.split("_"))
+            if reusable and previous["tiles"].get(key) == digest:
+                prob[y:y + tile_size[0], x:x + tile_size[1]] = prev_prob[y:y + tile_size[0], x:x + tile_size[1]]
+            else:
+                stale.append((y, x))
+        if stale:
+            model = load_model(model_path, precision, backend)
+            predict_tiles(model, img_gray, stale, prob, tile_size, batch_size, precision)
+
+        prob_float = prob.astype(np.float32) / 255.0
+        result = structured_result(image_path, original_img, prob_float, threshold, epsilon)
+        pixel_area = 1.0
+        if "transform" in result:
+            a, d, b, e, _, _ = result["transform"]
+            pixel_area = abs(a * e - b * d)
+
+        name = _safe_name(timestamp)
+        prob_file, polygons_file = f"{name}.prob.npz", f"{name}.polygons.npz"
+        np.savez_compressed(os.path.join(area_dir, prob_file), prob=prob)
+        save_npz(result["polygons"], os.path.join(area_dir, polygons_file))
+
+        mask = prob > threshold * 255
+        changes = []
+        previous_area = 0.0
+        if previous is not None and prev_prob.shape == prob.shape:
+            prev_mask = prev_prob > threshold * 255
+            changes = compare_masks(prev_mask, mask, min_change, pixel_area)
+            previous_area = float(prev_mask.sum()) * pixel_area
+
+        report = {
+            "area": area_id,
+            "timestamp": timestamp,
+            "previous": previous["timestamp"] if previous else None,
+            "tiles_total": len(hashes),
+            "tiles_inferred": len(stale),
+            "tiles_reused": len(hashes) - len(stale),
+            "crs": result["crs"],
+            "polygons": len(result["polygons"]),
+            "changes": changes,
+            "summary": summarize(changes, previous_area, float(mask.sum()) * pixel_area),
+            "seconds": time.perf_counter() - start,
+        }
+
+        index = self._read_index(area_id)
+        index["acquisitions"] = [e for e in index["acquisitions"] if e["timestamp"] != timestamp] + [{
+            "timestamp": timestamp,
+            "image": os.path.abspath(image_path),
+            "shape": list(img_gray.shape),
+            "tile_size": list(tile_size),
+            "model": model_key,
+            "threshold": threshold,
+            "tiles": hashes,
+            "probability": prob_file,
+            "polygons": polygons_file,
+            "summary": report["summary"],
+        }]
+        index["acquisitions"].sort(key=lambda e: e["timestamp"])
+        self._write_index(area_id, index)
+        return report
+
+
+def format_report(report):
+    summary = report["summary"]
+    lines = [
+        f"Район {report['area']}, снимок {report['timestamp']}: окон {report['tiles_total']}, "
+        f"обработано моделью {report['tiles_inferred']}, взято из прошлого снимка {report['tiles_reused']} "
+        f"({report['seconds']:.1f} с)"
+    ]
+    if report["previous"] is None:
+        lines.append(f"Первый снимок района, найдено пятен: {report['polygons']}")
+    else:
+        lines.append(
+            f"Сравнение с {report['previous']}: новых {summary['new']}, исчезло {summary['vanished']}, "
+            f"выросло {summary['growth']}, уменьшилось {summary['shrinkage']}, без изменений {summary['stable']}; "
+            f"общая площадь {summary['previous_area']:.0f} -> {summary['current_area']:.0f}"
+        )
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Хранилище результатов по районам и поиск изменений между снимками")
+    parser.add_argument('--store', required=True, help="Папка хранилища результатов")
+    parser.add_argument('--area', required=True, help="Идентификатор района")
+    parser.add_argument('--image', default=None, help="Новый снимок района; без него выводится история района")
+    parser.add_argument('--model', default=None, help="Путь к модели (.pth, .safetensors, TorchScript .pt или .onnx)")
+    parser.add_argument('--time', default=None, help="Время съемки в формате ISO 8601 (по умолчанию: текущее время)")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Порог бинаризации маски (по умолчанию: 0.3)")
+    parser.add_argument('--min-change', type=float, default=0.1,
+                        help="Относительное изменение площади, считающееся ростом или уменьшением (по умолчанию: 0.1)")
+    parser.add_argument('--tile', type=int, nargs=2, default=TILE_SIZE, metavar=('H', 'W'),
+                        help="Размер окна (по умолчанию: 320 624)")
+    parser.add_argument('--batch-size', type=int, default=4, help="Размер батча окон (по умолчанию: 4)")
+    parser.add_argument('--precision', choices=PRECISIONS, default="fp32",
+                        help="Точность вычислений: fp32, bf16 или fp16 (по умолчанию: fp32)")
+    parser.add_argument('--backend', choices=BACKENDS, default=None,
+                        help="Бэкенд вывода (по умолчанию определяется по расширению файла модели)")
+    parser.add_argument('--json', default=None, help="Путь для сохранения отчета об изменениях в JSON")
+    args = parser.parse_args()
+
+    store = AreaStore(args.store)
+    if args.image is None:
+        for entry in store.acquisitions(args.area):
+            summary = entry["summary"]
+            print(f"{entry['timestamp']}: новых {summary['new']}, исчезло {summary['vanished']}, "
+                  f"выросло {summary['growth']}, уменьшилось {summary['shrinkage']}, площадь {summary['current_area']:.0f}")
+        return
+    if args.model is None:
+        parser.error("Для добавления снимка укажите --model")
+
+    timestamp = args.time or datetime.now().isoformat(timespec="seconds")
+    report = store.add(
+        args.area, timestamp, args.image, args.model, threshold=args.threshold, tile_size=tuple(args.tile),
+        batch_size=args.batch_size, precision=args.precision, backend=args.backend, min_change=args.min_change,
+    )
+    print(format_report(report))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
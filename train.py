@@ -1,17 +1,33 @@
+import contextlib
 import torch
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from torch.nn.parallel import DistributedDataParallel
 from torch.utils.data import Dataset, DataLoader
+from torch.utils.data.distributed import DistributedSampler
 import os
+import time
 import numpy as np
-from model import UNet
+try:
+    import resource
+except ImportError:
+    resource = None
+from model import (PRECISIONS, DEFAULT_CONFIG, INPUT_SIZE, autocast, prepare_model, build_model, model_state,
+                   check_input_size)
 import argparse
 from PyQt5.QtCore import QObject, pyqtSignal
 from PIL import Image
-from test import dice_coefficient, iou_score  # Импортируем метрики из test.py
+from dataset_cache import DatasetCache
+from checkpoint import (AsyncCheckpointWriter, save_atomic, load_snapshot, rng_state, restore_rng_state,
+                        SNAPSHOT_NAME, BEST_NAME)
+from profiling import Profiler, format_stages
+from weights import save_weights, model_metadata, is_weights_file, WEIGHTS_EXTENSION
 
 class dataset(Dataset):
-    def __init__(self, image_dir, threshold=0.5, images=None):
+    def __init__(self, image_dir, threshold=0.5, images=None, cache=None):
         self.image_dir = image_dir
         self.threshold = threshold
+        self.cache = cache
         # Если передан список изображений, используем его, иначе загружаем все изображения из папки
         if images is not None:
             self.images = images
@@ -24,7 +40,10 @@ class dataset(Dataset):
         if not self.images:
             raise ValueError(f"Папка {image_dir} не содержит изображений формата .jpg или .jpeg")
         
+        # Изображения из кэша уже были декодированы при его построении
         for img_name in self.images:
+            if cache is not None and img_name in cache:
+                continue
             img_path = os.path.join(image_dir, img_name)
             try:
                 with Image.open(img_path) as img:
@@ -36,106 +55,475 @@ class dataset(Dataset):
         return len(self.images)
 
     def __getitem__(self, idx):
+        if self.cache is not None and self.images[idx] in self.cache:
+            img, mask = self.cache.get(self.images[idx])
+            img = torch.from_numpy(img.astype(np.float32) / 255.0).unsqueeze(0)
+            mask = torch.from_numpy(mask.astype(np.float32)).unsqueeze(0)
+            return img, mask
         path = os.path.join(self.image_dir, self.images[idx])
         img = Image.open(path).convert("L")
         if img is None:
             raise ValueError(f"Ошибка загрузки изображения: {path}")
-        img = img.resize((624, 320))
+        img = img.resize(INPUT_SIZE)
         img = np.array(img).astype(np.float32) / 255.0
         mask = (img < self.threshold).astype(np.float32)
         img = np.expand_dims(img, axis=0)
         mask = np.expand_dims(mask, axis=0)
         return torch.tensor(img), torch.tensor(mask)
 
+def split_images(image_dir):
+    # Загружаем список всех изображений
+    all_images = [
+        img for img in os.listdir(image_dir)
+        if img.lower().endswith(('.jpg', '.jpeg'))
+    ]
+    # Перемешиваем и делим на обучающую и тестовую выборки (80% train, 20% test)
+    np.random.seed(42)  # Для воспроизводимости
+    all_images = np.array(all_images)
+    np.random.shuffle(all_images)
+    train_size = int(0.8 * len(all_images))
+    return all_images[:train_size].tolist(), all_images[train_size:].tolist()
+
+def default_num_workers(nproc=1):
+    # Одно ядро оставляем основному процессу обучения
+    return min(4, max(0, (os.cpu_count() or 1) // nproc - 1))
+
+def peak_memory_mb(device):
+    # На GPU — пик выделенной памяти за эпоху, на CPU — пиковый RSS процесса за все время работы
+    if device.type == 'cuda':
+        return torch.cuda.max_memory_allocated(device) / 2 ** 20
+    if resource is None:
+        return 0.0
+    return resource.getrusage(resource.RUSAGE_SELF).ru_maxrss / 1024
+
+def loader_options(device, num_workers=None, prefetch_factor=2, persistent_workers=None, pin_memory=None, nproc=1):
+    if num_workers is None:
+        num_workers = default_num_workers(nproc)
+    if pin_memory is None:
+        pin_memory = device.type == 'cuda'
+    options = {"num_workers": num_workers, "pin_memory": pin_memory}
+    if num_workers > 0:
+        options["prefetch_factor"] = prefetch_factor
+        options["persistent_workers"] = True if persistent_workers is None else persistent_workers
+    return options
+
 class Trainer(QObject):
     epoch_start_signal = pyqtSignal(int, int)
     epoch_complete_signal = pyqtSignal(int, float, float, float, float)  # Добавлены test_loss, dice, iou
     batch_progress_signal = pyqtSignal(int, int, float)
+    epoch_timing_signal = pyqtSignal(int, float, float)  # Время ожидания данных и вычислений за эпоху
+    stage_timing_signal = pyqtSignal(int, object)  # Время по этапам за эпоху: {этап: секунды}
     training_complete_signal = pyqtSignal(str)
 
-    def __init__(self, image_dir, save_path, batch_size=1, epochs=25, lr=1e-4, threshold=0.3):
+    def __init__(self, image_dir, save_path, batch_size=1, epochs=25, lr=1e-4, threshold=0.3, cache_dir=None,
+                 num_workers=None, prefetch_factor=2, persistent_workers=None, pin_memory=None, precision="fp32",
+                 nproc=1, nnodes=1, node_rank=0, master_addr="127.0.0.1", master_port=29500,
+                 checkpoint_dir=None, checkpoint_every=1, resume=False, accumulation_steps=1,
+                 gradient_checkpointing=False, profile=False, profile_dir=None, torch_profile_steps=0,
+                 width=1.0, depth=2, separable=False, batch_norm=False, local_rank=0):
         super().__init__()
+        # Аргументы конструктора нужны, чтобы создать такой же Trainer в дочерних процессах
+        self.config = {k: v for k, v in locals().items() if k not in ("self", "__class__", "local_rank")}
         self.image_dir = image_dir
         self.save_path = save_path
         self.batch_size = batch_size
         self.epochs = epochs
         self.lr = lr
         self.threshold = threshold
+        self.cache_dir = cache_dir
+        self.num_workers = num_workers
+        self.prefetch_factor = prefetch_factor
+        self.persistent_workers = persistent_workers
+        self.pin_memory = pin_memory
+        self.precision = precision
+        self.nproc = nproc
+        self.world_size = nproc * nnodes
+        self.local_rank = local_rank
+        self.rank = node_rank * nproc + local_rank
+        self.master_addr = master_addr
+        self.master_port = master_port
+        # По умолчанию снимки состояния сохраняются рядом с моделью
+        self.checkpoint_dir = checkpoint_dir or os.path.splitext(save_path)[0] + "_checkpoints"
+        self.checkpoint_every = max(1, checkpoint_every)
+        self.resume = resume
+        # Эффективный размер батча равен batch_size * accumulation_steps * число процессов
+        self.accumulation_steps = max(1, accumulation_steps)
+        self.gradient_checkpointing = gradient_checkpointing
+        # Конфигурация сети сохраняется в чекпоинтах, чтобы detect и test создавали такую же сеть
+        self.architecture = dict(DEFAULT_CONFIG, width=width, depth=depth, separable=separable, batch_norm=batch_norm)
+        # Изображения сжимаются до 624x320, поэтому глубина сети ограничена кратностью этого размера
+        check_input_size(depth, INPUT_SIZE)
+        # Замеры по этапам включаются флагом profile или папкой для трассировок
+        self.profile_dir = profile_dir
+        self.torch_profile_steps = torch_profile_steps
+        self.profiler = Profiler(enabled=profile or bool(profile_dir) or torch_profile_steps > 0)
+
+    def emit(self, signal, *args):
+        # В распределенном режиме сигналы отправляет только процесс с рангом 0
+        if self.rank == 0:
+            signal.emit(*args)
+
+    def start_local_workers(self):
+        context = mp.get_context("spawn")
+        workers = []
+        for local_rank in range(1, self.nproc):
+            worker = context.Process(target=run_worker, args=(self.config, local_rank))
+            worker.start()
+            workers.append(worker)
+        return workers
 
     def run(self):
-        self.training_complete_signal.emit(f"Загрузка датасета из: {self.image_dir}")
-        # Загружаем список всех изображений
-        all_images = [
-            img for img in os.listdir(self.image_dir)
-            if img.lower().endswith(('.jpg', '.jpeg'))
-        ]
-        # Перемешиваем и делим на обучающую и тестовую выборки (80% train, 20% test)
-        np.random.seed(42)  # Для воспроизводимости
-        all_images = np.array(all_images)
-        np.random.shuffle(all_images)
-        train_size = int(0.8 * len(all_images))
-        train_images = all_images[:train_size].tolist()
-        test_images = all_images[train_size:].tolist()
-        
-        train_dataset = dataset(self.image_dir, threshold=self.threshold, images=train_images)
-        test_dataset = dataset(self.image_dir, threshold=self.threshold, images=test_images)
-        train_dataloader = DataLoader(train_dataset, batch_size=self.batch_size, shuffle=True)
-        test_dataloader = DataLoader(test_dataset, batch_size=self.batch_size, shuffle=False)
-        
-        device = torch.device('cuda' if torch.cuda.is_available() else 'cpu')
-        model = UNet().to(device)
+        distributed = self.world_size > 1
+        workers = []
+        if distributed:
+            # Локальный ранг 0 запускается в текущем процессе, остальные ранги узла — в дочерних
+            if self.local_rank == 0:
+                workers = self.start_local_workers()
+            dist.init_process_group(
+                "gloo", init_method=f"tcp://{self.master_addr}:{self.master_port}",
+                rank=self.rank, world_size=self.world_size,
+            )
+        try:
+            self.train(distributed)
+        finally:
+            if distributed:
+                dist.destroy_process_group()
+            for worker in workers:
+                worker.join()
+
+    def update_cache(self, distributed):
+        cache = DatasetCache(self.cache_dir, self.image_dir, threshold=self.threshold)
+        if not distributed:
+            return cache, cache.update()
+        # Кэш обновляет сначала ранг 0, затем первый процесс каждого узла (если папка кэша не общая),
+        # остальные процессы только читают готовый индекс
+        updated = cache.update() if self.rank == 0 else 0
+        dist.barrier()
+        if self.local_rank == 0 and self.rank != 0:
+            cache.update()
+        dist.barrier()
+        if self.local_rank != 0:
+            cache.update()
+        return cache, updated
+
+    def find_snapshot(self):
+        snapshot_path = os.path.join(self.checkpoint_dir, SNAPSHOT_NAME)
+        if not self.resume:
+            return None
+        if not os.path.exists(snapshot_path):
+            self.emit(self.training_complete_signal, f"Снимок {snapshot_path} не найден, обучение начинается заново")
+            return None
+        return load_snapshot(snapshot_path)
+
+    def train(self, distributed):
+        # test.py импортируется здесь, чтобы импорт train не тянул модуль оценки при запуске приложения
+        from test import SegmentationMetrics, format_metrics
+        self.emit(self.training_complete_signal, f"Загрузка датасета из: {self.image_dir}")
+        snapshot = self.find_snapshot()
+        if snapshot is not None:
+            # При продолжении используется сохраненное разбиение, даже если в папке появились новые изображения
+            train_images, test_images = snapshot["train_images"], snapshot["test_images"]
+        else:
+            train_images, test_images = split_images(self.image_dir)
+        split = {"train_images": list(train_images), "test_images": list(test_images)}
+        if distributed:
+            # Тестовая выборка делится между процессами без повторов, метрики затем собираются со всех рангов
+            test_images = test_images[self.rank::self.world_size]
+
+        cache = None
+        if self.cache_dir:
+            cache, updated = self.update_cache(distributed)
+            self.emit(self.training_complete_signal, f"Кэш датасета: {self.cache_dir}, обновлено изображений: {updated}")
+
+        train_dataset = dataset(self.image_dir, threshold=self.threshold, images=train_images, cache=cache)
+        test_dataset = dataset(self.image_dir, threshold=self.threshold, images=test_images, cache=cache) if test_images else []
+        if torch.cuda.is_available():
+            device = torch.device('cuda', self.local_rank % torch.cuda.device_count())
+        else:
+            device = torch.device('cpu')
+            if distributed:
+                torch.set_num_threads(max(1, (os.cpu_count() or 1) // self.nproc))
+        options = loader_options(
+            device, self.num_workers, self.prefetch_factor, self.persistent_workers, self.pin_memory, self.nproc
+        )
+        non_blocking = options["pin_memory"]
+        sampler = None
+        if distributed:
+            sampler = DistributedSampler(train_dataset, num_replicas=self.world_size, rank=self.rank, shuffle=True, seed=42)
+        train_dataloader = DataLoader(
+            train_dataset, batch_size=self.batch_size, shuffle=sampler is None, sampler=sampler, **options
+        )
+        test_dataloader = DataLoader(test_dataset, batch_size=self.batch_size, shuffle=False, **options)
+        self.emit(
+            self.training_complete_signal,
+            f"Загрузка данных: потоков {options['num_workers']}, pin_memory={options['pin_memory']}"
+        )
+        if distributed:
+            self.emit(self.training_complete_signal, f"Распределенное обучение: процессов {self.world_size} (gloo)")
+        if self.accumulation_steps > 1 or self.gradient_checkpointing:
+            self.emit(
+                self.training_complete_signal,
+                f"Эффективный размер батча: {self.batch_size * self.accumulation_steps * self.world_size}, "
+                f"контрольные точки активаций: {'да' if self.gradient_checkpointing else 'нет'}"
+            )
+
+        # При продолжении обучения используется архитектура из снимка
+        architecture = snapshot.get("architecture", DEFAULT_CONFIG) if snapshot is not None else self.architecture
+        base_model = build_model(architecture, INPUT_SIZE, gradient_checkpointing=self.gradient_checkpointing)
+        if snapshot is not None:
+            base_model.load_state_dict(snapshot["model"])
+        base_model = prepare_model(base_model.to(device), self.precision)
+        model = base_model
+        if distributed:
+            model = DistributedDataParallel(model, device_ids=[device.index] if device.type == 'cuda' else None)
         criterion = torch.nn.BCELoss()
         optimizer = torch.optim.Adam(model.parameters(), lr=self.lr)
+        # Масштабирование градиентов нужно только для fp16, в остальных режимах scaler ничего не делает
+        scaler = torch.amp.GradScaler(device.type, enabled=self.precision == "fp16")
+
+        start_epoch = 0
+        best_dice = -1.0
+        if snapshot is not None:
+            optimizer.load_state_dict(snapshot["optimizer"])
+            if snapshot["scaler"]:
+                scaler.load_state_dict(snapshot["scaler"])
+            start_epoch = snapshot["epoch"]
+            best_dice = snapshot["best_dice"]
+            restore_rng_state(snapshot["rng"])
+            self.emit(self.training_complete_signal, f"Продолжение обучения с эпохи {start_epoch + 1}/{self.epochs}")
+
+        # Снимки пишет только ранг 0, запись идет в фоновом потоке параллельно со следующей эпохой
+        writer = None
+        if self.rank == 0:
+            os.makedirs(self.checkpoint_dir, exist_ok=True)
+            writer = AsyncCheckpointWriter()
+        snapshot_path = os.path.join(self.checkpoint_dir, SNAPSHOT_NAME)
+        # Для пути .safetensors модель пишется в плоском формате с метаданными, иначе как state_dict .pth
+        flat = is_weights_file(self.save_path)
+        best_path = os.path.join(
+            self.checkpoint_dir, os.path.splitext(BEST_NAME)[0] + WEIGHTS_EXTENSION if flat else BEST_NAME
+        )
+        last_metrics = {}
+
+        def model_saver(metrics):
+            if not flat:
+                return save_atomic
+            metadata = model_metadata(self.threshold, split, metrics, base_model.config)
+            return lambda state, path: save_weights(state, path, metadata)
+
+        def saved_state():
+            # В .pth конфигурация нестандартной сети хранится вместе с весами
+            return base_model.state_dict() if flat else model_state(base_model)
+
+        prof = self.profiler
+        if self.profile_dir and self.rank == 0:
+            os.makedirs(self.profile_dir, exist_ok=True)
+            if self.torch_profile_steps > 0:
+                prof.start_torch_profiler(os.path.join(self.profile_dir, "torch_trace.json"), self.torch_profile_steps)
 
-        for epoch in range(self.epochs):
+        for epoch in range(start_epoch, self.epochs):
             total_loss = 0
-            self.epoch_start_signal.emit(epoch + 1, self.epochs)
+            data_time = 0.0
+            compute_time = 0.0
+            self.emit(self.epoch_start_signal, epoch + 1, self.epochs)
+            epoch_start = time.perf_counter()
+            if sampler is not None:
+                sampler.set_epoch(epoch)
             model.train()
+            if device.type == 'cuda':
+                torch.cuda.reset_peak_memory_stats(device)
+            train_count = 0
+            num_batches = len(train_dataloader)
+            optimizer.zero_grad()
+            step_start = time.perf_counter()
             for i, (imgs, masks) in enumerate(train_dataloader, 1):
-                imgs, masks = imgs.to(device), masks.to(device)
-                preds = model(imgs)
-                loss = criterion(preds, masks)
-                optimizer.zero_grad()
-                loss.backward()
-                optimizer.step()
-                total_loss += loss.item()
-                self.batch_progress_signal.emit(i, len(train_dataloader), loss.item())
+                loaded = time.perf_counter()
+                data_time += loaded - step_start
+                if prof.enabled:
+                    prof.record("data", step_start, loaded)
+                with prof.span("h2d"):
+                    imgs = imgs.to(device, non_blocking=non_blocking)
+                    masks = masks.to(device, non_blocking=non_blocking)
+                # Шаг оптимизатора делается раз в accumulation_steps микробатчей; последняя группа может быть короче
+                group_start = (i - 1) // self.accumulation_steps * self.accumulation_steps
+                group_size = min(self.accumulation_steps, num_batches - group_start)
+                step = i == group_start + group_size
+                # Между шагами оптимизатора DDP не синхронизирует градиенты
+                sync = model.no_sync() if distributed and not step else contextlib.nullcontext()
+                with sync:
+                    with prof.span("forward"):
+                        with autocast(device, self.precision):
+                            preds = model(imgs)
+                        # BCELoss небезопасен под autocast, поэтому потери считаются в float32 вне его
+                        loss = criterion(preds.float(), masks)
+                    with prof.span("backward"):
+                        scaler.scale(loss / group_size).backward()
+                if step:
+                    with prof.span("optimizer"):
+                        scaler.step(optimizer)
+                        scaler.update()
+                        optimizer.zero_grad()
+                loss_value = loss.item()
+                total_loss += loss_value
+                train_count += imgs.size(0)
+                compute_time += time.perf_counter() - loaded
+                self.emit(self.batch_progress_signal, i, num_batches, loss_value)
+                prof.step()
+                step_start = time.perf_counter()
+            train_time = time.perf_counter() - epoch_start
             
             avg_loss = total_loss / len(train_dataloader)
             
             # Оценка на тестовой выборке
             model.eval()
-            test_loss = 0
-            dice_scores = []
-            iou_scores = []
-            with torch.no_grad():
+            test_loss = torch.zeros((), device=device)
+            metrics = SegmentationMetrics()
+            with torch.no_grad(), prof.span("validation"):
+                step_start = time.perf_counter()
                 for imgs, masks in test_dataloader:
-                    imgs, masks = imgs.to(device), masks.to(device)
-                    preds = model(imgs)
-                    loss = criterion(preds, masks)
-                    test_loss += loss.item()
-                    # Вычисляем Dice и IoU
-                    pred_mask = (preds > self.threshold).float()
-                    dice_scores.append(dice_coefficient(pred_mask, masks).item())
-                    iou_scores.append(iou_score(pred_mask, masks).item())
-            
-            avg_test_loss = test_loss / len(test_dataloader) if len(test_dataloader) > 0 else 0
-            avg_dice = np.mean(dice_scores) if dice_scores else 0
-            avg_iou = np.mean(iou_scores) if iou_scores else 0
-            self.epoch_complete_signal.emit(epoch + 1, avg_loss, avg_test_loss, avg_dice, avg_iou)
+                    loaded = time.perf_counter()
+                    data_time += loaded - step_start
+                    imgs = imgs.to(device, non_blocking=non_blocking)
+                    masks = masks.to(device, non_blocking=non_blocking)
+                    with autocast(device, self.precision):
+                        preds = model(imgs).float()
+                    # Потери и метрики копятся на устройстве без синхронизации на каждом батче
+                    test_loss += criterion(preds, masks) * imgs.size(0)
+                    metrics.update((preds > self.threshold).float(), masks)
+                    step_start = time.perf_counter()
+                    compute_time += step_start - loaded
+
+            if distributed:
+                metrics.synchronize()
+                losses = torch.tensor([avg_loss, test_loss.item()], dtype=torch.float64)
+                dist.all_reduce(losses)
+                avg_loss = losses[0].item() / self.world_size
+                test_loss = losses[1]
+            results = metrics.compute()
+            avg_test_loss = test_loss.item() / results["count"] if results["count"] > 0 else 0
+            avg_dice = results["macro"]["dice"]
+            avg_iou = results["macro"]["iou"]
+            last_metrics = {"epoch": epoch + 1, "macro": results["macro"], "micro": results["micro"]}
+            self.emit(self.epoch_complete_signal, epoch + 1, avg_loss, avg_test_loss, avg_dice, avg_iou)
+            self.emit(self.epoch_timing_signal, epoch + 1, data_time, compute_time)
+            if prof.enabled:
+                self.emit(self.stage_timing_signal, epoch + 1, prof.take())
+            self.emit(
+                self.training_complete_signal,
+                f"Пропускная способность: {train_count * self.world_size / train_time:.2f} изобр./с, "
+                f"пиковая память: {peak_memory_mb(device):.0f} МБ"
+            )
+            if results["count"] > 0:
+                self.emit(self.training_complete_signal, format_metrics(results))
+
+            if writer is not None:
+                if results["count"] > 0 and avg_dice > best_dice:
+                    best_dice = avg_dice
+                    writer.save(saved_state(), best_path, model_saver(last_metrics))
+                    self.emit(self.training_complete_signal, f"Лучшая модель (Dice {avg_dice:.4f}) сохраняется в: {best_path}")
+                if (epoch + 1) % self.checkpoint_every == 0 or epoch + 1 == self.epochs:
+                    writer.save({
+                        "model": base_model.state_dict(),
+                        "architecture": base_model.config,
+                        "optimizer": optimizer.state_dict(),
+                        "scaler": scaler.state_dict(),
+                        "epoch": epoch + 1,
+                        "best_dice": best_dice,
+                        "rng": rng_state(),
+                        **split,
+                    }, snapshot_path)
+
+        prof.stop_torch_profiler()
+        if self.profile_dir and self.rank == 0:
+            trace_path = os.path.join(self.profile_dir, "spans.json")
+            prof.export_chrome_trace(trace_path)
+            self.emit(self.training_complete_signal, f"Трассировка этапов сохранена в: {trace_path}")
+
+        if writer is not None:
+            writer.close()
+            model_saver(last_metrics)(saved_state(), self.save_path)
+            self.emit(self.training_complete_signal, f"Модель сохранена в: {self.save_path}")
+
+def run_worker(config, local_rank):
+    Trainer(local_rank=local_rank, **config).run()
+
+def connect_console(trainer):
+    trainer.training_complete_signal.connect(print)
+    trainer.epoch_start_signal.connect(lambda epoch, total: print(f"Начало эпохи {epoch}/{total}"))
+    trainer.epoch_complete_signal.connect(
+        lambda epoch, loss, test_loss, dice, iou: print(
+            f"Эпоха {epoch} завершена. Средняя потеря (обучение): {loss:.4f}, (тест): {test_loss:.4f}, "
+            f"Dice: {dice:.4f}, IoU: {iou:.4f}"
+        )
+    )
+    trainer.epoch_timing_signal.connect(lambda epoch, data, compute: print(format_timing(data, compute)))
+    trainer.stage_timing_signal.connect(lambda epoch, stages: print(f"Этапы: {format_stages(stages)}"))
 
-        torch.save(model.state_dict(), self.save_path)
-        self.training_complete_signal.emit(f"Модель сохранена в: {self.save_path}")
+def format_timing(data_time, compute_time):
+    total = data_time + compute_time
+    share = 100 * data_time / total if total > 0 else 0
+    return f"Ожидание данных: {data_time:.1f} с ({share:.0f}%), вычисления: {compute_time:.1f} с"
 
 def main():
     parser = argparse.ArgumentParser(description="Обучение нейросети UNet")
     parser.add_argument('--data', required=True, help="Путь к папке с изображениями")
-    parser.add_argument('--output', required=True, help="Путь для сохранения модели (model.pth)")
+    parser.add_argument('--output', required=True, help="Путь для сохранения модели (model.pth или model.safetensors)")
     parser.add_argument('--batch-size', type=int, default=4, help="Размер батча (по умолчанию: 4)")
     parser.add_argument('--epochs', type=int, default=25, help="Количество эпох (по умолчанию: 25)")
+    parser.add_argument('--cache', default=None, help="Папка кэша предобработанных изображений")
+    parser.add_argument('--workers', type=int, default=None,
+                        help=f"Количество процессов загрузки данных (по умолчанию: {default_num_workers()})")
+    parser.add_argument('--prefetch-factor', type=int, default=2, help="Батчей в предзагрузке на процесс (по умолчанию: 2)")
+    parser.add_argument('--no-persistent-workers', action='store_true', help="Перезапускать процессы загрузки каждую эпоху")
+    parser.add_argument('--pin-memory', choices=['auto', 'on', 'off'], default='auto',
+                        help="Закрепленная память для копирования на GPU (по умолчанию: auto)")
+    parser.add_argument('--precision', choices=PRECISIONS, default="fp32",
+                        help="Точность вычислений: fp32, bf16 или fp16 с масштабированием градиентов")
+    parser.add_argument('--nproc', type=int, default=1, help="Количество процессов обучения на узле (по умолчанию: 1)")
+    parser.add_argument('--nnodes', type=int, default=1, help="Количество узлов (по умолчанию: 1)")
+    parser.add_argument('--node-rank', type=int, default=0, help="Номер текущего узла (по умолчанию: 0)")
+    parser.add_argument('--master-addr', default="127.0.0.1", help="Адрес узла 0 для rendezvous")
+    parser.add_argument('--master-port', type=int, default=29500, help="Порт узла 0 для rendezvous")
+    parser.add_argument('--checkpoint-dir', default=None,
+                        help="Папка снимков состояния обучения (по умолчанию: <output>_checkpoints)")
+    parser.add_argument('--checkpoint-every', type=int, default=1, help="Сохранять снимок каждые N эпох (по умолчанию: 1)")
+    parser.add_argument('--accumulation-steps', type=int, default=1,
+                        help="Накопление градиентов: шаг оптимизатора раз в N батчей (по умолчанию: 1)")
+    parser.add_argument('--gradient-checkpointing', action='store_true',
+                        help="Пересчитывать активации блоков UNet при обратном проходе для экономии памяти")
+    parser.add_argument('--profile', action='store_true', help="Выводить время по этапам обучения за каждую эпоху")
+    parser.add_argument('--profile-dir', default=None,
+                        help="Папка для трассировок Chrome (spans.json, torch_trace.json); включает --profile")
+    parser.add_argument('--torch-profile-steps', type=int, default=0,
+                        help="Записать N шагов обучения через torch.profiler (нужна --profile-dir)")
+    parser.add_argument('--resume', action='store_true', help="Продолжить обучение с последнего снимка")
+    parser.add_argument('--width', type=float, default=1.0,
+                        help="Множитель ширины UNet: число каналов 64*width, 128*width, ... (по умолчанию: 1.0)")
+    parser.add_argument('--depth', type=int, default=2, help="Количество уровней понижения разрешения (по умолчанию: 2)")
+    parser.add_argument('--separable', action='store_true', help="Поканально-разделимые свертки вместо обычных 3x3")
+    parser.add_argument('--batch-norm', action='store_true',
+                        help="BatchNorm после сверток (при выводе сворачивается в веса свертки)")
     args = parser.parse_args()
+    if args.torch_profile_steps > 0 and not args.profile_dir:
+        parser.error("Для --torch-profile-steps укажите --profile-dir")
+    try:
+        check_input_size(args.depth, INPUT_SIZE)
+    except ValueError as e:
+        parser.error(str(e))
 
-    trainer = Trainer(args.data, args.output, batch_size=args.batch_size, epochs=args.epochs)
+    trainer = Trainer(
+        args.data, args.output, batch_size=args.batch_size, epochs=args.epochs, cache_dir=args.cache,
+        num_workers=args.workers, prefetch_factor=args.prefetch_factor,
+        persistent_workers=False if args.no_persistent_workers else None,
+        pin_memory={'auto': None, 'on': True, 'off': False}[args.pin_memory],
+        precision=args.precision, nproc=args.nproc, nnodes=args.nnodes, node_rank=args.node_rank,
+        master_addr=args.master_addr, master_port=args.master_port,
+        checkpoint_dir=args.checkpoint_dir, checkpoint_every=args.checkpoint_every, resume=args.resume,
+        accumulation_steps=args.accumulation_steps, gradient_checkpointing=args.gradient_checkpointing,
+        profile=args.profile, profile_dir=args.profile_dir, torch_profile_steps=args.torch_profile_steps,
+        width=args.width, depth=args.depth, separable=args.separable, batch_norm=args.batch_norm,
+    )
+    connect_console(trainer)
     trainer.run()
 
 if __name__ == "__main__":
@@ -0,0 +1,97 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import cv2
+import torch
+from unittest.mock import patch
+from model import UNet
+from model_cache import model_cache
+from widgets.analyze_ui import AnalysisWorker
+
+class TestAnalysisWorker(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.img_path = os.path.join(self.tmp_dir.name, "scene.jpg")
+        cv2.imwrite(self.img_path, np.random.randint(0, 255, (400, 1280, 3), dtype=np.uint8))
+        self.worker = AnalysisWorker(scaled_width=640)
+        self.events = []
+        self.worker.scaled_result_signal.connect(lambda request_id, img: self.events.append(("scaled", request_id)))
+        self.worker.result_signal.connect(lambda request_id, img: self.events.append(("result", request_id)))
+        self.worker.error_signal.connect(lambda request_id, message: self.events.append(("error", request_id, message)))
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def model(self, batch):
+        return torch.sigmoid(torch.randn(batch.shape[0], 1, 320, 624))
+
+    def run_queue(self):
+        # Очередь обрабатывается в текущем потоке, без запуска QThread и без окна
+        self.worker.requests.put(None)
+        self.worker.run()
+
+    @patch("detect.load_model")
+    def test_scaled_result_before_result(self, mock_load_model):
+        mock_load_model.return_value = self.model
+        self.worker.submit(1, self.img_path, "dummy_model.pth")
+        self.run_queue()
+        self.assertEqual(self.events, [("scaled", 1), ("result", 1)],
+                         "Уменьшенный результат должен приходить раньше результата в исходном разрешении")
+
+    @patch("detect.load_model")
+    def test_stale_and_cancelled_requests_are_dropped(self, mock_load_model):
+        mock_load_model.return_value = self.model
+        self.worker.submit(1, self.img_path, "dummy_model.pth")
+        self.worker.submit(2, self.img_path, "dummy_model.pth")
+        self.assertTrue(self.worker.is_cancelled(1), "Устаревший запрос должен считаться отмененным")
+        self.assertFalse(self.worker.is_cancelled(2))
+        self.run_queue()
+        self.assertEqual(self.events, [("scaled", 2), ("result", 2)], "Обрабатываться должен только последний запрос")
+
+        self.events.clear()
+
+        def cancelling_model(batch):
+            # Отмена во время вывода: результат не должен отправляться
+            self.worker.cancel(3)
+            return self.model(batch)
+
+        mock_load_model.return_value = cancelling_model
+        self.worker.submit(3, self.img_path, "dummy_model.pth")
+        self.run_queue()
+        self.assertEqual(self.events, [], "Отмененный запрос не должен давать результат")
+
+    def test_overwritten_checkpoint_is_reloaded(self):
+        model_path = os.path.join(self.tmp_dir.name, "model.pth")
+        torch.save(UNet().state_dict(), model_path)
+        self.worker.submit(1, self.img_path, model_path)
+        self.run_queue()
+        first = self.worker.model
+
+        torch.save(UNet().state_dict(), model_path)
+        stat = os.stat(model_path)
+        os.utime(model_path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        self.worker.submit(2, self.img_path, model_path)
+        self.run_queue()
+        self.assertIsNot(self.worker.model, first, "После перезаписи чекпоинта должны использоваться новые веса")
+        self.assertEqual([event[0] for event in self.events], ["scaled", "result", "scaled", "result"])
+        model_cache.clear()
+
+    @patch("detect.load_model")
+    def test_errors_name_their_cause(self, mock_load_model):
+        mock_load_model.side_effect = RuntimeError("файл поврежден")
+        self.worker.submit(1, self.img_path, "broken.pth")
+        self.run_queue()
+        self.assertEqual(self.events, [("error", 1, "Не удалось загрузить модель: файл поврежден")])
+
+        self.events.clear()
+        mock_load_model.side_effect = None
+        mock_load_model.return_value = self.model
+        self.worker.submit(2, os.path.join(self.tmp_dir.name, "missing.jpg"), "dummy_model.pth")
+        self.run_queue()
+        self.assertEqual(len(self.events), 1)
+        self.assertTrue(self.events[0][2].startswith("Не удалось загрузить изображение"),
+                        "Ошибка чтения снимка должна отличаться от ошибки загрузки модели")
+
+if __name__ == "__main__":
+    unittest.main()
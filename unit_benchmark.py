@@ -0,0 +1,27 @@
+import unittest
+import tempfile
+from benchmark import measure, compare, run_benchmarks
+
+class TestBenchmark(unittest.TestCase):
+    def test_measure_reports_statistics(self):
+        stats = measure(lambda: sum(range(1000)), repeats=5, warmup=1, items=4)
+        for key in ("p50_ms", "p95_ms", "throughput", "peak_rss_mb"):
+            self.assertIn(key, stats, f"В результатах замера нет поля {key}")
+        self.assertLessEqual(stats["p50_ms"], stats["p95_ms"], "p50 не может превышать p95")
+        self.assertGreater(stats["peak_rss_mb"], 0, "Пиковый RSS должен быть положительным")
+
+    def test_compare_flags_regressions(self):
+        baseline = {"decode/640x480": {"p50_ms": 10.0}, "forward/bs1": {"p50_ms": 100.0}}
+        results = {"decode/640x480": {"p50_ms": 11.0}, "forward/bs1": {"p50_ms": 150.0}, "new": {"p50_ms": 1.0}}
+        regressions = compare(results, baseline, tolerance=0.2)
+        self.assertEqual([r[0] for r in regressions], ["forward/bs1"], "Регрессией должен считаться только рост > 20%")
+        self.assertAlmostEqual(results["decode/640x480"]["change"], 0.1, msg="Изменение должно сохраняться в результатах")
+
+    def test_decode_stage(self):
+        with tempfile.TemporaryDirectory() as work_dir:
+            results = run_benchmarks(work_dir, stages=("decode",), resolutions=((320, 240),), repeats=2, warmup=0,
+                                     log=lambda text: None)
+        self.assertEqual(list(results), ["decode/320x240"], "Должен быть замерен только этап декодирования")
+
+if __name__ == "__main__":
+    unittest.main()
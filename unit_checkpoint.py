@@ -0,0 +1,50 @@
+import unittest
+import os
+import random
+import tempfile
+import numpy as np
+import torch
+from checkpoint import AsyncCheckpointWriter, load_snapshot, rng_state, restore_rng_state
+from model import UNet
+
+class TestCheckpoint(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "last.pt")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_snapshot_is_taken_at_save_time(self):
+        model = UNet()
+        optimizer = torch.optim.Adam(model.parameters(), lr=1e-3)
+        model(torch.rand(1, 1, 32, 64)).mean().backward()
+        optimizer.step()
+        expected = {k: v.clone() for k, v in model.state_dict().items()}
+
+        writer = AsyncCheckpointWriter()
+        writer.save({"model": model.state_dict(), "optimizer": optimizer.state_dict(), "epoch": 3}, self.path)
+        # Изменение весов после вызова save не должно попасть в снимок
+        with torch.no_grad():
+            for p in model.parameters():
+                p.add_(1.0)
+        writer.close()
+
+        snapshot = load_snapshot(self.path)
+        self.assertEqual(snapshot["epoch"], 3)
+        for k, v in expected.items():
+            self.assertTrue(torch.equal(snapshot["model"][k], v), f"Параметр {k} изменился после сохранения")
+        restored = torch.optim.Adam(UNet().parameters(), lr=1e-3)
+        restored.load_state_dict(snapshot["optimizer"])
+        self.assertFalse(os.path.exists(self.path + ".tmp"), "Временный файл должен быть переименован")
+
+    def test_rng_state_roundtrip(self):
+        state = rng_state()
+        expected = (torch.rand(3), np.random.rand(3), random.random())
+        restore_rng_state(state)
+        self.assertTrue(torch.equal(torch.rand(3), expected[0]), "Состояние генератора torch не восстановлено")
+        self.assertTrue(np.array_equal(np.random.rand(3), expected[1]), "Состояние генератора numpy не восстановлено")
+        self.assertEqual(random.random(), expected[2], "Состояние генератора random не восстановлено")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,54 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import cv2
+import torch
+from dataset_cache import DatasetCache
+from train import dataset
+
+class TestDatasetCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.image_dir = os.path.join(self.tmp_dir.name, "images")
+        self.cache_dir = os.path.join(self.tmp_dir.name, "cache")
+        os.makedirs(self.image_dir)
+        for i in range(3):
+            self.write_image(f"{i}.jpg")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def write_image(self, name, mtime_shift=0):
+        path = os.path.join(self.image_dir, name)
+        cv2.imwrite(path, np.random.randint(0, 255, (120, 200, 3), dtype=np.uint8))
+        if mtime_shift:
+            stat = os.stat(path)
+            os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + mtime_shift))
+
+    def test_cached_items_match_decoded(self):
+        cache = DatasetCache(self.cache_dir, self.image_dir, threshold=0.3)
+        self.assertEqual(cache.update(), 3)
+        cached = dataset(self.image_dir, threshold=0.3, cache=cache)
+        plain = dataset(self.image_dir, threshold=0.3, images=cached.images)
+        for i in range(len(plain)):
+            for a, b in zip(cached[i], plain[i]):
+                self.assertTrue(torch.equal(a, b), "Данные из кэша должны совпадать с декодированными")
+
+    def test_only_stale_entries_rebuilt(self):
+        DatasetCache(self.cache_dir, self.image_dir, threshold=0.3).update()
+        cache = DatasetCache(self.cache_dir, self.image_dir, threshold=0.3)
+        self.assertEqual(cache.update(), 0, "Неизмененная папка не должна пересобираться")
+        self.write_image("1.jpg", mtime_shift=10 ** 9)
+        self.write_image("3.jpg")
+        os.remove(os.path.join(self.image_dir, "0.jpg"))
+        self.assertEqual(cache.update(), 2, "Пересобираются только новые и измененные изображения")
+        self.assertNotIn("0.jpg", cache)
+        self.assertIn("3.jpg", cache)
+
+    def test_threshold_change_rebuilds(self):
+        DatasetCache(self.cache_dir, self.image_dir, threshold=0.3).update()
+        self.assertEqual(DatasetCache(self.cache_dir, self.image_dir, threshold=0.5).update(), 3)
+
+if __name__ == "__main__":
+    unittest.main()
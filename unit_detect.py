@@ -2,9 +2,11 @@ import unittest
 import numpy as np
 import cv2
 import os
+import glob
+import tempfile
 import torch
 from unittest.mock import patch
-from detect import analyze_return
+from detect import analyze_return, analyze_batch, analyze_polygons
 
 class TestDetect(unittest.TestCase):
     def setUp(self):
@@ -29,5 +31,66 @@ class TestDetect(unittest.TestCase):
         self.assertIsInstance(result, np.ndarray, "Должен возвращаться numpy-массив")
         self.assertEqual(result.shape[2], 3, "Изображение должно быть 3-канальным (BGR)")
 
+    @patch("detect.load_model")
+    def test_analyze_batch_pipeline(self, mock_load_model):
+        batch_sizes = []
+
+        def model(batch):
+            batch_sizes.append(batch.shape[0])
+            return torch.sigmoid(torch.randn(batch.shape[0], 1, 320, 624))
+
+        mock_load_model.return_value = model
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for i in range(5):
+                path = os.path.join(tmp_dir, f"{i}.jpg")
+                cv2.imwrite(path, self.test_img)
+                paths.append(path)
+            bad_path = os.path.join(tmp_dir, "bad.jpg")
+            with open(bad_path, "wb") as f:
+                f.write(b"not an image")
+            out_dir = os.path.join(tmp_dir, "out")
+
+            stats = analyze_batch(paths + [bad_path], "dummy_model.pth", out_dir, batch_size=2, workers=2)
+            self.assertEqual(stats["processed"], 5, "Все корректные изображения должны быть обработаны")
+            self.assertEqual([path for path, _ in stats["failed"]], [bad_path],
+                             "Поврежденное изображение должно попасть в список ошибок, не останавливая обработку")
+            self.assertEqual(sorted(batch_sizes), [1, 2, 2], "Изображения должны группироваться в батчи")
+            self.assertEqual(len(glob.glob(os.path.join(out_dir, "*.jpg"))), 5)
+            self.assertEqual(glob.glob(os.path.join(out_dir, "*.part*")), [], "Временные файлы не должны оставаться")
+
+            batch_sizes.clear()
+            stats = analyze_batch(paths, "dummy_model.pth", out_dir, batch_size=2, workers=2)
+            self.assertEqual((stats["processed"], stats["skipped"]), (0, 5), "Готовые результаты должны пропускаться")
+            self.assertEqual(batch_sizes, [], "Модель не должна вызываться для готовых изображений")
+
+    @patch("detect.load_model")
+    def test_large_tiled_scene_is_streamed(self, mock_load_model):
+        mock_load_model.return_value = lambda batch: batch
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "scene.png")
+            cv2.imwrite(path, np.random.randint(0, 255, (400, 700, 3), dtype=np.uint8))
+            out_dir = os.path.join(tmp_dir, "out")
+
+            stats = analyze_batch([path], "dummy_model.pth", out_dir, tiled=True, max_pixels=100_000)
+            self.assertEqual(stats["processed"], 1)
+            self.assertEqual(sorted(os.listdir(out_dir)), ["scene_mask.npy", "scene_overlay.npy"],
+                             "Сцена больше лимита должна обрабатываться по полосам")
+            self.assertEqual(np.load(os.path.join(out_dir, "scene_mask.npy")).shape, (400, 700))
+
+            stats = analyze_batch([path], "dummy_model.pth", out_dir, tiled=True, max_pixels=100_000)
+            self.assertEqual((stats["processed"], stats["skipped"]), (0, 1), "Готовый результат должен пропускаться")
+
+            stats = analyze_batch([path], "dummy_model.pth", out_dir, tiled=True, max_pixels=100_000,
+                                  output_format="geojson")
+            self.assertEqual(len(stats["failed"]), 1)
+            self.assertIn("--raster", stats["failed"][0][1])
+
+            # Одиночный анализ в режиме окон отклоняет сцену до декодирования
+            with patch("detect.raster_shape", return_value=(20000, 20000)), patch("detect.read_image") as mock_read:
+                with self.assertRaises(ValueError):
+                    analyze_polygons(path, "dummy_model.pth", tiled=True)
+                mock_read.assert_not_called()
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
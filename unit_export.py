@@ -0,0 +1,48 @@
+import unittest
+import os
+import tempfile
+import torch
+from model import UNet
+from detect import load_model, ort
+from model_cache import model_cache
+from export import export_torchscript, export_onnx, example_input, load_export_model
+
+class TestExport(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.model = UNet().eval()
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def assert_matches_eager(self, model):
+        batch = example_input(2)
+        with torch.no_grad():
+            expected = self.model(batch)
+            output = model(batch).cpu()
+        self.assertEqual(output.shape, (2, 1, 320, 624), "Некорректный размер вывода")
+        self.assertTrue(torch.allclose(output, expected, atol=1e-4), "Выход должен совпадать с eager-моделью")
+
+    def test_torchscript_backend(self):
+        path = os.path.join(self.tmp_dir.name, "model.pt")
+        export_torchscript(self.model, path)
+        self.assert_matches_eager(load_model(path))
+
+    @unittest.skipIf(ort is None, "onnxruntime не установлен")
+    def test_onnx_backend_dynamic_batch(self):
+        path = os.path.join(self.tmp_dir.name, "model.onnx")
+        export_onnx(self.model, path)
+        self.assert_matches_eager(load_model(path))
+
+    def test_export_model_is_private_copy(self):
+        path = os.path.join(self.tmp_dir.name, "model.pth")
+        torch.save(self.model.state_dict(), path)
+        shared = load_model(path)
+        exported = load_export_model(path)
+        self.assertIsNot(exported, shared, "Экспорт не должен использовать модель из общего кэша")
+        self.assertIs(load_model(path), shared, "Модель в кэше должна остаться прежней")
+        self.assert_matches_eager(exported)
+        model_cache.clear()
+
+if __name__ == "__main__":
+    unittest.main()
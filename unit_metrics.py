@@ -1,6 +1,34 @@
 import unittest
+import os
+import tempfile
+import numpy as np
+import cv2
+import socket
 import torch
-from test import dice_coefficient, iou_score
+import torch.distributed as dist
+import torch.multiprocessing as mp
+from unittest.mock import patch
+from image_files import collect_images
+from test import dice_coefficient, iou_score, SegmentationMetrics, ThresholdSweep, evaluate_folder, write_report
+
+def synthetic_batch():
+    generator = torch.Generator().manual_seed(0)
+    preds = (torch.rand(5, 1, 16, 24, generator=generator) > 0.5).float()
+    targets = (torch.rand(5, 1, 16, 24, generator=generator) > 0.4).float()
+    return preds, targets
+
+def synchronize_worker(rank, world_size, port, result_path):
+    dist.init_process_group("gloo", init_method=f"tcp://127.0.0.1:{port}", rank=rank, world_size=world_size)
+    try:
+        # Тестовая выборка делится между процессами так же, как в Trainer: test_images[rank::world_size]
+        preds, targets = synthetic_batch()
+        metrics = SegmentationMetrics()
+        metrics.update(preds[rank::world_size], targets[rank::world_size])
+        metrics.synchronize()
+        if rank == 0:
+            torch.save(metrics.compute(), result_path)
+    finally:
+        dist.destroy_process_group()
 
 class TestMetrics(unittest.TestCase):
     def test_dice_coefficient(self):
@@ -15,5 +43,100 @@ class TestMetrics(unittest.TestCase):
         iou = iou_score(pred, target)
         self.assertTrue(0 <= iou <= 1, "IoU должен быть в [0, 1]")
 
+    def test_accumulator_matches_per_image_metrics(self):
+        preds = (torch.rand(5, 1, 8, 8) > 0.5).float()
+        targets = (torch.rand(5, 1, 8, 8) > 0.5).float()
+        metrics = SegmentationMetrics()
+        metrics.update(preds[:2], targets[:2])
+        metrics.update(preds[2:], targets[2:])
+        results = metrics.compute()
+        self.assertEqual(results["count"], 5)
+        for i in range(5):
+            self.assertAlmostEqual(results["per_image"]["dice"][i], dice_coefficient(preds[i], targets[i]).item(), places=5)
+            self.assertAlmostEqual(results["per_image"]["iou"][i], iou_score(preds[i], targets[i]).item(), places=5)
+        self.assertAlmostEqual(results["micro"]["dice"], dice_coefficient(preds, targets).item(), places=5)
+        self.assertAlmostEqual(results["macro"]["dice"], results["per_image"]["dice"].mean(), places=6)
+
+    def test_precision_recall(self):
+        pred = torch.tensor([[1, 1, 0, 0]], dtype=torch.float32)
+        target = torch.tensor([[1, 0, 1, 1]], dtype=torch.float32)
+        metrics = SegmentationMetrics()
+        metrics.update(pred, target)
+        results = metrics.compute()["micro"]
+        self.assertAlmostEqual(results["precision"], 0.5, places=5)
+        self.assertAlmostEqual(results["recall"], 1 / 3, places=5)
+
+    @patch("test.load_model")
+    def test_evaluate_folder(self, mock_load_model):
+        # Модель повторяет маску разметки, поэтому все метрики должны быть равны 1
+        mock_load_model.return_value = lambda imgs: (imgs < 0.3).float()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            paths = []
+            for i in range(5):
+                path = os.path.join(tmp_dir, f"{i}.jpg")
+                cv2.imwrite(path, np.random.randint(0, 255, (60, 80, 3), dtype=np.uint8))
+                paths.append(path)
+            rows = []
+            results = evaluate_folder(paths, "dummy_model.pth", batch_size=2, progress=lambda d, t, row: rows.append(row))
+            write_report(results, os.path.join(tmp_dir, "report.csv"), os.path.join(tmp_dir, "report.json"))
+            self.assertTrue(os.path.exists(os.path.join(tmp_dir, "report.csv")))
+        mock_load_model.assert_called_once()
+        self.assertEqual(results["count"], 5)
+        self.assertEqual(len(rows), 5, "Прогресс должен сообщаться по каждому изображению")
+        self.assertAlmostEqual(results["macro"]["dice"], 1.0, places=5)
+        self.assertAlmostEqual(results["micro"]["iou"], 1.0, places=5)
+
+    @patch("test.load_model")
+    def test_evaluate_folder_reads_npy(self, mock_load_model):
+        mock_load_model.return_value = lambda imgs: (imgs < 0.3).float()
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            gray = np.random.randint(0, 255, (60, 80), dtype=np.uint8)
+            cv2.imwrite(os.path.join(tmp_dir, "scene.png"), gray)
+            np.save(os.path.join(tmp_dir, "scene.npy"), gray)
+            paths = collect_images(tmp_dir)
+            results = evaluate_folder(paths, "dummy_model.pth")
+        self.assertEqual(results["failed"], [], "Массивы .npy должны оцениваться, а не попадать в ошибки")
+        self.assertEqual(results["count"], 2)
+        png_row, npy_row = sorted(results["rows"], key=lambda row: row["image"].endswith(".npy"))
+        self.assertEqual({k: v for k, v in png_row.items() if k != "image"},
+                         {k: v for k, v in npy_row.items() if k != "image"},
+                         "Снимок в .npy должен давать те же метрики, что и в PNG")
+
+    def test_threshold_sweep_matches_thresholding(self):
+        # Метрики из гистограмм должны совпадать с прямой бинаризацией при каждом пороге
+        probs = np.random.randint(0, 256, (3, 20, 30)) / 255.0
+        targets = (np.random.rand(3, 20, 30) > 0.6).astype(np.float32)
+        sweep = ThresholdSweep()
+        sweep.update(probs[:2], targets[:2])
+        sweep.update(probs[2:], targets[2:])
+        thresholds = [0.1, 0.3, 0.5, 0.77]
+        results = sweep.compute(thresholds)
+        for i, threshold in enumerate(thresholds):
+            metrics = SegmentationMetrics()
+            metrics.update(torch.from_numpy(probs > threshold), torch.from_numpy(targets))
+            expected = metrics.compute()
+            for name in ("dice", "iou", "precision", "recall"):
+                self.assertAlmostEqual(results["macro"][name][i], expected["macro"][name], places=6)
+                self.assertAlmostEqual(results["micro"][name][i], expected["micro"][name], places=6)
+        self.assertEqual(len(sweep.compute()["thresholds"]), 256, "По умолчанию сетка покрывает все уровни uint8")
+
+    def test_synchronize_matches_single_process(self):
+        with socket.socket() as sock:
+            sock.bind(("127.0.0.1", 0))
+            port = sock.getsockname()[1]
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            result_path = os.path.join(tmp_dir, "metrics.pt")
+            mp.spawn(synchronize_worker, args=(2, port, result_path), nprocs=2)
+            gathered = torch.load(result_path, weights_only=False)
+
+        metrics = SegmentationMetrics()
+        metrics.update(*synthetic_batch())
+        expected = metrics.compute()
+        self.assertEqual(gathered["count"], 5, "Должна собираться статистика со всех процессов (выборки разного размера)")
+        for name in ("dice", "iou", "precision", "recall"):
+            self.assertAlmostEqual(gathered["micro"][name], expected["micro"][name], places=6)
+            self.assertAlmostEqual(gathered["macro"][name], expected["macro"][name], places=6)
+            np.testing.assert_allclose(np.sort(gathered["per_image"][name]), np.sort(expected["per_image"][name]))
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
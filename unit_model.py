@@ -1,6 +1,15 @@
 import unittest
+import os
+import tempfile
+import numpy as np
+import cv2
 import torch
-from model import UNet
+from contextlib import redirect_stdout
+from io import StringIO
+from unittest.mock import patch
+from model import UNet, infer, prepare_model, build_model, fuse_batch_norm, model_state, VARIANTS
+from detect import load_backend_model
+from test import compare_precision, main as evaluation_main
 
 class TestUNet(unittest.TestCase):
     def test_model_initialization(self):
@@ -15,5 +24,97 @@ class TestUNet(unittest.TestCase):
         self.assertTrue(torch.all(output >= 0), "Выход должен быть ≥ 0")
         self.assertTrue(torch.all(output <= 1), "Выход должен быть ≤ 1")
 
+    def test_bf16_matches_fp32(self):
+        model = UNet(in_channels=1, out_channels=1).eval()
+        input_tensor = torch.rand(1, 1, 320, 624)
+        reference = infer(model, input_tensor)
+        output = infer(prepare_model(model, "bf16"), input_tensor, "bf16")
+        self.assertEqual(output.dtype, torch.float32, "Выход должен приводиться к float32")
+        self.assertTrue(torch.allclose(output, reference, atol=1e-2), "bf16 должен совпадать с fp32 в пределах допуска")
+
+    def test_gradient_checkpointing_matches(self):
+        model = UNet(in_channels=1, out_channels=1)
+        checkpointed = UNet(in_channels=1, out_channels=1, gradient_checkpointing=True)
+        checkpointed.load_state_dict(model.state_dict())
+        input_tensor = torch.rand(2, 1, 64, 96)
+        model(input_tensor).mean().backward()
+        checkpointed(input_tensor).mean().backward()
+        for (name, a), b in zip(model.named_parameters(), checkpointed.parameters()):
+            self.assertTrue(torch.allclose(a.grad, b.grad, atol=1e-6), f"Градиент {name} отличается при пересчете активаций")
+
+    def test_default_config_keeps_state_dict_keys(self):
+        keys = list(UNet().state_dict())
+        self.assertEqual(keys[:4], ["enc1.0.weight", "enc1.0.bias", "enc1.2.weight", "enc1.2.bias"])
+        self.assertIn("upconv2.weight", keys)
+        self.assertEqual(keys[-2:], ["final_conv.weight", "final_conv.bias"])
+        self.assertEqual(len(keys), 26, "Стандартная конфигурация должна совпадать с исходной сетью")
+
+    def test_batch_norm_fusion_matches(self):
+        input_tensor = torch.rand(2, 1, 64, 96)
+        for name, config in VARIANTS.items():
+            model = build_model(config)
+            self.assertEqual(model(input_tensor).shape, (2, 1, 64, 96), f"Некорректный размер вывода варианта {name}")
+            model.eval()
+            with torch.no_grad():
+                for module in model.modules():
+                    if isinstance(module, torch.nn.BatchNorm2d):
+                        module.running_mean.uniform_(-0.1, 0.1)
+                        module.running_var.uniform_(0.5, 1.5)
+                reference = model(input_tensor)
+                fused = fuse_batch_norm(model)
+                self.assertFalse(any(isinstance(m, torch.nn.BatchNorm2d) for m in fused.modules()))
+                self.assertTrue(torch.allclose(fused(input_tensor), reference, atol=1e-5),
+                                f"Свертка со свернутым BatchNorm должна давать тот же результат ({name})")
+
+    def test_checkpoint_restores_config(self):
+        model = build_model(VARIANTS["tiny-deep"]).eval()
+        input_tensor = torch.rand(1, 1, 64, 96)
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            weights = os.path.join(tmp_dir, "model.pth")
+            torch.save(model_state(model), weights)
+            loaded = load_backend_model(weights)
+        self.assertEqual(loaded.config, model.config, "Конфигурация сети должна восстанавливаться из чекпоинта")
+        with torch.no_grad():
+            self.assertTrue(torch.allclose(loaded(input_tensor), model(input_tensor), atol=1e-5))
+
+    def test_gradient_checkpointing_keeps_batch_norm_stats(self):
+        model = UNet(width=0.25, batch_norm=True)
+        checkpointed = UNet(width=0.25, batch_norm=True, gradient_checkpointing=True)
+        checkpointed.load_state_dict(model.state_dict())
+        input_tensor = torch.rand(2, 1, 64, 96)
+        model(input_tensor).mean().backward()
+        checkpointed(input_tensor).mean().backward()
+        for (name, a), b in zip(model.state_dict().items(), checkpointed.state_dict().values()):
+            self.assertTrue(torch.allclose(a, b, atol=1e-6), f"Буфер {name} отличается при пересчете активаций")
+        self.assertEqual(int(checkpointed.enc1[1].num_batches_tracked), 1, "Статистики должны обновляться один раз за шаг")
+
+    def test_compare_precision_metrics(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            weights = os.path.join(tmp_dir, "model.pth")
+            image_path = os.path.join(tmp_dir, "image.jpg")
+            torch.save(UNet().state_dict(), weights)
+            cv2.imwrite(image_path, np.random.randint(0, 255, (100, 150, 3), dtype=np.uint8))
+            scores = compare_precision([image_path], weights, "bf16")
+        self.assertGreaterEqual(scores["dice"], 0.99, "Dice относительно fp32 ниже допуска")
+        self.assertGreaterEqual(scores["iou"], 0.99, "IoU относительно fp32 ниже допуска")
+
+    def test_compare_precision_cli(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            weights = os.path.join(tmp_dir, "model.pth")
+            torch.save(UNet().state_dict(), weights)
+            data_dir = os.path.join(tmp_dir, "data")
+            os.makedirs(data_dir)
+            cv2.imwrite(os.path.join(data_dir, "image.png"), np.random.randint(0, 255, (100, 150, 3), dtype=np.uint8))
+            args = ["test.py", "--data", data_dir, "--model", weights, "--precision", "bf16", "--compare-precision"]
+            output = StringIO()
+            with patch("sys.argv", args), redirect_stdout(output):
+                evaluation_main()
+            self.assertIn("bf16 относительно fp32", output.getvalue())
+            # Недостижимый допуск должен завершать проверку с ненулевым кодом
+            with patch("sys.argv", args + ["--tolerance", "1.01"]), redirect_stdout(StringIO()):
+                with self.assertRaises(SystemExit) as error:
+                    evaluation_main()
+            self.assertEqual(error.exception.code, 1)
+
 if __name__ == "__main__":
     unittest.main()
\ No newline at end of file
@@ -0,0 +1,64 @@
+import unittest
+import os
+import tempfile
+import torch
+from model_cache import ModelCache
+
+class TestModelCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.loads = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def make_checkpoint(self, name, content=b"weights"):
+        path = os.path.join(self.tmp_dir.name, name)
+        with open(path, "wb") as f:
+            f.write(content)
+        return path
+
+    def loader(self, path):
+        self.loads.append(path)
+        return torch.nn.Linear(10, 10)
+
+    def test_repeat_get_uses_cache(self):
+        cache = ModelCache()
+        path = self.make_checkpoint("a.pth")
+        first = cache.get(path, self.loader)
+        second = cache.get(path, self.loader)
+        self.assertIs(first, second, "Повторный запрос должен вернуть ту же модель")
+        self.assertEqual(len(self.loads), 1, "Файл должен загружаться один раз")
+
+    def test_changed_checkpoint_is_reloaded(self):
+        cache = ModelCache()
+        path = self.make_checkpoint("a.pth")
+        first = cache.get(path, self.loader)
+        stat = os.stat(path)
+        self.make_checkpoint("a.pth", b"new weights")
+        os.utime(path, ns=(stat.st_atime_ns, stat.st_mtime_ns + 10 ** 9))
+        second = cache.get(path, self.loader)
+        self.assertIsNot(first, second, "Измененный чекпоинт должен загружаться заново")
+        self.assertEqual(len(cache), 1, "Устаревшая версия должна удаляться из кэша")
+
+    def test_lru_eviction(self):
+        cache = ModelCache(max_models=2)
+        paths = [self.make_checkpoint(f"{i}.pth") for i in range(3)]
+        cache.get(paths[0], self.loader)
+        cache.get(paths[1], self.loader)
+        cache.get(paths[0], self.loader)
+        cache.get(paths[2], self.loader)
+        self.assertEqual(len(cache), 2)
+        cache.get(paths[0], self.loader)
+        self.assertEqual(len(self.loads), 3, "Недавно использованная модель не должна вытесняться")
+
+    def test_memory_budget(self):
+        model_bytes = 110 * 4
+        cache = ModelCache(max_bytes=2 * model_bytes)
+        for i in range(4):
+            cache.get(self.make_checkpoint(f"{i}.pth"), self.loader)
+        self.assertEqual(len(cache), 2, "Кэш не должен превышать бюджет памяти")
+        self.assertLessEqual(cache.nbytes(), 2 * model_bytes)
+
+if __name__ == "__main__":
+    unittest.main()
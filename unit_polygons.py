@@ -0,0 +1,60 @@
+import unittest
+import os
+import json
+import tempfile
+import numpy as np
+from polygons import extract_polygons, georeference, read_world_file, save_polygons, load_npz, to_geojson
+
+class TestPolygons(unittest.TestCase):
+    def setUp(self):
+        # Вероятности в разрешении модели: два прямоугольных пятна разной уверенности
+        self.prob = np.zeros((32, 64), dtype=np.float32)
+        self.prob[4:12, 8:24] = 0.9
+        self.prob[20:24, 40:44] = 0.5
+        self.size = (256, 64)
+
+    def test_polygons_rescaled_to_source(self):
+        polygons = extract_polygons(self.prob, 0.3, self.size)
+        self.assertEqual(len(polygons), 2, "Должно быть найдено два полигона")
+        big, small = polygons
+        self.assertAlmostEqual(big["area"], 8 * 16 * 4 * 2, msg="Площадь должна быть в пикселях исходного изображения")
+        self.assertAlmostEqual(big["confidence"], 0.9, places=5, msg="Некорректная средняя уверенность")
+        self.assertAlmostEqual(small["confidence"], 0.5, places=5, msg="Некорректная средняя уверенность")
+        self.assertEqual(big["bbox"], [32.0, 8.0, 96.0, 24.0], "Рамка должна масштабироваться до исходного размера")
+        xs, ys = big["polygon"][:, 0], big["polygon"][:, 1]
+        self.assertTrue(xs.min() >= 32 - 1 and xs.max() <= 96, "Вершины должны лежать внутри рамки")
+        self.assertTrue(ys.min() >= 8 - 1 and ys.max() <= 24, "Вершины должны лежать внутри рамки")
+
+    def test_min_area_filter(self):
+        polygons = extract_polygons(self.prob, 0.3, self.size, min_area=200)
+        self.assertEqual(len(polygons), 1, "Мелкие полигоны должны отбрасываться")
+
+    def test_georeference_with_world_file(self):
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            image_path = os.path.join(tmp_dir, "scene.jpg")
+            with open(os.path.join(tmp_dir, "scene.jgw"), "w") as f:
+                f.write("10\n0\n0\n-10\n500005\n6000005\n")
+            transform = read_world_file(image_path)
+        polygons = georeference(extract_polygons(self.prob, 0.3, self.size), transform)
+        self.assertAlmostEqual(polygons[0]["area"], 8 * 16 * 4 * 2 * 100, msg="Площадь должна учитывать размер пикселя")
+        self.assertEqual(polygons[0]["bbox"], [500320.0, 5999770.0, 500960.0, 5999930.0], "Некорректная рамка в координатах")
+
+    def test_geojson_and_npz_output(self):
+        polygons = extract_polygons(self.prob, 0.3, self.size)
+        collection = to_geojson(polygons)
+        ring = collection["features"][0]["geometry"]["coordinates"][0]
+        self.assertEqual(ring[0], ring[-1], "Кольцо GeoJSON должно быть замкнутым")
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            geojson_path = os.path.join(tmp_dir, "result.geojson")
+            npz_path = os.path.join(tmp_dir, "result.npz")
+            save_polygons(polygons, geojson_path, "geojson", {"image": "scene.jpg"})
+            save_polygons(polygons, npz_path, "npz")
+            with open(geojson_path, encoding="utf-8") as f:
+                self.assertEqual(len(json.load(f)["features"]), 2, "В GeoJSON должны быть все полигоны")
+            loaded = load_npz(npz_path)
+        for a, b in zip(polygons, loaded):
+            self.assertTrue(np.allclose(a["polygon"], b["polygon"]), "Вершины npz должны совпадать")
+            self.assertEqual(a["bbox"], b["bbox"], "Рамки npz должны совпадать")
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,84 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import cv2
+import torch
+from unittest.mock import patch
+from prob_cache import ProbabilityCache, quantize, dequantize
+from detect import analyze_polygons, analyze_batch
+from test import evaluate_folder
+
+class TestProbabilityCache(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.cache = ProbabilityCache(os.path.join(self.tmp_dir.name, "cache"))
+        self.img_path = os.path.join(self.tmp_dir.name, "scene.png")
+        cv2.imwrite(self.img_path, np.random.randint(0, 255, (100, 160, 3), dtype=np.uint8))
+        self.model_path = os.path.join(self.tmp_dir.name, "model.pth")
+        with open(self.model_path, "wb") as f:
+            f.write(b"weights")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    @patch("detect.load_model")
+    def test_threshold_change_reuses_probabilities(self, mock_load_model):
+        mock_load_model.return_value = lambda batch: torch.sigmoid(torch.randn(batch.shape[0], 1, 320, 624))
+        first = analyze_polygons(self.img_path, self.model_path, threshold=0.3, cache=self.cache)
+        second = analyze_polygons(self.img_path, self.model_path, threshold=0.7, cache=self.cache)
+        mock_load_model.assert_called_once()
+        self.assertEqual((self.cache.hits, self.cache.misses), (1, 1), "Повторный запуск должен брать карту из кэша")
+        self.assertNotEqual(len(first["polygons"]), len(second["polygons"]), "Порог должен применяться к карте из кэша")
+
+        mock_load_model.reset_mock()
+        stats = analyze_batch([self.img_path], self.model_path, os.path.join(self.tmp_dir.name, "out"), cache=self.cache)
+        self.assertEqual(stats["processed"], 1)
+        mock_load_model.assert_not_called()
+
+    def test_checkpoint_change_invalidates(self):
+        with patch("detect.load_model") as mock_load_model:
+            mock_load_model.return_value = lambda batch: torch.full((batch.shape[0], 1, 320, 624), 0.9)
+            analyze_polygons(self.img_path, self.model_path, cache=self.cache)
+            with open(self.model_path, "ab") as f:
+                f.write(b"retrained")
+            os.utime(self.model_path, (0, 0))
+            analyze_polygons(self.img_path, self.model_path, cache=self.cache)
+        self.assertEqual(self.cache.misses, 2, "После изменения чекпоинта карта должна вычисляться заново")
+
+    def test_miss_and_hit_give_identical_masks(self):
+        # 0.3105 выше порога 0.31, но после квантования в uint8 (79/255) оказывается ниже него
+        model = lambda batch: torch.full((batch.shape[0], 1, 320, 624), 0.3105)
+        with patch("detect.load_model", return_value=model):
+            outputs = []
+            for name in ("miss", "hit"):
+                out_dir = os.path.join(self.tmp_dir.name, name)
+                analyze_batch([self.img_path], self.model_path, out_dir, threshold=0.31, cache=self.cache)
+                outputs.append(cv2.imread(os.path.join(out_dir, "scene.png")))
+        np.testing.assert_array_equal(outputs[0], outputs[1], "Промах и попадание кэша должны давать одну маску")
+        with patch("test.load_model", return_value=model):
+            rows = [evaluate_folder([self.img_path], self.model_path, threshold=0.31, cache=self.cache)["rows"]
+                    for _ in range(2)]
+        self.assertEqual(rows[0], rows[1], "Метрики при промахе и попадании кэша должны совпадать")
+        self.assertEqual(self.cache.hits, 2)
+
+    def test_lru_eviction(self):
+        prob = np.random.rand(64, 64).astype(np.float32)
+        self.cache.put("aa01", prob)
+        entry_size = self.cache.nbytes()
+        self.cache.max_bytes = int(entry_size * 2.5)
+        self.cache.put("bb02", prob)
+        os.utime(self.cache._path("aa01"), (0, 0))
+        os.utime(self.cache._path("bb02"), (1, 1))
+        self.assertIsNotNone(self.cache.get("aa01"))
+        self.cache.put("cc03", prob)
+        self.assertEqual(len(self.cache), 2, "Размер кэша должен оставаться в пределах лимита")
+        self.assertIsNone(self.cache.get("bb02"), "Вытесняться должна давно не использованная запись")
+        self.assertIsNotNone(self.cache.get("aa01"))
+
+    def test_quantization_error(self):
+        prob = np.random.rand(32, 32).astype(np.float32)
+        self.assertLessEqual(np.abs(dequantize(quantize(prob)) - prob).max(), 0.5 / 255 + 1e-6)
+
+if __name__ == "__main__":
+    unittest.main()
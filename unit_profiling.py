@@ -0,0 +1,38 @@
+import unittest
+import os
+import json
+import tempfile
+import time
+from profiling import Profiler, NULL_SPAN
+
+class TestProfiling(unittest.TestCase):
+    def test_disabled_profiler_records_nothing(self):
+        profiler = Profiler(enabled=False)
+        span = profiler.span("forward")
+        self.assertIs(span, NULL_SPAN, "Выключенный профилировщик должен возвращать пустой контекст")
+        with span:
+            pass
+        self.assertEqual(profiler.summary(), {}, "Выключенный профилировщик не должен копить время")
+
+    def test_spans_and_chrome_trace(self):
+        profiler = Profiler(enabled=True)
+        for _ in range(3):
+            with profiler.span("decode"):
+                time.sleep(0.001)
+        with profiler.span("forward"):
+            time.sleep(0.002)
+        self.assertEqual(profiler.counts["decode"], 3, "Должны учитываться все вызовы этапа")
+        totals = profiler.take()
+        self.assertGreater(totals["forward"], 0.0015, "Некорректное время этапа")
+        self.assertEqual(profiler.summary(), {}, "take() должен обнулять счетчики")
+
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "trace.json")
+            profiler.export_chrome_trace(path)
+            with open(path) as f:
+                events = json.load(f)["traceEvents"]
+        self.assertEqual([e["name"] for e in events], ["decode"] * 3 + ["forward"], "В трассировке должны быть все события")
+        self.assertTrue(all(e["ph"] == "X" and e["dur"] > 0 for e in events), "События должны иметь длительность")
+
+if __name__ == "__main__":
+    unittest.main()
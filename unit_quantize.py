@@ -0,0 +1,27 @@
+import unittest
+import copy
+import os
+import tempfile
+import torch
+from model import UNet
+from detect import load_model
+from export import example_input
+from quantize import quantize_model, save_quantized
+
+class TestQuantize(unittest.TestCase):
+    def test_quantized_checkpoint_loads_in_detect(self):
+        model = UNet().eval()
+        batch = example_input()
+        quantized = quantize_model(copy.deepcopy(model), [(batch, None)])
+        with tempfile.TemporaryDirectory() as tmp_dir:
+            path = os.path.join(tmp_dir, "model_int8.pt")
+            save_quantized(quantized, path)
+            loaded = load_model(path)
+            with torch.no_grad():
+                output = loaded(batch)
+                expected = model(batch)
+        self.assertEqual(output.shape, (1, 1, 320, 624), "Некорректный размер вывода")
+        self.assertTrue(torch.allclose(output, expected, atol=0.05), "int8 должен совпадать с fp32 в пределах допуска")
+
+if __name__ == "__main__":
+    unittest.main()
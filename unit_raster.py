@@ -0,0 +1,47 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import cv2
+from raster import open_raster, create_raster, render_overlay, tifffile
+
+class TestRaster(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.rgb = np.random.randint(0, 255, (300, 500, 3), dtype=np.uint8)
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def path(self, name):
+        return os.path.join(self.tmp_dir.name, name)
+
+    def test_npy_windows(self):
+        np.save(self.path("scene.npy"), self.rgb)
+        source = open_raster(self.path("scene.npy"))
+        self.assertEqual(source.shape, (300, 500))
+        gray = source[10:50, 20:90]
+        expected = cv2.cvtColor(np.ascontiguousarray(self.rgb[10:50, 20:90]), cv2.COLOR_RGB2GRAY)
+        np.testing.assert_array_equal(gray, expected)
+        np.testing.assert_array_equal(source.read(10, 50, 20, 90), self.rgb[10:50, 20:90])
+
+    @unittest.skipIf(tifffile is None, "tifffile не установлен")
+    def test_tiled_tiff_windows(self):
+        tifffile.imwrite(self.path("scene.tif"), self.rgb, tile=(64, 64), photometric="rgb")
+        source = open_raster(self.path("scene.tif"))
+        np.testing.assert_array_equal(source.read(30, 250, 40, 470), self.rgb[30:250, 40:470])
+
+    def test_render_overlay_by_bands(self):
+        np.save(self.path("scene.npy"), self.rgb)
+        source = open_raster(self.path("scene.npy"))
+        mask = create_raster(self.path("mask.npy"), source.shape, np.uint8)
+        mask[:] = 0
+        mask[100:200, 100:300] = 255
+        out = create_raster(self.path("overlay.npy"), source.shape + (3,), np.uint8)
+        render_overlay(source, mask, out, band_rows=64)
+        self.assertTrue(np.all(out[100, 150] == (255, 0, 0)), "Граница маски должна быть отмечена")
+        np.testing.assert_array_equal(out[150, 200], self.rgb[150, 200])
+        np.testing.assert_array_equal(out[:90], self.rgb[:90])
+
+if __name__ == "__main__":
+    unittest.main()
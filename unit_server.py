@@ -0,0 +1,97 @@
+import unittest
+import asyncio
+import json
+import numpy as np
+import cv2
+from unittest.mock import patch
+from server import InferenceServer
+from loadgen import request
+
+class TestServer(unittest.TestCase):
+    def setUp(self):
+        img = np.zeros((100, 150, 3), dtype=np.uint8)
+        img[20:60, 30:90] = 255
+        self.image = cv2.imencode(".jpg", img)[1].tobytes()
+
+    async def run_requests(self, server, count, output):
+        ports = []
+        task = asyncio.get_running_loop().create_task(server.serve("127.0.0.1", 0, ready=ports.append))
+        while not ports:
+            await asyncio.sleep(0.01)
+
+        async def one():
+            reader, writer = await asyncio.open_connection("127.0.0.1", ports[0])
+            try:
+                return await request(reader, writer, "POST", f"/predict?output={output}", self.image, "image/jpeg")
+            finally:
+                writer.close()
+
+        responses = await asyncio.gather(*[one() for _ in range(count)])
+        reader, writer = await asyncio.open_connection("127.0.0.1", ports[0])
+        _, metrics = await request(reader, writer, "GET", "/metrics")
+        writer.close()
+        task.cancel()
+        try:
+            await task
+        except asyncio.CancelledError:
+            pass
+        return responses, json.loads(metrics)
+
+    @patch("server.load_model")
+    def test_concurrent_requests_are_batched(self, mock_load_model):
+        # Модель-заглушка: светлые пиксели считаются разливом
+        mock_load_model.return_value = lambda batch: batch
+        server = InferenceServer("dummy_model.pth", max_batch_size=8, max_latency=0.2, threshold=0.5)
+        responses, metrics = asyncio.run(self.run_requests(server, 6, "polygons"))
+
+        for status, payload in responses:
+            self.assertEqual(status, 200, "Запрос должен выполняться успешно")
+            collection = json.loads(payload)
+            self.assertEqual(len(collection["features"]), 1, "Должен быть найден один полигон")
+            self.assertEqual(collection["properties"]["width"], 150, "Размер должен соответствовать исходному")
+        self.assertEqual(metrics["requests"], 6, "Метрики должны учитывать все запросы")
+        self.assertGreater(metrics["mean_batch_size"], 1, "Одновременные запросы должны объединяться в батч")
+
+    @patch("server.load_model")
+    def test_mask_output_and_errors(self, mock_load_model):
+        mock_load_model.return_value = lambda batch: batch
+        server = InferenceServer("dummy_model.pth", max_latency=0.0, threshold=0.5)
+        (status, payload), = asyncio.run(self.run_requests(server, 1, "mask"))[0]
+        mask = cv2.imdecode(np.frombuffer(payload, dtype=np.uint8), cv2.IMREAD_GRAYSCALE)
+        self.assertEqual(status, 200, "Запрос маски должен выполняться успешно")
+        self.assertEqual(mask.shape, (100, 150), "Маска должна быть в исходном разрешении")
+        self.assertEqual(mask[40, 60], 255, "Светлая область должна попасть в маску")
+
+        server = InferenceServer("dummy_model.pth", max_latency=0.0, threshold=0.5)
+        (status, _), = asyncio.run(self.run_requests(server, 1, "unknown"))[0]
+        self.assertEqual(status, 400, "Неизвестный формат должен отклоняться")
+
+    @patch("server.load_model")
+    def test_malformed_content_length(self, mock_load_model):
+        mock_load_model.return_value = lambda batch: batch
+        server = InferenceServer("dummy_model.pth", max_latency=0.0)
+
+        async def send_raw(lengths):
+            ports = []
+            task = asyncio.get_running_loop().create_task(server.serve("127.0.0.1", 0, ready=ports.append))
+            while not ports:
+                await asyncio.sleep(0.01)
+            statuses = []
+            for length in lengths:
+                reader, writer = await asyncio.open_connection("127.0.0.1", ports[0])
+                writer.write(f"POST /predict HTTP/1.1\r\nContent-Length: {length}\r\n\r\n".encode("latin-1"))
+                await writer.drain()
+                statuses.append(int((await reader.readline()).split()[1]))
+                writer.close()
+            task.cancel()
+            try:
+                await task
+            except asyncio.CancelledError:
+                pass
+            return statuses
+
+        statuses = asyncio.run(send_raw(["abc", "-5", "1e3", str(2 ** 40)]))
+        self.assertEqual(statuses, [400, 400, 400, 413], "Некорректная длина тела должна давать ответ 400")
+
+if __name__ == "__main__":
+    unittest.main()
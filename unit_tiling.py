@@ -0,0 +1,49 @@
+import unittest
+import numpy as np
+import torch
+from tiling import predict_tiled, tile_positions, blend_weights
+from model import build_model, INPUT_SIZE
+
+class IdentityModel(torch.nn.Module):
+    def forward(self, x):
+        return x
+
+class TestTiling(unittest.TestCase):
+    def test_tile_positions_cover_scene(self):
+        positions = tile_positions(1000, 320, 256)
+        self.assertEqual(positions[0], 0)
+        self.assertEqual(positions[-1] + 320, 1000, "Последнее окно должно доходить до края сцены")
+        self.assertTrue(all(b - a <= 256 for a, b in zip(positions, positions[1:])))
+
+    def test_blend_weights_positive(self):
+        for mode in ("cosine", "linear"):
+            weights = blend_weights((320, 624), (64, 128), mode)
+            self.assertEqual(weights.shape, (320, 624))
+            self.assertTrue(np.all(weights > 0), "Веса должны быть положительными")
+
+    def test_identity_reconstruction(self):
+        scene = np.random.randint(0, 255, (700, 1500), dtype=np.uint8)
+        prob = predict_tiled(IdentityModel(), scene, tile_size=(320, 624), overlap=(64, 128), batch_size=2)
+        self.assertEqual(prob.shape, scene.shape)
+        np.testing.assert_allclose(prob, scene.astype(np.float32) / 255.0, atol=1e-5)
+
+    def test_scene_smaller_than_tile(self):
+        scene = np.random.rand(100, 200).astype(np.float32)
+        prob = predict_tiled(IdentityModel(), scene)
+        np.testing.assert_allclose(prob, scene, atol=1e-5)
+
+    def test_tile_size_follows_model_depth(self):
+        model = build_model({"width": 0.125, "depth": 3}).eval()
+        scene = np.random.rand(200, 300).astype(np.float32)
+        prob = predict_tiled(model, scene, tile_size=(96, 160), overlap=(16, 32))
+        self.assertEqual(prob.shape, scene.shape, "Сеть глубины 3 должна обрабатывать окна, кратные 8")
+        with self.assertRaises(ValueError):
+            predict_tiled(model, scene, tile_size=(100, 148), overlap=(16, 32))
+
+    def test_depth_must_divide_input_size(self):
+        build_model({"depth": 4}, INPUT_SIZE)
+        with self.assertRaises(ValueError):
+            build_model({"depth": 5}, INPUT_SIZE)
+
+if __name__ == "__main__":
+    unittest.main()
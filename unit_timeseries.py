@@ -0,0 +1,74 @@
+import unittest
+import os
+import tempfile
+import numpy as np
+import cv2
+from unittest.mock import patch
+from timeseries import AreaStore, compare_masks
+
+class TestTimeSeries(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.store = AreaStore(os.path.join(self.tmp_dir.name, "store"))
+        self.calls = []
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def model(self, batch):
+        # Модель-заглушка: вероятность равна яркости, светлые пятна считаются разливами
+        self.calls.append(len(batch))
+        return batch
+
+    def write_scene(self, name, spills):
+        img = np.zeros((640, 1248, 3), dtype=np.uint8)
+        for x0, y0, x1, y1 in spills:
+            img[y0:y1, x0:x1] = 255
+        path = os.path.join(self.tmp_dir.name, name)
+        cv2.imwrite(path, img)
+        return path
+
+    @patch("timeseries.load_model")
+    def test_unchanged_tiles_are_reused(self, mock_load_model):
+        mock_load_model.return_value = self.model
+        day1 = self.write_scene("day1.png", [(50, 50, 150, 150), (700, 400, 800, 500)])
+        day2 = self.write_scene("day2.png", [(50, 50, 250, 200), (700, 400, 800, 500)])
+
+        first = self.store.add("north", "2026-06-01T10:00:00", day1, __file__, threshold=0.5)
+        self.assertEqual(first["tiles_inferred"], 4, "Первый снимок должен обрабатываться целиком")
+        self.assertEqual(first["polygons"], 2, "В первом снимке два пятна")
+
+        self.calls.clear()
+        second = self.store.add("north", "2026-06-02T10:00:00", day2, __file__, threshold=0.5)
+        self.assertEqual(second["tiles_inferred"], 1, "Повторно обрабатывается только изменившееся окно")
+        self.assertEqual(sum(self.calls), 1, "Модель должна вызываться только для изменившихся окон")
+        self.assertEqual(second["previous"], "2026-06-01T10:00:00", "Снимок сравнивается с предыдущим")
+        self.assertEqual(second["summary"]["growth"], 1, "Увеличившееся пятно должно отмечаться как рост")
+        self.assertEqual(second["summary"]["stable"], 1, "Неизменное пятно должно отмечаться как стабильное")
+
+        prob = self.store.load_probability("north", "2026-06-02T10:00:00")
+        self.assertEqual(prob.shape, (640, 1248), "Карта вероятностей хранится в исходном разрешении")
+        self.assertEqual(len(self.store.load_polygons("north", "2026-06-02T10:00:00")), 2, "Полигоны должны сохраняться")
+        self.assertEqual(self.store.areas(), ["north"], "Район должен появиться в хранилище")
+
+    @patch("timeseries.load_model")
+    def test_backend_change_recomputes_tiles(self, mock_load_model):
+        mock_load_model.return_value = self.model
+        day1 = self.write_scene("day1.png", [(50, 50, 150, 150)])
+        self.store.add("north", "2026-06-01T10:00:00", day1, __file__, threshold=0.5, backend="eager")
+        second = self.store.add("north", "2026-06-02T10:00:00", day1, __file__, threshold=0.5, backend="torchscript")
+        self.assertEqual(second["tiles_inferred"], 4, "Окна другого бэкенда не должны переиспользоваться")
+        self.assertEqual(mock_load_model.call_args.args[2], "torchscript")
+
+    def test_compare_masks_statuses(self):
+        previous = np.zeros((100, 100), dtype=bool)
+        current = np.zeros((100, 100), dtype=bool)
+        previous[10:30, 10:30] = True   # уменьшится
+        previous[60:70, 60:70] = True   # исчезнет
+        current[10:20, 10:20] = True
+        current[80:90, 10:20] = True    # новое
+        statuses = sorted(c["status"] for c in compare_masks(previous, current))
+        self.assertEqual(statuses, ["new", "shrinkage", "vanished"], "Некорректная классификация изменений")
+
+if __name__ == "__main__":
+    unittest.main()
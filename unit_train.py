@@ -0,0 +1,34 @@
+import unittest
+import torch
+from unittest.mock import patch
+from torch.utils.data import DataLoader, TensorDataset
+from train import loader_options, default_num_workers
+
+class TestLoaderOptions(unittest.TestCase):
+    @patch("train.os.cpu_count")
+    def test_default_num_workers(self, mock_cpu_count):
+        # Одно ядро остается процессу обучения, не больше 4 процессов загрузки на процесс обучения
+        for cpus, nproc, expected in ((1, 1, 0), (2, 1, 1), (8, 1, 4), (8, 2, 3), (4, 4, 0)):
+            mock_cpu_count.return_value = cpus
+            self.assertEqual(default_num_workers(nproc), expected, f"{cpus} ядер, {nproc} процессов обучения")
+        mock_cpu_count.return_value = None
+        self.assertEqual(default_num_workers(), 0, "Без сведений о ядрах загрузка идет в основном процессе")
+
+    def test_worker_options(self):
+        options = loader_options(torch.device("cpu"), num_workers=2, prefetch_factor=3)
+        self.assertEqual(options, {"num_workers": 2, "pin_memory": False, "prefetch_factor": 3,
+                                   "persistent_workers": True})
+        options = loader_options(torch.device("cuda"), num_workers=2, persistent_workers=False)
+        self.assertTrue(options["pin_memory"], "Для GPU память закрепляется по умолчанию")
+        self.assertFalse(options["persistent_workers"])
+
+    def test_no_worker_options_without_workers(self):
+        # DataLoader отклоняет prefetch_factor и persistent_workers при num_workers=0
+        options = loader_options(torch.device("cpu"), num_workers=0, prefetch_factor=4, persistent_workers=True)
+        self.assertNotIn("prefetch_factor", options)
+        self.assertNotIn("persistent_workers", options)
+        loader = DataLoader(TensorDataset(torch.arange(4)), batch_size=2, **options)
+        self.assertEqual(len(list(loader)), 2)
+
+if __name__ == "__main__":
+    unittest.main()
@@ -0,0 +1,58 @@
+import unittest
+import os
+import json
+import struct
+import tempfile
+import torch
+from model import UNet
+from weights import save_weights, load_weights, read_metadata, convert_checkpoint, model_metadata
+from detect import load_backend_model
+
+class TestWeights(unittest.TestCase):
+    def setUp(self):
+        self.tmp_dir = tempfile.TemporaryDirectory()
+        self.path = os.path.join(self.tmp_dir.name, "model.safetensors")
+
+    def tearDown(self):
+        self.tmp_dir.cleanup()
+
+    def test_round_trip_with_metadata(self):
+        state = {
+            "w": torch.randn(3, 5),
+            "half": torch.randn(7).to(torch.bfloat16),
+            "steps": torch.tensor(11),
+        }
+        metadata = model_metadata(0.45, {"train_images": ["a.jpg"], "test_images": ["b.jpg"]}, {"dice": 0.8})
+        save_weights(state, self.path, metadata)
+        loaded, loaded_metadata = load_weights(self.path)
+        for name, tensor in state.items():
+            self.assertTrue(torch.equal(loaded[name], tensor), f"Тензор {name} должен совпадать после загрузки")
+            self.assertEqual(loaded[name].dtype, tensor.dtype)
+        self.assertEqual(loaded_metadata["threshold"], 0.45)
+        self.assertEqual(loaded_metadata["input_size"], [624, 320])
+        self.assertEqual(loaded_metadata["split"]["test_images"], ["b.jpg"])
+        self.assertEqual(read_metadata(self.path), loaded_metadata)
+
+        with open(self.path, "rb") as f:
+            length = struct.unpack("<Q", f.read(8))[0]
+            header = json.loads(f.read(length))
+        self.assertEqual((8 + length) % 64, 0, "Данные должны начинаться с выровненного смещения")
+        self.assertIsInstance(header["__metadata__"]["threshold"], str, "Метаданные хранятся строками, как в safetensors")
+
+    def test_converted_model_matches_pth(self):
+        model = UNet().eval()
+        pth_path = os.path.join(self.tmp_dir.name, "model.pth")
+        torch.save(model.state_dict(), pth_path)
+        path = convert_checkpoint(pth_path)
+        self.assertEqual(path, self.path)
+
+        flat_model = load_backend_model(path)
+        x = torch.rand(1, 1, 32, 64)
+        with torch.no_grad():
+            self.assertTrue(torch.allclose(flat_model(x), model(x)), "Выход модели из плоского формата должен совпадать")
+        # Веса не копируются при загрузке: параметры ссылаются на отображенный файл
+        loaded, _ = load_weights(path)
+        self.assertFalse(loaded["enc1.0.weight"].numpy().flags.owndata)
+
+if __name__ == "__main__":
+    unittest.main()
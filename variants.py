@@ -0,0 +1,108 @@
+import argparse
+import json
+import os
+import tempfile
+import numpy as np
+import torch
+from model import VARIANTS, INPUT_SIZE, build_model, infer
+from benchmark import measure, write_images
+from detect import load_model, DEVICE
+from train import Trainer
+from weights import read_metadata, WEIGHTS_EXTENSION
+
+
+def parameter_count(config):
+    return sum(p.numel() for p in build_model(config).parameters())
+
+
+def pareto_front(results):
+    # Вариант на кривой, если нет другого, который одновременно не медленнее и не хуже по Dice
+    front = []
+    for name, stats in results.items():
+        dominated = any(
+            other["latency_ms"] <= stats["latency_ms"] and other["dice"] >= stats["dice"]
+            and (other["latency_ms"] < stats["latency_ms"] or other["dice"] > stats["dice"])
+            for other_name, other in results.items() if other_name != name
+        )
+        if not dominated:
+            front.append(name)
+    return sorted(front, key=lambda name: results[name]["latency_ms"])
+
+
+def run_variants(data_dir, work_dir, names=tuple(VARIANTS), epochs=5, batch_size=4, repeats=10, warmup=2, log=print):
+    results = {}
+    width, height = INPUT_SIZE
+    batch = torch.rand(1, 1, height, width, device=DEVICE)
+    for name in names:
+        config = VARIANTS[name]
+        path = os.path.join(work_dir, name + WEIGHTS_EXTENSION)
+        # Уже обученные варианты из рабочей папки переиспользуются
+        if not os.path.exists(path):
+            log(f"Обучение варианта {name}: {config or 'стандартная сеть'}")
+            torch.manual_seed(0)
+            Trainer(data_dir, path, batch_size=batch_size, epochs=epochs, **config).run()
+        metrics = read_metadata(path)["metrics"]
+        # Задержка замеряется на модели после загрузки, т.е. со свернутым BatchNorm
+        model = load_model(path)
+        stats = measure(lambda: infer(model, batch), repeats, warmup)
+        results[name] = {
+            "config": config,
+            "parameters": parameter_count(config),
+            "latency_ms": stats["p50_ms"],
+            "latency_p95_ms": stats["p95_ms"],
+            "dice": metrics.get("macro", {}).get("dice", 0.0),
+            "iou": metrics.get("macro", {}).get("iou", 0.0),
+            "epochs": metrics.get("epoch", 0),
+        }
+        log(f"{name}: {results[name]['latency_ms']:.1f} мс, Dice {results[name]['dice']:.4f}, "
+            f"параметров {results[name]['parameters'] / 1e6:.2f} млн")
+    return results
+
+
+def format_table(results, front):
+    lines = [f"{'вариант':<16}{'мс (p50)':>10}{'Dice':>9}{'IoU':>9}{'парам., млн':>13}"]
+    for name, stats in sorted(results.items(), key=lambda item: item[1]["latency_ms"]):
+        mark = " *" if name in front else ""
+        lines.append(f"{name:<16}{stats['latency_ms']:>10.1f}{stats['dice']:>9.4f}{stats['iou']:>9.4f}"
+                     f"{stats['parameters'] / 1e6:>13.2f}{mark}")
+    lines.append("* - вариант на кривой задержка/Dice (не уступает другим одновременно по скорости и качеству)")
+    return "\n".join(lines)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Сравнение вариантов UNet по задержке вывода и Dice")
+    parser.add_argument('--data', default=None,
+                        help="Папка с обучающими изображениями (по умолчанию: синтетические изображения)")
+    parser.add_argument('--work-dir', default=None,
+                        help="Папка для обученных вариантов; существующие модели не обучаются заново")
+    parser.add_argument('--variants', nargs='+', choices=list(VARIANTS), default=list(VARIANTS),
+                        help="Сравниваемые варианты")
+    parser.add_argument('--epochs', type=int, default=5, help="Количество эпох обучения каждого варианта (по умолчанию: 5)")
+    parser.add_argument('--batch-size', type=int, default=4, help="Размер батча обучения (по умолчанию: 4)")
+    parser.add_argument('--synthetic-images', type=int, default=20,
+                        help="Количество синтетических изображений без --data (по умолчанию: 20)")
+    parser.add_argument('--repeats', type=int, default=10, help="Количество замеров задержки (по умолчанию: 10)")
+    parser.add_argument('--warmup', type=int, default=2, help="Количество прогревочных запусков (по умолчанию: 2)")
+    parser.add_argument('--json', default=None, help="Путь для сохранения результатов в JSON")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory() as tmp_dir:
+        work_dir = args.work_dir or tmp_dir
+        os.makedirs(work_dir, exist_ok=True)
+        data_dir = args.data
+        if data_dir is None:
+            data_dir = os.path.join(work_dir, "data")
+            if not os.path.isdir(data_dir):
+                write_images(data_dir, INPUT_SIZE, args.synthetic_images, np.random.default_rng(0))
+        results = run_variants(data_dir, work_dir, args.variants, args.epochs, args.batch_size,
+                               args.repeats, args.warmup)
+
+    front = pareto_front(results)
+    print(format_table(results, front))
+    if args.json:
+        with open(args.json, "w", encoding="utf-8") as f:
+            json.dump({"results": results, "pareto_front": front}, f, ensure_ascii=False, indent=2)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,129 @@
+import argparse
+import json
+import mmap
+import os
+import struct
+import numpy as np
+import torch
+from model import DEFAULT_CONFIG, INPUT_SIZE, read_model_state
+
+# Плоский формат в раскладке safetensors: 8 байт длины заголовка (little-endian), JSON-заголовок
+# с описанием тензоров и метаданными, затем сырые данные тензоров подряд
+WEIGHTS_EXTENSION = ".safetensors"
+HEADER_ALIGNMENT = 64
+DTYPES = {
+    torch.float32: ("F32", np.float32),
+    torch.float16: ("F16", np.float16),
+    torch.bfloat16: ("BF16", np.int16),
+    torch.float64: ("F64", np.float64),
+    torch.int64: ("I64", np.int64),
+    torch.int32: ("I32", np.int32),
+    torch.uint8: ("U8", np.uint8),
+    torch.bool: ("BOOL", np.bool_),
+}
+DTYPE_NAMES = {name: (dtype, np_dtype) for dtype, (name, np_dtype) in DTYPES.items()}
+
+
+def is_weights_file(path):
+    return os.path.splitext(path)[1].lower() == WEIGHTS_EXTENSION
+
+
+def model_metadata(threshold=0.3, split=None, metrics=None, architecture=None, input_size=INPUT_SIZE):
+    return {
+        "architecture": dict(architecture or DEFAULT_CONFIG, name="UNet"),
+        "input_size": list(input_size),
+        "threshold": threshold,
+        "split": split or {},
+        "metrics": metrics or {},
+    }
+
+
+def save_weights(state_dict, path, metadata=None):
+    tensors = {name: tensor.detach().cpu().contiguous() for name, tensor in state_dict.items()}
+    # Тензоры с большим размером элемента идут первыми, чтобы каждый начинался с выровненного смещения
+    names = sorted(tensors, key=lambda name: -tensors[name].element_size())
+    header = {}
+    offset = 0
+    for name in names:
+        tensor = tensors[name]
+        if tensor.dtype not in DTYPES:
+            raise ValueError(f"Неподдерживаемый тип тензора {name}: {tensor.dtype}")
+        size = tensor.numel() * tensor.element_size()
+        header[name] = {"dtype": DTYPES[tensor.dtype][0], "shape": list(tensor.shape), "data_offsets": [offset, offset + size]}
+        offset += size
+    if metadata:
+        # В safetensors значения метаданных - строки, поэтому вложенные структуры хранятся как JSON
+        header["__metadata__"] = {key: json.dumps(value, ensure_ascii=False) for key, value in metadata.items()}
+
+    header_bytes = json.dumps(header, ensure_ascii=False, separators=(",", ":")).encode("utf-8")
+    # Заголовок дополняется пробелами, чтобы данные начинались с границы 64 байт
+    header_bytes += b" " * (-(8 + len(header_bytes)) % HEADER_ALIGNMENT)
+    tmp_path = path + ".tmp"
+    with open(tmp_path, "wb") as f:
+        f.write(struct.pack("<Q", len(header_bytes)))
+        f.write(header_bytes)
+        for name in names:
+            tensor = tensors[name]
+            if tensor.dtype == torch.bfloat16:
+                tensor = tensor.view(torch.int16)
+            f.write(tensor.numpy().tobytes())
+    os.replace(tmp_path, path)
+
+
+def read_header(path):
+    with open(path, "rb") as f:
+        length = struct.unpack("<Q", f.read(8))[0]
+        header = json.loads(f.read(length))
+    metadata = {key: json.loads(value) for key, value in header.pop("__metadata__", {}).items()}
+    return header, metadata, 8 + length
+
+
+def read_metadata(path):
+    return read_header(path)[1]
+
+
+def load_weights(path):
+    # Тензоры смотрят прямо в отображенный файл: данные не копируются, а страницы разделяются
+    # всеми процессами через страничный кэш (копия создается только при записи в тензор)
+    header, metadata, data_start = read_header(path)
+    with open(path, "rb") as f:
+        mapped = mmap.mmap(f.fileno(), 0, access=mmap.ACCESS_COPY)
+    state_dict = {}
+    for name, info in header.items():
+        dtype, np_dtype = DTYPE_NAMES[info["dtype"]]
+        begin, end = info["data_offsets"]
+        count = (end - begin) // np.dtype(np_dtype).itemsize
+        array = np.frombuffer(mapped, dtype=np_dtype, count=count, offset=data_start + begin)
+        tensor = torch.from_numpy(array).reshape(info["shape"])
+        state_dict[name] = tensor.view(dtype) if dtype == torch.bfloat16 else tensor
+    return state_dict, metadata
+
+
+def convert_checkpoint(pth_path, output_path=None, threshold=0.3, snapshot_path=None):
+    # Перевод старого .pth (state_dict) в плоский формат; разбиение и метрики берутся из снимка обучения
+    state_dict, config = read_model_state(torch.load(pth_path, map_location="cpu"))
+    split = None
+    metrics = None
+    if snapshot_path:
+        snapshot = torch.load(snapshot_path, map_location="cpu", weights_only=False)
+        split = {"train_images": snapshot.get("train_images", []), "test_images": snapshot.get("test_images", [])}
+        metrics = {"epoch": snapshot.get("epoch"), "best_dice": snapshot.get("best_dice")}
+    output_path = output_path or os.path.splitext(pth_path)[0] + WEIGHTS_EXTENSION
+    save_weights(state_dict, output_path, model_metadata(threshold, split, metrics, config))
+    return output_path
+
+
+def main():
+    parser = argparse.ArgumentParser(description="Преобразование модели .pth в плоский формат с отображением в память")
+    parser.add_argument('model', help="Путь к модели .pth")
+    parser.add_argument('--output', default=None, help="Путь к результату (по умолчанию: рядом с исходной моделью)")
+    parser.add_argument('--threshold', type=float, default=0.3, help="Порог бинаризации для метаданных (по умолчанию: 0.3)")
+    parser.add_argument('--snapshot', default=None, help="Снимок обучения (last.pt), из которого берется разбиение выборки")
+    args = parser.parse_args()
+
+    output_path = convert_checkpoint(args.model, args.output, args.threshold, args.snapshot)
+    print(f"Модель сохранена в: {output_path}")
+
+
+if __name__ == "__main__":
+    main()
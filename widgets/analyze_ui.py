@@ -1,11 +1,101 @@
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout,
-    QHBoxLayout, QFileDialog, QMessageBox, QTextEdit
+    QHBoxLayout, QFileDialog, QMessageBox, QTextEdit, QApplication
 )
 from PyQt5.QtGui import QPixmap, QImage
-from PyQt5.QtCore import Qt
-import detect
-from PIL import Image
+from PyQt5.QtCore import Qt, QThread, pyqtSignal
+import queue
+
+class AnalysisWorker(QThread):
+    # Постоянный поток анализа: модель остается загруженной, запросы ставятся в очередь,
+    # новый запрос отменяет выполняющийся на границе ближайшего этапа
+    scaled_result_signal = pyqtSignal(int, object)
+    result_signal = pyqtSignal(int, object)
+    error_signal = pyqtSignal(int, str)
+    model_ready_signal = pyqtSignal(str)
+
+    def __init__(self, threshold=0.3, scaled_width=640):
+        super().__init__()
+        self.threshold = threshold
+        self.scaled_width = scaled_width
+        self.requests = queue.Queue()
+        self.model = None
+        self._latest_id = 0
+        self._cancelled_id = 0
+
+    def load(self, model_path):
+        self.requests.put(("load", 0, model_path, None))
+
+    def submit(self, request_id, image_path, model_path):
+        self._latest_id = request_id
+        self.requests.put(("analyze", request_id, model_path, image_path))
+
+    def cancel(self, request_id):
+        self._cancelled_id = max(self._cancelled_id, request_id)
+
+    def stop(self):
+        self._cancelled_id = self._latest_id
+        self.requests.put(None)
+        self.wait()
+
+    def is_cancelled(self, request_id):
+        return request_id < self._latest_id or request_id <= self._cancelled_id
+
+    def ensure_model(self, model_path):
+        # detect (а вместе с ним torch и cv2) импортируется в потоке анализа, а не при запуске приложения
+        import detect
+        # Кэш моделей учитывает время изменения и размер файла: перезаписанный чекпоинт загружается заново
+        self.model = detect.load_model(model_path)
+
+    def run(self):
+        while True:
+            request = self.requests.get()
+            if request is None:
+                break
+            kind, request_id, model_path, image_path = request
+            if kind == "load":
+                try:
+                    self.ensure_model(model_path)
+                except Exception as e:
+                    self.error_signal.emit(request_id, f"Не удалось загрузить модель: {e}")
+                    continue
+                self.model_ready_signal.emit(model_path)
+            elif not self.is_cancelled(request_id):
+                try:
+                    self.analyze(request_id, model_path, image_path)
+                except Exception as e:
+                    self.error_signal.emit(request_id, f"Ошибка анализа: {e}")
+
+    def analyze(self, request_id, model_path, image_path):
+        import cv2
+        import detect
+        # Сообщение об ошибке должно указывать, что именно не удалось загрузить
+        try:
+            self.ensure_model(model_path)
+        except Exception as e:
+            self.error_signal.emit(request_id, f"Не удалось загрузить модель: {e}")
+            return
+        try:
+            original_img, img_gray = detect.read_image(image_path)
+        except Exception as e:
+            self.error_signal.emit(request_id, f"Не удалось загрузить изображение: {e}")
+            return
+        if self.is_cancelled(request_id):
+            return
+        pred = detect.predict_resized(self.model, img_gray)
+        if self.is_cancelled(request_id):
+            return
+
+        # Вывод модели один на оба изображения; уменьшенная копия результата отправляется первой,
+        # потому что контуры на ней строятся быстрее, чем на снимке в исходном разрешении
+        height, width = original_img.shape[:2]
+        scale = min(1.0, self.scaled_width / width)
+        if scale < 1.0:
+            small_img = cv2.resize(original_img, (int(width * scale), int(height * scale)), interpolation=cv2.INTER_AREA)
+            self.scaled_result_signal.emit(request_id, detect.draw_contours(small_img, pred, self.threshold))
+            if self.is_cancelled(request_id):
+                return
+        self.result_signal.emit(request_id, detect.draw_contours(original_img, pred, self.threshold))
 
 class ImageAnalysisWidget(QWidget):
     def __init__(self):
@@ -13,6 +103,17 @@ class ImageAnalysisWidget(QWidget):
         self.image_path = None
         self.model_path = None
         self.result_img = None
+        self.scaled_img = None
+        self.request_id = 0
+
+        self.worker = AnalysisWorker()
+        self.worker.scaled_result_signal.connect(self.on_scaled_result)
+        self.worker.result_signal.connect(self.on_result)
+        self.worker.error_signal.connect(self.on_error)
+        self.worker.start()
+        app = QApplication.instance()
+        if app is not None:
+            app.aboutToQuit.connect(self.worker.stop)
 
         layout = QVBoxLayout()
 
@@ -50,6 +151,11 @@ class ImageAnalysisWidget(QWidget):
         self.analyze_button.clicked.connect(self.analyze_image)
         button_layout.addWidget(self.analyze_button)
 
+        self.cancel_button = QPushButton("Отменить")
+        self.cancel_button.clicked.connect(self.cancel_analysis)
+        self.cancel_button.setEnabled(False)
+        button_layout.addWidget(self.cancel_button)
+
         self.save_button = QPushButton("Сохранить результат")
         self.save_button.clicked.connect(self.save_result)
         button_layout.addWidget(self.save_button)
@@ -70,25 +176,53 @@ class ImageAnalysisWidget(QWidget):
 
     def select_model(self):
         model_path, _ = QFileDialog.getOpenFileName(
-            self, "Выбрать модель нейросети", "", "Модели (*.pth)"
+            self, "Выбрать модель нейросети", "", "Модели (*.pth *.safetensors *.pt *.onnx)"
         )
         if model_path:
             self.model_path = model_path
             self.model_path_field.setText(model_path)
+            # Модель загружается заранее в фоновом потоке и остается в нем между анализами
+            self.worker.load(model_path)
 
     def analyze_image(self):
         if not self.image_path or not self.model_path:
             QMessageBox.warning(self, "Внимание", "Выберите изображение и модель.")
             return
-        try:
-            self.result_img = detect.analyze_return(self.image_path, self.model_path)
-            height, width, channel = self.result_img.shape
-            bytes_per_line = 3 * width
-            qimg = QImage(self.result_img.data, width, height, bytes_per_line, QImage.Format_BGR888)
-            pixmap = QPixmap.fromImage(qimg).scaled(500, 300, Qt.KeepAspectRatio)
-            self.image_label.setPixmap(pixmap)
-        except Exception as e:
-            QMessageBox.critical(self, "Ошибка", "Не удалось загрузить изображение")
+        self.request_id += 1
+        self.result_img = None
+        self.cancel_button.setEnabled(True)
+        self.worker.submit(self.request_id, self.image_path, self.model_path)
+
+    def cancel_analysis(self):
+        self.worker.cancel(self.request_id)
+        self.cancel_button.setEnabled(False)
+
+    def show_image(self, img):
+        height, width, channel = img.shape
+        bytes_per_line = 3 * width
+        qimg = QImage(img.data, width, height, bytes_per_line, QImage.Format_BGR888)
+        pixmap = QPixmap.fromImage(qimg).scaled(500, 300, Qt.KeepAspectRatio)
+        self.image_label.setPixmap(pixmap)
+
+    def on_scaled_result(self, request_id, img):
+        if request_id == self.request_id and self.result_img is None:
+            self.scaled_img = img
+            self.show_image(img)
+
+    def on_result(self, request_id, img):
+        if request_id != self.request_id:
+            return
+        self.result_img = img
+        self.scaled_img = None
+        self.cancel_button.setEnabled(False)
+        self.show_image(img)
+
+    def on_error(self, request_id, message):
+        if request_id == 0:
+            QMessageBox.critical(self, "Ошибка", message)
+        elif request_id == self.request_id:
+            self.cancel_button.setEnabled(False)
+            QMessageBox.critical(self, "Ошибка", message)
 
     def save_result(self):
         if self.result_img is None:
@@ -100,6 +234,7 @@ class ImageAnalysisWidget(QWidget):
         )
         if save_path:
             try:
+                from PIL import Image
                 rgb_img = self.result_img[:, :, ::-1]
                 pil_img = Image.fromarray(rgb_img)
                 pil_img.save(save_path)
@@ -1,14 +1,32 @@
 import sys
 from PyQt5.QtWidgets import (
     QWidget, QLabel, QPushButton, QVBoxLayout, QHBoxLayout,
-    QFileDialog, QTextEdit, QMessageBox, QApplication
+    QFileDialog, QTextEdit, QMessageBox, QApplication, QProgressBar,
+    QTableWidget, QTableWidgetItem, QHeaderView, QSlider
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
 from PyQt5.QtGui import QPixmap, QImage
+import os
 import numpy as np
-from test import run_evaluation
+from test import run_evaluation, evaluate_folder, format_metrics, sweep_metrics, threshold_mask, METRIC_NAMES
+from detect import collect_images
 from PIL import UnidentifiedImageError
 
+DEFAULT_THRESHOLD = 0.3
+
+def numpy_to_qimage(np_array, is_grayscale=True):
+    if is_grayscale:
+        height, width = np_array.shape
+        qimage = QImage(np_array.data, width, height, width, QImage.Format_Grayscale8)
+    else:
+        if np_array.ndim == 2:
+            np_array = np.stack([np_array] * 3, axis=-1)
+        elif np_array.shape[2] == 4:
+            np_array = np_array[:, :, :3]
+        height, width, _ = np_array.shape
+        qimage = QImage(np_array.data, width, height, 3 * width, QImage.Format_RGB888)
+    return qimage.scaled(200, 200, Qt.KeepAspectRatio)
+
 class TestingThread(QThread):
     output_signal = pyqtSignal(str)
     results_signal = pyqtSignal(dict)
@@ -37,16 +55,51 @@ class TestingThread(QThread):
         except Exception as e:
             self.error_signal.emit(f"Произошла ошибка: {str(e)}")
 
+class BatchTestingThread(QThread):
+    output_signal = pyqtSignal(str)
+    results_signal = pyqtSignal(dict)
+    progress_signal = pyqtSignal(int, int)
+    row_signal = pyqtSignal(dict)
+    error_signal = pyqtSignal(str)
+
+    def __init__(self, folder_path, model_path):
+        super().__init__()
+        self.folder_path = folder_path
+        self.model_path = model_path
+
+    def on_progress(self, done, total, row):
+        self.row_signal.emit(row)
+        self.progress_signal.emit(done, total)
+
+    def run(self):
+        try:
+            image_paths = collect_images(self.folder_path)
+            if not image_paths:
+                self.error_signal.emit("Папка не содержит изображений")
+                return
+            results = evaluate_folder(image_paths, self.model_path, progress=self.on_progress, sweep=True)
+            output = f"Оценено изображений: {results['count']}\n{format_metrics(results)}"
+            if results["failed"]:
+                output += f"\nНе удалось обработать изображений: {len(results['failed'])}"
+            self.output_signal.emit(output)
+            self.results_signal.emit(results)
+        except Exception as e:
+            self.error_signal.emit(f"Произошла ошибка: {str(e)}")
+
 class TestingWidget(QWidget):
     def __init__(self):
         super().__init__()
         self.image_path = None
+        self.folder_path = None
         self.model_path = None
+        # Карта вероятностей и метрики по сетке порогов последнего запуска для подбора порога без модели
+        self.probability = None
+        self.sweep = None
 
         layout = QVBoxLayout()
 
         # --- Image path ---
-        self.path_label = QLabel("Изображение для проверки модели:")
+        self.path_label = QLabel("Изображение или папка для проверки модели:")
         layout.addWidget(self.path_label)
 
         self.image_path_field = QTextEdit()
@@ -55,9 +108,15 @@ class TestingWidget(QWidget):
         self.image_path_field.setTextInteractionFlags(Qt.NoTextInteraction)
         layout.addWidget(self.image_path_field)
 
+        select_layout = QHBoxLayout()
         self.select_image_button = QPushButton("Выбрать изображение")
         self.select_image_button.clicked.connect(self.select_image)
-        layout.addWidget(self.select_image_button)
+        select_layout.addWidget(self.select_image_button)
+
+        self.select_folder_button = QPushButton("Выбрать папку")
+        self.select_folder_button.clicked.connect(self.select_folder)
+        select_layout.addWidget(self.select_folder_button)
+        layout.addLayout(select_layout)
 
         # --- Model path ---
         self.model_label = QLabel("Путь к параметрам нейросети:")
@@ -75,10 +134,37 @@ class TestingWidget(QWidget):
 
         self.output_text = QTextEdit()
         self.output_text.setReadOnly(True)
-        self.output_text.setMaximumHeight(50)
+        self.output_text.setMaximumHeight(70)
         layout.addWidget(QLabel("Результаты тестирования:"))
         layout.addWidget(self.output_text)
 
+        self.progress_bar = QProgressBar()
+        self.progress_bar.setMinimum(0)
+        self.progress_bar.setMaximum(100)
+        self.progress_bar.setValue(0)
+        layout.addWidget(self.progress_bar)
+
+        self.results_table = QTableWidget(0, len(METRIC_NAMES) + 1)
+        self.results_table.setHorizontalHeaderLabels(["Изображение", "Dice", "IoU", "Точность", "Полнота"])
+        self.results_table.horizontalHeader().setSectionResizeMode(0, QHeaderView.Stretch)
+        self.results_table.setEditTriggers(QTableWidget.NoEditTriggers)
+        self.results_table.setMinimumHeight(120)
+        layout.addWidget(self.results_table)
+
+        threshold_layout = QHBoxLayout()
+        self.threshold_label = QLabel(f"Порог: {DEFAULT_THRESHOLD:.2f}")
+        threshold_layout.addWidget(self.threshold_label)
+        self.threshold_slider = QSlider(Qt.Horizontal)
+        self.threshold_slider.setRange(1, 99)
+        self.threshold_slider.setValue(int(DEFAULT_THRESHOLD * 100))
+        self.threshold_slider.setEnabled(False)
+        self.threshold_slider.valueChanged.connect(self.on_threshold_changed)
+        threshold_layout.addWidget(self.threshold_slider)
+        layout.addLayout(threshold_layout)
+
+        self.threshold_metrics_label = QLabel()
+        layout.addWidget(self.threshold_metrics_label)
+
         images_layout = QHBoxLayout()
 
         input_layout = QVBoxLayout()
@@ -125,18 +211,26 @@ class TestingWidget(QWidget):
         )
         if path:
             self.image_path = path
+            self.folder_path = None
             self.image_path_field.setText(path)
 
+    def select_folder(self):
+        folder = QFileDialog.getExistingDirectory(self, "Выберите папку с изображениями")
+        if folder:
+            self.folder_path = folder
+            self.image_path = None
+            self.image_path_field.setText(folder)
+
     def select_model(self):
         model_path, _ = QFileDialog.getOpenFileName(
-            self, "Выбрать модель нейросети", "", "Модели (*.pth)"
+            self, "Выбрать модель нейросети", "", "Модели (*.pth *.safetensors *.pt *.onnx)"
         )
         if model_path:
             self.model_path = model_path
             self.model_path_field.setText(model_path)
 
     def run_testing(self):
-        if not self.image_path or not self.model_path:
+        if not (self.image_path or self.folder_path) or not self.model_path:
             QMessageBox.warning(self, "Внимание", "Выберите изображение и модель.")
             return
 
@@ -144,6 +238,23 @@ class TestingWidget(QWidget):
         self.input_image_label.clear()
         self.gt_mask_label.clear()
         self.pred_mask_label.clear()
+        self.results_table.setRowCount(0)
+        self.progress_bar.setValue(0)
+        self.probability = None
+        self.sweep = None
+        self.threshold_slider.setEnabled(False)
+        self.threshold_slider.setValue(int(DEFAULT_THRESHOLD * 100))
+        self.threshold_metrics_label.clear()
+
+        if self.folder_path:
+            self.thread = BatchTestingThread(self.folder_path, self.model_path)
+            self.thread.output_signal.connect(self.append_output)
+            self.thread.results_signal.connect(self.show_sweep)
+            self.thread.progress_signal.connect(self.on_progress)
+            self.thread.row_signal.connect(self.add_result_row)
+            self.thread.error_signal.connect(self.show_error)
+            self.thread.start()
+            return
 
         self.thread = TestingThread(self.image_path, self.model_path)
         self.thread.output_signal.connect(self.append_output)
@@ -151,23 +262,20 @@ class TestingWidget(QWidget):
         self.thread.error_signal.connect(self.show_error)
         self.thread.start()
 
+    def on_progress(self, done, total):
+        self.progress_bar.setValue(int(done / total * 100))
+
+    def add_result_row(self, row):
+        index = self.results_table.rowCount()
+        self.results_table.insertRow(index)
+        self.results_table.setItem(index, 0, QTableWidgetItem(os.path.basename(row["image"])))
+        for column, name in enumerate(METRIC_NAMES, 1):
+            self.results_table.setItem(index, column, QTableWidgetItem(f"{row[name]:.4f}"))
+
     def append_output(self, text):
         self.output_text.append(text)
 
     def show_results(self, results):
-        def numpy_to_qimage(np_array, is_grayscale=True):
-            if is_grayscale:
-                height, width = np_array.shape
-                qimage = QImage(np_array.data, width, height, width, QImage.Format_Grayscale8)
-            else:
-                if np_array.ndim == 2:
-                    np_array = np.stack([np_array] * 3, axis=-1)
-                elif np_array.shape[2] == 4:
-                    np_array = np_array[:, :, :3]
-                height, width, _ = np_array.shape
-                qimage = QImage(np_array.data, width, height, 3 * width, QImage.Format_RGB888)
-            return qimage.scaled(200, 200, Qt.KeepAspectRatio)
-
         input_qimage = numpy_to_qimage(results["input_image"], is_grayscale=False)
         self.input_image_label.setPixmap(QPixmap.fromImage(input_qimage))
 
@@ -177,6 +285,32 @@ class TestingWidget(QWidget):
         pred_qimage = numpy_to_qimage(results["pred_mask"], is_grayscale=True)
         self.pred_mask_label.setPixmap(QPixmap.fromImage(pred_qimage))
 
+        self.probability = results["probability"]
+        self.show_sweep(results)
+
+    def show_sweep(self, results):
+        if results.get("sweep") is None or results["sweep"]["best"] is None:
+            return
+        self.sweep = results["sweep"]
+        best = self.sweep["best"]
+        self.append_output(f"Лучший порог по Dice: {best['threshold']:.2f} (Dice {best['dice']:.4f})")
+        self.threshold_slider.setEnabled(True)
+        self.on_threshold_changed(self.threshold_slider.value())
+
+    def on_threshold_changed(self, value):
+        # Маска и метрики пересчитываются по сохраненным вероятностям, модель не вызывается
+        threshold = value / 100
+        self.threshold_label.setText(f"Порог: {threshold:.2f}")
+        if self.probability is not None:
+            pred_qimage = numpy_to_qimage(threshold_mask(self.probability, threshold), is_grayscale=True)
+            self.pred_mask_label.setPixmap(QPixmap.fromImage(pred_qimage))
+        if self.sweep is not None:
+            values = sweep_metrics(self.sweep, threshold)
+            self.threshold_metrics_label.setText(
+                f"Dice {values['dice']:.4f}, IoU {values['iou']:.4f}, "
+                f"точность {values['precision']:.4f}, полнота {values['recall']:.4f}"
+            )
+
     def show_error(self, error_message):
         QMessageBox.critical(self, "Ошибка", error_message)
 
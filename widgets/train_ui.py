@@ -1,17 +1,18 @@
 from PyQt5.QtWidgets import (
     QWidget, QVBoxLayout, QLabel, QPushButton, QTextEdit,
-    QFileDialog, QProgressBar, QComboBox, QLineEdit, QMessageBox
+    QFileDialog, QProgressBar, QComboBox, QLineEdit, QMessageBox, QCheckBox
 )
 from PyQt5.QtCore import Qt, QThread, pyqtSignal
-from train import Trainer
+from train import Trainer, default_num_workers, format_timing
+from profiling import format_stages
 import os
 
 class TrainingThread(QThread):
     error_signal = pyqtSignal(str)
 
-    def __init__(self, dataset_path, model_path, batch_size, epochs):
+    def __init__(self, dataset_path, model_path, batch_size, epochs, **options):
         super().__init__()
-        self.trainer = Trainer(dataset_path, model_path, batch_size=batch_size, epochs=epochs)
+        self.trainer = Trainer(dataset_path, model_path, batch_size=batch_size, epochs=epochs, **options)
 
     def run(self):
         try:
@@ -58,6 +59,17 @@ class TrainingWidget(QWidget):
         self.batch_size_combo.setCurrentText("1")
         layout.addWidget(self.batch_size_combo)
 
+        self.accumulation_label = QLabel("Накопление градиентов (батчей на шаг):")
+        layout.addWidget(self.accumulation_label)
+
+        self.accumulation_combo = QComboBox()
+        self.accumulation_combo.addItems(["1", "2", "4", "8", "16"])
+        self.accumulation_combo.setMaximumWidth(100)
+        layout.addWidget(self.accumulation_combo)
+
+        self.gradient_checkpointing_check = QCheckBox("Экономия памяти: пересчет активаций при обратном проходе")
+        layout.addWidget(self.gradient_checkpointing_check)
+
         self.epochs_label = QLabel("Количество эпох:")
         layout.addWidget(self.epochs_label)
 
@@ -67,6 +79,50 @@ class TrainingWidget(QWidget):
         self.epochs_field.setText("25")
         layout.addWidget(self.epochs_field)
 
+        self.workers_label = QLabel("Процессов загрузки данных:")
+        layout.addWidget(self.workers_label)
+
+        self.workers_combo = QComboBox()
+        self.workers_combo.addItem(f"Авто ({default_num_workers()})")
+        self.workers_combo.addItems([str(i) for i in range((os.cpu_count() or 1) + 1)])
+        self.workers_combo.setMaximumWidth(100)
+        layout.addWidget(self.workers_combo)
+
+        self.prefetch_label = QLabel("Предзагрузка батчей на процесс:")
+        layout.addWidget(self.prefetch_label)
+
+        self.prefetch_combo = QComboBox()
+        self.prefetch_combo.addItems(["1", "2", "4", "8"])
+        self.prefetch_combo.setCurrentText("2")
+        self.prefetch_combo.setMaximumWidth(100)
+        layout.addWidget(self.prefetch_combo)
+
+        self.pin_memory_label = QLabel("Закрепленная память (pin_memory):")
+        layout.addWidget(self.pin_memory_label)
+
+        self.pin_memory_combo = QComboBox()
+        self.pin_memory_combo.addItems(["Авто", "Да", "Нет"])
+        self.pin_memory_combo.setMaximumWidth(100)
+        layout.addWidget(self.pin_memory_combo)
+
+        self.nproc_label = QLabel("Процессов обучения (DDP, gloo):")
+        layout.addWidget(self.nproc_label)
+
+        self.nproc_combo = QComboBox()
+        self.nproc_combo.addItems([str(i) for i in range(1, (os.cpu_count() or 1) + 1)])
+        self.nproc_combo.setMaximumWidth(100)
+        layout.addWidget(self.nproc_combo)
+
+        self.persistent_workers_check = QCheckBox("Не перезапускать процессы загрузки между эпохами")
+        self.persistent_workers_check.setChecked(True)
+        layout.addWidget(self.persistent_workers_check)
+
+        self.profile_check = QCheckBox("Замерять время по этапам обучения")
+        layout.addWidget(self.profile_check)
+
+        self.resume_check = QCheckBox("Продолжить с последнего снимка состояния")
+        layout.addWidget(self.resume_check)
+
         self.progress_label = QLabel("Прогресс эпохи:")
         layout.addWidget(self.progress_label)
 
@@ -95,7 +151,7 @@ class TrainingWidget(QWidget):
             self.dataset_path_field.setText(folder)
 
     def select_model_path(self):
-        file, _ = QFileDialog.getSaveFileName(self, "Сохранить модель как", "model.pth", "Модели (*.pth)")
+        file, _ = QFileDialog.getSaveFileName(self, "Сохранить модель как", "model.pth", "Модели (*.pth *.safetensors)")
         if file:
             self.model_path_field.setText(file)
 
@@ -122,10 +178,24 @@ class TrainingWidget(QWidget):
 
         self.output_text.clear()
         self.progress_bar.setValue(0)
-        self.thread = TrainingThread(dataset_path, model_path, batch_size, epochs)
+        workers_index = self.workers_combo.currentIndex()
+        options = {
+            "num_workers": None if workers_index == 0 else workers_index - 1,
+            "prefetch_factor": int(self.prefetch_combo.currentText()),
+            "persistent_workers": self.persistent_workers_check.isChecked(),
+            "pin_memory": [None, True, False][self.pin_memory_combo.currentIndex()],
+            "nproc": int(self.nproc_combo.currentText()),
+            "resume": self.resume_check.isChecked(),
+            "profile": self.profile_check.isChecked(),
+            "accumulation_steps": int(self.accumulation_combo.currentText()),
+            "gradient_checkpointing": self.gradient_checkpointing_check.isChecked(),
+        }
+        self.thread = TrainingThread(dataset_path, model_path, batch_size, epochs, **options)
         self.thread.trainer.epoch_start_signal.connect(self.on_epoch_start)
         self.thread.trainer.epoch_complete_signal.connect(self.on_epoch_complete)
         self.thread.trainer.batch_progress_signal.connect(self.on_batch_progress)
+        self.thread.trainer.epoch_timing_signal.connect(self.on_epoch_timing)
+        self.thread.trainer.stage_timing_signal.connect(self.on_stage_timing)
         self.thread.trainer.training_complete_signal.connect(self.append_output)
         self.thread.error_signal.connect(self.show_error)
         self.thread.start()
@@ -142,6 +212,12 @@ class TrainingWidget(QWidget):
         )
         self.progress_bar.setValue(100)
 
+    def on_epoch_timing(self, epoch, data_time, compute_time):
+        self.append_output(format_timing(data_time, compute_time))
+
+    def on_stage_timing(self, epoch, stages):
+        self.append_output(f"Этапы: {format_stages(stages)}")
+
     def on_batch_progress(self, batch, total_batches, loss):
         progress = int((batch / total_batches) * 100)
         self.progress_bar.setValue(progress)